@@ -0,0 +1,90 @@
+"""
+Compares the fixed one-hour cache TTL with adaptive TTLs, alone and with the admission filter, on a
+read workload where most reads follow a Zipf distribution over --guids GUIDs and the rest (--scan) read
+GUIDs uniformly at random, like a client scanning its GUIDs. It replays --hours of reads on a virtual
+clock, the way the handlers use the cache (a miss reads MongoDB, then fills the cache), and reports the
+hit ratio, the MongoDB reads and the mean number of GUIDs resident in Redis; then again with Redis
+capped at --max-keys (evicting the least recently used), where the hit ratio for the same memory counts.
+
+    python -m bench.adaptiveTtl [--guids N] [--requests N] [--hours H] [--scan F] [--max-keys N]
+"""
+import argparse
+import itertools
+import random
+import time
+from unittest import mock
+
+from tornado.ioloop import IOLoop
+
+from .asyncBackends import BlockingCache
+from .standins import FakeRedis
+
+CONFIGURATIONS = [
+    ('fixed TTL', {}),
+    ('adaptive TTL', {'adaptive_ttl': True}),
+    ('adaptive + admission', {'adaptive_ttl': True, 'admission': 2}),
+]
+
+
+def workload(guids, requests, exponent, scan, rng):
+    """Draws `requests` GUIDs: Zipf-distributed over `guids`, except a `scan` share drawn uniformly."""
+    weights = list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(len(guids))))
+    popular = rng.choices(guids, cum_weights=weights, k=requests)
+    return [rng.choice(guids) if rng.random() < scan else guid for guid in popular]
+
+
+async def replay(cache, documents, reads, duration, clock):
+    """Serves the reads spread evenly over `duration` virtual seconds; returns (hits, Mongo reads, mean resident keys)."""
+    store = cache.client.store
+    start = clock[0]
+    step = duration / len(reads)
+    sample_every = max(1, len(reads) // 100)
+    hits = loads = 0
+    resident = []
+    for i, guid in enumerate(reads):
+        clock[0] = start + i * step
+        if await cache.get(guid) is not None:
+            hits += 1
+        else:
+            loads += 1
+            await cache.fill(guid, documents[guid])
+        if i % sample_every == 0:
+            resident.append(sum(1 for _, deadline in store.values() if deadline > clock[0]))
+    return hits, loads, sum(resident) / len(resident)
+
+
+async def run(args):
+    rng = random.Random(1)
+    expire = int(time.time()) + 30 * 24 * 3600
+    guids = ["%032X" % rng.getrandbits(128) for _ in range(args.guids)]
+    documents = {guid: {'guid': guid, 'user': 'bench', 'expire': expire} for guid in guids}
+    reads = workload(guids, args.requests, args.zipf, args.scan, rng)
+    clock = [time.time()]
+    results = []
+    with mock.patch('time.time', lambda: clock[0]):
+        for max_keys in (None, args.max_keys):
+            for label, options in CONFIGURATIONS:
+                cache = BlockingCache(client=FakeRedis(max_keys=max_keys), negative_ttl=0, **options)
+                hits, loads, resident = await replay(cache, documents, reads, args.hours * 3600, clock)
+                results.append((label, max_keys, hits / len(reads), loads, resident))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guids', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=500000)
+    parser.add_argument('--hours', type=float, default=6, help='virtual time the reads are spread over')
+    parser.add_argument('--zipf', type=float, default=1.0, help='exponent of the popularity distribution')
+    parser.add_argument('--scan', type=float, default=0.2, help='share of reads drawn uniformly')
+    parser.add_argument('--max-keys', type=int, default=5000, help='Redis capacity for the second run')
+    args = parser.parse_args()
+
+    for label, max_keys, ratio, loads, resident in IOLoop.current().run_sync(lambda: run(args)):
+        capacity = f"max {max_keys} keys" if max_keys else "uncapped"
+        print(f"{label:>20} ({capacity:>14}): hit ratio {ratio:6.1%}, {loads:6d} Mongo reads, "
+              f"{resident:8.0f} GUIDs resident in Redis on average")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Runs a write storm against the API while a few clients read GUIDs that are not cached, with and
+without admission control, and reports the read latency, the writes served and the writes shed.
+Reads and writes compete for a Mongo stand-in that serves --capacity operations at once.
+Then measures the rate limiter: Redis round trips per request and the cost of a decision per lease size.
+
+    python -m bench.admission [--duration S] [--writers N] [--readers N] [--max-in-flight N] [--capacity N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.admission import Admission, RateLimiter
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+async def storm(args, admission):
+    db = Database(client=FakeMongoClient(args.latency, args.capacity))
+    cache = Cache(client=FakeRedis())
+    guids = seed(db, 100000)
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=db, cache=cache, admission=admission))
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=args.writers + args.readers)
+    url = f"http://127.0.0.1:{port}/guid"
+    deadline = time.monotonic() + args.duration
+    reads, statuses = [], {}
+    body = json.dumps({'user': 'bench'})
+
+    async def writer():
+        while time.monotonic() < deadline:
+            response = await client.fetch(url, method='POST', body=body, raise_error=False)
+            statuses[response.code] = statuses.get(response.code, 0) + 1
+            if response.code == 503:
+                await asyncio.sleep(args.backoff)
+
+    async def reader():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = await client.fetch(f"{url}/{guids.pop()}", raise_error=False)
+            assert response.code == 200, response.code
+            reads.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[writer() for _ in range(args.writers)], *[reader() for _ in range(args.readers)])
+    client.close()
+    server.stop()
+    reads.sort()
+    return reads, statuses
+
+
+def limiter_cost(lease, requests=20000, clients=10):
+    redis = FakeRedis(latency=0.0005)
+    limiter = RateLimiter(Cache(client=redis, executor=ThreadPoolExecutor(max_workers=4)), rate=1e9, burst=10 ** 6,
+                          lease=lease)
+
+    async def run():
+        started = time.perf_counter()
+        for i in range(requests):
+            await limiter.allow(f"client-{i % clients}")
+        return time.perf_counter() - started
+
+    elapsed = IOLoop.current().run_sync(run)
+    return redis.calls / requests, elapsed / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--writers', type=int, default=64)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--max-in-flight', type=int, default=16)
+    parser.add_argument('--low-share', type=float, default=0.5)
+    parser.add_argument('--backoff', type=float, default=0.05, help='seconds a writer waits after a 503')
+    parser.add_argument('--latency', type=float, default=0.02, help='per-call Mongo latency in seconds')
+    parser.add_argument('--capacity', type=int, default=2, help='concurrent operations the Mongo stand-in serves')
+    args = parser.parse_args()
+    logging.getLogger('tornado.access').setLevel(logging.CRITICAL)  # one line per 503 would dominate the CPU
+
+    for label, admission in [('no admission control', None),
+                             (f'max {args.max_in_flight} in flight', Admission(args.max_in_flight, args.low_share))]:
+        reads, statuses = IOLoop.current().run_sync(lambda: storm(args, admission))
+        print(f"{label:>21}: GET p50 {reads[len(reads) // 2] * 1000:7.2f}ms  "
+              f"p99 {reads[int(len(reads) * 0.99)] * 1000:7.2f}ms  ({len(reads) / args.duration:6.1f}/s)  "
+              f"POST 201 {statuses.get(201, 0) / args.duration:6.1f}/s  503 {statuses.get(503, 0) / args.duration:6.1f}/s")
+
+    for lease in (1, 10, 100):
+        per_request, cost = limiter_cost(lease)
+        print(f"rate limiter, lease {lease:3d}: {per_request:.3f} Redis round trips per request, "
+              f"{cost * 1e6:7.1f}µs per decision")
+
+
+if __name__ == '__main__':
+    main()
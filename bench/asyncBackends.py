@@ -0,0 +1,89 @@
+"""
+Compares requests/sec at a fixed concurrency for GET /guid/{guid} with the old blocking
+backend calls (driver call made directly on the IOLoop) and the executor-backed ones.
+
+    python -m bench.asyncBackends [--requests N] [--concurrency C] [--latency SECONDS]
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .standins import FakeMongoClient, FakeRedis
+
+
+class BlockingDatabase(Database):
+    """Database that calls pymongo inline, as the handlers did before the executor was introduced."""
+
+    async def _run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+class BlockingCache(Cache):
+    """Cache that calls redis-py inline, as the handlers did before the executor was introduced."""
+
+    async def run(self, fn, *args, deadline=None, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def seed(db, count):
+    """Inserts documents straight into the stand-in collection and returns their GUIDs."""
+    guids = [uuid.uuid4().hex.upper() for _ in range(count)]
+    expire = int(time.time()) + 3600
+    for guid in guids:
+        db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'bench', 'expire': expire}
+    return guids
+
+
+async def run_load(app, guids, requests, concurrency):
+    """Issues `requests` GETs from `concurrency` workers and returns requests/sec."""
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    remaining = [requests]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            guid = random.choice(guids)
+            response = await client.fetch(f"http://127.0.0.1:{port}/guid/{guid}", raise_error=False)
+            assert response.code == 200, response.code
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    client.close()
+    server.stop()
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.002, help='per-call backend latency in seconds')
+    parser.add_argument('--keys', type=int, default=500)
+    args = parser.parse_args()
+
+    for label, db_class, cache_class in [('blocking', BlockingDatabase, BlockingCache),
+                                         ('executor', Database, Cache)]:
+        db = db_class(client=FakeMongoClient(args.latency))
+        cache = cache_class(client=FakeRedis(args.latency))
+        guids = seed(db, args.keys)
+        rate = IOLoop.current().run_sync(
+            lambda: run_load(make_app(db=db, cache=cache), guids, args.requests, args.concurrency))
+        print(f"{label:>9}: {rate:8.1f} req/s  (concurrency={args.concurrency}, latency={args.latency * 1000:.1f}ms)")
+
+
+if __name__ == '__main__':
+    main()
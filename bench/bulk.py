@@ -0,0 +1,86 @@
+"""
+Compares GUIDs/sec for N single-GUID calls against the batch endpoints
+(POST /guid/_bulk, POST /guid/_mget, DELETE /guid/_bulk) on the same number of GUIDs.
+
+    python -m bench.bulk [--guids N] [--batch B] [--concurrency C] [--latency SECONDS]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .standins import FakeMongoClient, FakeRedis
+
+
+async def timed(requests, concurrency, client):
+    """Runs (url, method, body) requests from `concurrency` workers and returns the elapsed seconds."""
+    queue = list(reversed(requests))
+
+    async def worker():
+        while queue:
+            url, method, body = queue.pop()
+            response = await client.fetch(url, method=method, body=body, allow_nonstandard_methods=True)
+            assert response.code in (200, 201, 204), response.code
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - started
+
+
+async def run(args):
+    db = Database(client=FakeMongoClient(args.latency))
+    cache = Cache(client=FakeRedis(args.latency))
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=db, cache=cache))
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=args.concurrency)
+    url = f"http://127.0.0.1:{port}/guid"
+    expire = int(time.time()) + 3600
+
+    def batches(guids):
+        return [guids[i:i + args.batch] for i in range(0, len(guids), args.batch)]
+
+    single = [uuid.uuid4().hex.upper() for _ in range(args.guids)]
+    bulk = [uuid.uuid4().hex.upper() for _ in range(args.guids)]
+    body = json.dumps({'user': 'bench', 'expire': expire})
+    phases = [
+        ('create', [(f"{url}/{guid}", 'POST', body) for guid in single],
+                   [(f"{url}/_bulk", 'POST', json.dumps({'items': [{'guid': guid, 'user': 'bench', 'expire': expire}
+                                                                   for guid in chunk]}))
+                    for chunk in batches(bulk)]),
+        ('get', [(f"{url}/{guid}", 'GET', None) for guid in single],
+                [(f"{url}/_mget", 'POST', json.dumps({'guids': chunk})) for chunk in batches(bulk)]),
+        ('delete', [(f"{url}/{guid}", 'DELETE', None) for guid in single],
+                   [(f"{url}/_bulk", 'DELETE', json.dumps({'guids': chunk})) for chunk in batches(bulk)]),
+    ]
+    for label, single_requests, bulk_requests in phases:
+        single_time = await timed(single_requests, args.concurrency, client)
+        bulk_time = await timed(bulk_requests, args.concurrency, client)
+        print(f"{label:>7}: single {args.guids / single_time:9.1f} GUIDs/s   "
+              f"batch of {args.batch} {args.guids / bulk_time:9.1f} GUIDs/s   ({single_time / bulk_time:5.1f}x)")
+
+    client.close()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guids', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.001, help='per-call backend latency in seconds')
+    args = parser.parse_args()
+    IOLoop.current().run_sync(lambda: run(args))
+
+
+if __name__ == '__main__':
+    main()
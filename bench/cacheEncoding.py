@@ -0,0 +1,70 @@
+"""
+Compares the cache encodings: bytes of key and value per GUID, the cost of encoding and decoding a
+value, and, against a real Redis given with --redis, the memory each cached GUID takes there
+(used_memory grown per key, and MEMORY USAGE of one key). The GUIDs written to that Redis are deleted
+afterwards; use a database nothing else writes to.
+
+    python -m bench.cacheEncoding [--guids N] [--redis redis://host:6379/15]
+"""
+import argparse
+import time
+import timeit
+import uuid
+
+import redis
+
+from src import cacheEncoding, versions
+from src.cache import Cache
+from .standins import FakeRedis
+
+
+def documents(count):
+    expire = int(time.time()) + 30 * 24 * 3600
+    for i in range(count):
+        guid = uuid.uuid4().hex.upper()
+        yield guid, {'guid': guid, 'user': f"user-{i % 1000:04d}@example.com", 'expire': expire + i,
+                     'version': versions.new_version()}
+
+
+def write(client, name, values):
+    cache = Cache(client=client, encoding=name)
+    pipe = client.pipeline(transaction=False)
+    for guid, value in values:
+        pipe.set(cache.encoding.key(guid), cache.encoding.dumps(guid, value), ex=cache._ttl(value))
+    pipe.execute()
+    return [cache.encoding.key(guid) for guid, _ in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guids', type=int, default=100000)
+    parser.add_argument('--redis', help='URL of a Redis to measure memory on, e.g. redis://localhost:6379/15')
+    args = parser.parse_args()
+    values = list(documents(args.guids))
+
+    for name in cacheEncoding.ENCODINGS:
+        encoding = cacheEncoding.encoding(name)
+        client = FakeRedis()
+        keys = write(client, name, values)
+        stored = sum(len(key) + len(client.store[key][0]) for key in keys) / len(keys)
+        guid, value = values[0]
+        payload = encoding.dumps(guid, value)
+        dumps = timeit.timeit(lambda: encoding.dumps(guid, value), number=100000) / 100000
+        loads = timeit.timeit(lambda: cacheEncoding.loads(guid, payload), number=100000) / 100000
+        print(f"{name:>7}: {stored:6.1f} bytes of key and value per GUID, "
+              f"dumps {dumps * 1e9:5.0f} ns, loads {loads * 1e9:5.0f} ns")
+
+    if args.redis:
+        client = redis.Redis.from_url(args.redis)
+        for name in cacheEncoding.ENCODINGS:
+            before = client.info('memory')['used_memory']
+            keys = write(client, name, values)
+            grown = (client.info('memory')['used_memory'] - before) / len(keys)
+            usage = client.memory_usage(keys[0])
+            for start in range(0, len(keys), 10000):
+                client.delete(*keys[start:start + 10000])
+            print(f"{name:>7}: {grown:6.1f} bytes of Redis memory per GUID, MEMORY USAGE {usage} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Measures change capture: a thread updates GUIDs directly in the stand-in collection, behind the API's
+back, at a steady --rate while ChangeCapture tails the change stream with each --batch size and
+publishes to the Redis stream sink; then change capture stops, --backlog updates are made, and it
+restarts from its resume token. It reports the invalidation lag of the steady writes (from the write
+until the GUID's cache keys are deleted), how fast the backlog is caught up and the Redis round trips
+per change.
+
+    python -m bench.changeCapture [--guids N] [--rate R] [--duration S] [--backlog N] [--batch B] [--latency SECONDS]
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from tornado.ioloop import IOLoop
+
+from src.cache import Cache
+from src.changeCapture import ChangeCapture, RedisStreamSink
+from src.database import Database
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+def writer(db, guids, count, rate, written):
+    """Updates `count` GUIDs in turn, `rate` per second (0 for as fast as possible), recording when."""
+    started = time.perf_counter()
+    for i in range(count):
+        if rate:
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        guid = guids[i % len(guids)]
+        written.setdefault(guid, []).append(time.perf_counter())
+        db.guids.update_one({'_id': guid}, {'$set': {'user': f"user-{i}"}})
+
+
+async def start(db, cache, batch_size):
+    """Starts change capture and, the first time, waits until its change stream is open."""
+    capture = ChangeCapture(db, cache, sink=RedisStreamSink(cache), batch_size=batch_size, max_await=0.01)
+    capture.start()
+    while db.guids.changes is None:
+        await asyncio.sleep(0.001)
+    return capture
+
+
+async def wait_invalidated(invalidated, count):
+    """Waits until `count` invalidations were recorded."""
+    while sum(map(len, invalidated.values())) < count:
+        await asyncio.sleep(0.001)
+
+
+async def run(args, batch_size):
+    db = Database(client=FakeMongoClient(args.latency))
+    cache = Cache(client=FakeRedis(args.latency))
+    guids = seed(db, args.guids)
+    invalidated = {}
+    delete_many = cache.delete_many
+
+    async def recording_delete_many(changed, tombstones=False):
+        await delete_many(changed, tombstones)
+        now = time.perf_counter()
+        for guid in changed:
+            invalidated.setdefault(guid, []).append(now)
+    cache.delete_many = recording_delete_many
+
+    capture = await start(db, cache, batch_size)
+    written, count = {}, int(args.rate * args.duration)
+    thread = threading.Thread(target=writer, args=(db, guids, count, args.rate, written))
+    thread.start()
+    await wait_invalidated(invalidated, count)
+    thread.join()
+    await capture.stop()
+    # A GUID written again before its first invalidation is invalidated once per change all the same.
+    lags = sorted(after - before for guid, times in written.items()
+                  for before, after in zip(times, invalidated[guid]))
+
+    invalidated.clear()
+    writer(db, guids, args.backlog, 0, {})
+    calls = cache.client.calls
+    started = time.perf_counter()
+    capture = await start(db, cache, batch_size)
+    await wait_invalidated(invalidated, args.backlog)
+    elapsed = time.perf_counter() - started
+    calls = cache.client.calls - calls
+    await capture.stop()
+    return lags, elapsed, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guids', type=int, default=20000)
+    parser.add_argument('--rate', type=float, default=500, help='steady direct writes per second')
+    parser.add_argument('--duration', type=float, default=4, help='seconds of steady writes')
+    parser.add_argument('--backlog', type=int, default=20000, help='direct writes made while stopped')
+    parser.add_argument('--batch', type=int, action='append', help='CDC_BATCH_SIZE, may be repeated')
+    parser.add_argument('--latency', type=float, default=0.0005, help='per-call backend latency in seconds')
+    args = parser.parse_args()
+
+    for batch_size in args.batch or [1, 50, 500]:
+        lags, elapsed, calls = IOLoop.current().run_sync(lambda: run(args, batch_size))
+        print(f"batch {batch_size:>4}: lag p50 {lags[len(lags) // 2] * 1000:6.2f}ms  "
+              f"p99 {lags[int(len(lags) * 0.99)] * 1000:7.2f}ms | backlog caught up at {args.backlog / elapsed:6.0f} "
+              f"changes/s, {calls / args.backlog:.3f} Redis calls per change")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Injects faults into the Redis and Mongo stand-ins while clients read GUIDs, and reports the read latency
+and the responses by status, with the circuit breakers configured and without them, i.e. with calls
+waiting on the backends for as long as they take and connection errors handled like any other error.
+Scenarios: Redis hangs (every call takes --hang seconds), and Mongo refuses connections while part of
+the GUIDs are cached.
+
+    python -m bench.chaos [--duration S] [--readers N] [--hang S] [--deadline S]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import redis
+from pymongo.errors import ConnectionFailure
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.breaker import CircuitBreaker
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+async def run(args, scenario, breakers):
+    if breakers:
+        mongo_breaker = CircuitBreaker('mongo', errors=(ConnectionFailure,), deadline=10 * args.deadline)
+        redis_breaker = CircuitBreaker('redis', errors=(redis.ConnectionError, redis.TimeoutError),
+                                       deadline=args.deadline)
+    else:
+        mongo_breaker, redis_breaker = CircuitBreaker('mongo'), CircuitBreaker('redis')
+    db = Database(client=FakeMongoClient(args.latency), breaker=mongo_breaker)
+    cache = Cache(client=FakeRedis(args.latency), breaker=redis_breaker)
+    guids = seed(db, 10000)
+    cached = guids[:len(guids) // 2]
+    await cache.set_many({guid: db.guids.documents[guid] for guid in cached})
+    if scenario == 'redis hang':
+        cache.client.latency = args.hang
+    else:
+        db.guids.down = True
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=db, cache=cache))
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=args.readers)
+    url = f"http://127.0.0.1:{port}/guid/"
+    stop = time.monotonic() + args.duration
+    latencies, statuses = [], {}
+
+    async def reader():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            response = await client.fetch(url + random.choice(guids), raise_error=False, request_timeout=60)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.code] = statuses.get(response.code, 0) + 1
+
+    await asyncio.gather(*[reader() for _ in range(args.readers)])
+    client.close()
+    server.stop()
+    latencies.sort()
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.001, help='per-call backend latency in seconds')
+    parser.add_argument('--hang', type=float, default=1.0, help='per-call Redis latency while it hangs')
+    parser.add_argument('--deadline', type=float, default=0.05, help='Redis deadline; Mongo gets ten times it')
+    args = parser.parse_args()
+    for logger in ('tornado.access', 'tornado.general', 'tornado.application'):  # one line per failed request
+        logging.getLogger(logger).setLevel(logging.CRITICAL)
+
+    for scenario in ('redis hang', 'mongo down'):
+        for label, breakers in (('no breakers', False), ('breakers', True)):
+            latencies, statuses = IOLoop.current().run_sync(lambda: run(args, scenario, breakers))
+            codes = '  '.join(f"{code} {count / args.duration:7.1f}/s" for code, count in sorted(statuses.items()))
+            print(f"{scenario:>10}, {label:>11}: GET p50 {latencies[len(latencies) // 2] * 1000:8.2f}ms  "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.2f}ms  {codes}")
+
+
+if __name__ == '__main__':
+    main()
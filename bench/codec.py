@@ -0,0 +1,77 @@
+"""
+Measures the JSON work on the cache-hit read path. It times one decode and one encode of a GUID
+document with each codec, then the CPU time per GET /guid/{guid} hit in three setups:
+- decoding the Redis payload and re-encoding the dict (the former read path)
+- the same with orjson
+- returning the stored bytes as they are
+The HTTP client runs in the same process, so the per-request figures include its share; compare
+them with each other rather than reading them as absolute server costs.
+
+    python -m bench.codec [--requests N] [--concurrency C]
+"""
+import argparse
+import time
+import timeit
+
+from tornado.ioloop import IOLoop
+
+from src import codec
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import run_load, seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+class DecodingCache(Cache):
+    """Cache that always decodes hits, as before the raw read path; the handler then re-encodes them."""
+
+    async def get(self, guid, refresh=None, raw=False):
+        return await super().get(guid, refresh=refresh)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--keys', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    document = {'guid': "%032X" % 1, 'user': 'Cylance, Inc.', 'expire': 1893456000}
+    count = 200000
+    for name in [name for name in codec.CODECS if codec.available(name)]:
+        codec.use(name)
+        payload = codec.dumps(document)
+        loads = timeit.timeit(lambda: codec.loads(payload), number=count) / count
+        dumps = timeit.timeit(lambda: codec.dumps(document), number=count) / count
+        print(f"{name:>7}: loads {loads * 1e9:6.0f} ns + dumps {dumps * 1e9:6.0f} ns = "
+              f"{(loads + dumps) * 1e6:5.2f} us per hit on the former read path")
+
+    setups = [('decode + encode, json', DecodingCache, 'json'),
+              ('decode + encode, orjson', DecodingCache, 'orjson'),
+              ('raw bytes', Cache, 'json')]
+    for label, cache_class, name in setups:
+        if not codec.available(name):
+            continue
+        codec.use(name)
+        db = Database(client=FakeMongoClient())
+        cache = cache_class(client=FakeRedis())
+        guids = seed(db, args.keys)
+        app = make_app(db=db, cache=cache)
+        # Warm the cache so that every measured request is a hit.
+        documents = {guid: {'guid': guid, 'user': 'bench', 'expire': db.guids.documents[guid]['expire']}
+                     for guid in guids}
+        IOLoop.current().run_sync(lambda: cache.set_many(documents))
+        best = None
+        for _ in range(args.rounds):
+            started = time.process_time()
+            rate = IOLoop.current().run_sync(lambda: run_load(app, guids, args.requests, args.concurrency))
+            cpu = (time.process_time() - started) / args.requests
+            best = min(best or (cpu, rate), (cpu, rate))
+        print(f"{label:>24}: {best[0] * 1e6:7.1f} us CPU per request, {best[1]:8.1f} req/s")
+    codec.use('json')
+
+
+if __name__ == '__main__':
+    main()
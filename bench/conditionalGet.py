@@ -0,0 +1,117 @@
+"""
+Measures what validators save on a polling workload: --clients clients each poll their --guids GUIDs
+in turn while a writer PATCHes a random GUID every --patch-interval seconds. It compares clients that
+fetch the full body every time, clients that send If-None-Match with the ETag Tornado hashes from the
+body (GUIDs without a version), and clients that send If-None-Match with the version ETag, and reports
+the response bytes per poll (status line and headers included), the share of 304s, the GET latency and
+the CPU time per request, the client's included since it runs in the same process.
+
+    python -m bench.conditionalGet [--clients N] [--guids N] [--polls N] [--patch-interval S] [--encoding E]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src import cacheEncoding, versions
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .standins import FakeMongoClient, FakeRedis
+
+MODES = [
+    ('full body', False, False),
+    ('body-hash ETag', True, False),
+    ('version ETag', True, True),
+]
+
+
+def response_bytes(response):
+    """Bytes of the status line, headers and body of a response, as sent on the wire."""
+    headers = sum(len(f"{name}: {value}\r\n") for name, value in response.headers.get_all())
+    return len(f"HTTP/1.1 {response.code} {response.reason}\r\n") + headers + 2 + len(response.body)
+
+
+async def run_mode(args, conditional, versioned):
+    db = Database(client=FakeMongoClient(args.latency))
+    cache = Cache(client=FakeRedis(args.latency), encoding=args.encoding)
+    expire = int(time.time()) + 30 * 24 * 3600
+    guids = [uuid.uuid4().hex.upper() for _ in range(args.guids)]
+    for guid in guids:
+        document = {'_id': guid, 'guid': guid, 'user': f"user-{guid[:8]}@example.com", 'expire': expire}
+        if versioned:
+            document['version'] = versions.new_version()
+        db.guids.documents[guid] = document
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=db, cache=cache))
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=args.clients)
+    url = f"http://127.0.0.1:{port}/guid/"
+    latencies, sizes, not_modified = [], [], [0]
+    stopped = [False]
+    rng = random.Random(1)
+
+    async def poller():
+        etags = {}
+        for _ in range(args.polls):
+            for guid in guids:
+                headers = {'If-None-Match': etags[guid]} if conditional and guid in etags else {}
+                started = time.perf_counter()
+                response = await client.fetch(url + guid, headers=headers, raise_error=False)
+                latencies.append(time.perf_counter() - started)
+                sizes.append(response_bytes(response))
+                if response.code == 304:
+                    not_modified[0] += 1
+                else:
+                    assert response.code == 200, response.code
+                if 'Etag' in response.headers:
+                    etags[guid] = response.headers['Etag']
+
+    async def writer():
+        while not stopped[0]:
+            await asyncio.sleep(args.patch_interval)
+            guid = rng.choice(guids)
+            body = json.dumps({'user': f"user-{rng.getrandbits(32):08x}@example.com"})
+            await client.fetch(url + guid, method='PATCH', body=body)
+
+    patches = asyncio.ensure_future(writer())
+    cpu = time.process_time()
+    await asyncio.gather(*[poller() for _ in range(args.clients)])
+    cpu = time.process_time() - cpu
+    stopped[0] = True
+    await patches
+    client.close()
+    server.stop()
+    latencies.sort()
+    return sum(sizes) / len(sizes), not_modified[0] / len(sizes), latencies, cpu / len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--guids', type=int, default=20, help='GUIDs each client polls')
+    parser.add_argument('--polls', type=int, default=25, help='times each client polls each GUID')
+    parser.add_argument('--patch-interval', type=float, default=0.5, help='seconds between PATCHes')
+    parser.add_argument('--encoding', choices=cacheEncoding.ENCODINGS, default='json', help='CACHE_ENCODING')
+    parser.add_argument('--latency', type=float, default=0.0005, help='per-call backend latency in seconds')
+    args = parser.parse_args()
+    logging.getLogger('tornado.access').setLevel(logging.CRITICAL)
+
+    for label, conditional, versioned in MODES:
+        size, ratio, latencies, cpu = IOLoop.current().run_sync(lambda: run_mode(args, conditional, versioned))
+        print(f"{label:>15}: {size:6.1f} bytes per poll, {ratio:5.1%} 304s, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:6.2f}ms  p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f}ms, "
+              f"{cpu * 1e6:5.0f} us CPU per request (client included)")
+
+
+if __name__ == '__main__':
+    main()
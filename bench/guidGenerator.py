@@ -0,0 +1,131 @@
+"""
+Compares random and time-ordered GUIDs (GUID_GENERATOR) as the _id of a large collection.
+
+Without MongoDB it inserts --guids GUIDs, handed out by --workers generators in turn as by several
+worker processes, into a model of the _id index's leaf pages: pages of --page-keys keys split in half
+when full, except the last page, which starts a new one when a GUID is appended to it, as WiredTiger
+does; the pages are read through an LRU cache of --cache-pages pages. It reports the pages the index
+ends up with, how full they are, and the cache misses per 1000 inserts over the last tenth of the
+inserts, i.e. the page reads an index larger than the cache costs. It also times the generators.
+
+With --mongo-uri it inserts the GUIDs into a scratch collection of that MongoDB for each generator,
+with insert_many batches of --batch, and reports inserts/sec and the _id index size from collStats.
+
+    python -m bench.guidGenerator [--guids N] [--workers W] [--page-keys K] [--cache-pages P]
+                                  [--mongo-uri URI --batch B]
+"""
+import argparse
+import bisect
+import collections
+import itertools
+import time
+import timeit
+import uuid
+
+from src.guidGenerator import GENERATORS, make_generator
+
+
+class LeafModel:
+    """The leaf pages of a B-tree index, with an LRU cache in front of them (see the module docstring)."""
+
+    def __init__(self, page_keys, cache_pages):
+        """Initializes a new instance of the LeafModel class."""
+        self.page_keys = page_keys
+        self.cache_pages = cache_pages
+        self.firsts = ['']
+        self.pages = [[]]
+        self.ids = [0]
+        self.next_id = itertools.count(1)
+        self.cache = collections.OrderedDict()
+        self.misses = 0
+
+    def touch(self, page_id):
+        if page_id in self.cache:
+            self.cache.move_to_end(page_id)
+            return
+        self.misses += 1
+        self.cache[page_id] = True
+        if len(self.cache) > self.cache_pages:
+            self.cache.popitem(last=False)
+
+    def insert(self, key):
+        index = bisect.bisect_right(self.firsts, key) - 1
+        page = self.pages[index]
+        self.touch(self.ids[index])
+        bisect.insort(page, key)
+        if len(page) <= self.page_keys:
+            return
+        if index == len(self.pages) - 1 and page[-1] == key:
+            moved = [page.pop()]  # appended to the last page: start a new one, keep this one full
+        else:
+            middle = len(page) // 2
+            moved = page[middle:]
+            del page[middle:]
+        page_id = next(self.next_id)
+        self.firsts.insert(index + 1, moved[0])
+        self.pages.insert(index + 1, moved)
+        self.ids.insert(index + 1, page_id)
+        self.touch(page_id)
+
+
+def model(name, args):
+    generators = [make_generator(name) for _ in range(args.workers)]
+    index = LeafModel(args.page_keys, args.cache_pages)
+    tail = args.guids - args.guids // 10
+    started = time.perf_counter()
+    for i in range(args.guids):
+        if i == tail:
+            index.misses = 0
+        index.insert(generators[i % args.workers]())
+    elapsed = time.perf_counter() - started
+    pages = len(index.pages)
+    print(f"{name:>12}: {pages:7d} leaf pages, {args.guids / (pages * args.page_keys):5.1%} full, "
+          f"{index.misses / (args.guids - tail) * 1000:6.1f} cache misses per 1000 inserts "
+          f"({elapsed:.1f}s to model)")
+
+
+def mongo(name, args):
+    from pymongo import MongoClient
+    client = MongoClient(args.mongo_uri)
+    collection = client.get_database('guid_bench').get_collection(f"guids_{name.replace('-', '_')}")
+    collection.drop()
+    generator = make_generator(name)
+    expire = int(time.time()) + 3600
+    started = time.perf_counter()
+    for _ in range(0, args.guids, args.batch):
+        collection.insert_many([{'_id': guid, 'guid': guid, 'user': 'bench', 'expire': expire}
+                                for guid in (generator() for _ in range(args.batch))], ordered=False)
+    elapsed = time.perf_counter() - started
+    stats = client.get_database('guid_bench').command('collStats', collection.name)
+    print(f"{name:>12}: {args.guids / elapsed:8.0f} inserts/s, _id index "
+          f"{stats['indexSizes']['_id_'] / 2**20:7.1f} MiB")
+    collection.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guids', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=4, help='generators handing out GUIDs in turn')
+    parser.add_argument('--page-keys', type=int, default=128, help='keys per leaf page')
+    parser.add_argument('--cache-pages', type=int, default=1000, help='leaf pages the cache holds')
+    parser.add_argument('--mongo-uri', help='measure against this MongoDB instead of the model')
+    parser.add_argument('--batch', type=int, default=1000, help='GUIDs per insert_many with --mongo-uri')
+    args = parser.parse_args()
+
+    count = 200000
+    seconds = timeit.timeit(lambda: uuid.uuid4().hex.upper(), number=count)
+    print(f"{'uuid4':>12}: {seconds / count * 1e9:6.0f} ns per GUID")
+    for name in GENERATORS:
+        generator = make_generator(name)
+        seconds = timeit.timeit(generator, number=count)
+        print(f"{name:>12}: {seconds / count * 1e9:6.0f} ns per GUID, {generator.batch_size} at a time")
+
+    for name in GENERATORS:
+        if args.mongo_uri:
+            mongo(name, args)
+        else:
+            model(name, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Measures GET /guid/{guid} on a small set of hot GUIDs with and without the in-process
+LocalCache tier in front of Redis, reporting requests/sec and Redis round trips.
+
+    python -m bench.localCache [--requests N] [--concurrency C] [--latency SECONDS] [--keys K]
+"""
+import argparse
+
+from tornado.ioloop import IOLoop
+
+from src.cache import Cache, LocalCache
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import run_load, seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.001, help='per-call backend latency in seconds')
+    parser.add_argument('--keys', type=int, default=50)
+    args = parser.parse_args()
+
+    for label, local in [('redis only', None), ('local + redis', LocalCache())]:
+        db = Database(client=FakeMongoClient(args.latency))
+        redis = FakeRedis(args.latency)
+        cache = Cache(client=redis, local=local)
+        guids = seed(db, args.keys)
+        rate = IOLoop.current().run_sync(
+            lambda: run_load(make_app(db=db, cache=cache), guids, args.requests, args.concurrency))
+        print(f"{label:>13}: {rate:8.1f} req/s  redis calls={redis.calls:6d}  local={cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
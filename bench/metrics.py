@@ -0,0 +1,52 @@
+"""
+Measures the overhead of the metrics instrumentation: requests/sec for GET /guid/{guid} with the
+request, backend and JSON timers enabled and disabled, plus the cost of a single observation.
+
+    python -m bench.metrics [--requests N] [--concurrency C] [--latency SECONDS]
+"""
+import argparse
+import timeit
+
+from tornado.ioloop import IOLoop
+
+from src import metrics
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import run_load, seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='per-call backend latency in seconds')
+    parser.add_argument('--keys', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    histogram = metrics.Histogram('bench_seconds', 'Benchmark.', ('backend', 'operation'))
+    count = 1000000
+    seconds = timeit.timeit(lambda: histogram.observe(0.003, 'mongo', 'get_guid'), number=count)
+    print(f"Histogram.observe: {seconds / count * 1e9:.0f} ns per observation")
+
+    # Alternate the two modes over several rounds so that warm-up and noise affect both alike.
+    rates = {True: [], False: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            metrics.enabled = enabled
+            db = Database(client=FakeMongoClient(args.latency))
+            cache = Cache(client=FakeRedis(args.latency))
+            guids = seed(db, args.keys)
+            rates[enabled].append(IOLoop.current().run_sync(
+                lambda: run_load(make_app(db=db, cache=cache), guids, args.requests, args.concurrency)))
+    metrics.enabled = True
+
+    off, on = max(rates[False]), max(rates[True])
+    print(f"metrics off: {off:8.1f} req/s")
+    print(f"metrics on:  {on:8.1f} req/s  ({(off - on) / off * 100:+.1f}% overhead)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Round-trips the GUID collection through GET /guid/_export and POST /guid/_import, streaming
+both bodies, and reports lines/sec and the peak Python memory allocated while doing so.
+
+    python -m bench.ndjson [--documents N] [--latency SECONDS]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+TOKEN = 'bench-token'
+AUTHORIZATION = {'Authorization': f"Bearer {TOKEN}"}
+
+
+async def run(args):
+    source = Database(client=FakeMongoClient(args.latency))
+    target = Database(client=FakeMongoClient(args.latency))
+    seed(source, args.documents)
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=source, cache=Cache(client=FakeRedis()), admin_token=TOKEN))
+    server.add_sockets([sock])
+    target_sock, target_port = bind_unused_port()
+    target_server = HTTPServer(make_app(db=target, cache=Cache(client=FakeRedis()), admin_token=TOKEN))
+    target_server.add_sockets([target_sock])
+    client = AsyncHTTPClient(force_instance=True)
+
+    # Export: count the lines as they arrive instead of buffering the body.
+    exported = [0]
+    tracemalloc.start()
+    started = time.perf_counter()
+    await client.fetch(f"http://127.0.0.1:{port}/guid/_export", headers=AUTHORIZATION, request_timeout=3600,
+                       streaming_callback=lambda chunk: exported.__setitem__(0, exported[0] + chunk.count(b'\n')))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"export: {exported[0]} lines in {elapsed:.2f}s = {exported[0] / elapsed:9.0f} lines/s, "
+          f"peak memory {peak / 1024 / 1024:.1f} MiB")
+
+    # Import: feed the source documents to the target as a chunked body.
+    async def body_producer(write):
+        batch = []
+        for document in source.guids.documents.values():
+            batch.append(json.dumps({key: value for key, value in document.items() if key != '_id'}))
+            if len(batch) == 1000:
+                await write(('\n'.join(batch) + '\n').encode())
+                batch = []
+        if batch:
+            await write(('\n'.join(batch) + '\n').encode())
+
+    tracemalloc.start()
+    response = await client.fetch(f"http://127.0.0.1:{target_port}/guid/_import", method='POST', headers=AUTHORIZATION,
+                                  body_producer=body_producer, request_timeout=3600)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report = json.loads(response.body)
+    print(f"import: {report['imported']} imported, {report['rejected']} rejected in {report['seconds']:.2f}s = "
+          f"{report['lines_per_second']:9.0f} lines/s, peak memory {peak / 1024 / 1024:.1f} MiB")
+
+    client.close()
+    server.stop()
+    target_server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--latency', type=float, default=0.001, help='per-call backend latency in seconds')
+    args = parser.parse_args()
+    IOLoop.current().run_sync(lambda: run(args))
+
+
+if __name__ == '__main__':
+    main()
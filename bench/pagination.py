@@ -0,0 +1,89 @@
+"""
+Compares per-page latency of GET /guid?user=<user> (keyset pagination on the {user, expire, _id} index)
+with skip/limit pagination at increasing depths, over a large collection.
+The Mongo stand-in keeps the index as a sorted list (see FakeCollection), so both are measured as index
+scans: keyset starts at the cursor, skip/limit walks past every skipped entry first.
+
+    python -m bench.pagination [--documents N] [--user-documents N] [--limit L]
+"""
+import argparse
+import statistics
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .standins import FakeMongoClient, FakeRedis
+
+
+def seed(db, documents, user_documents):
+    """Inserts `documents` GUIDs, `user_documents` of them for the user 'hot', and returns that user's keys."""
+    expire = int(time.time()) + 3600
+    store = db.guids.documents
+    hot = []
+    for i in range(documents):
+        guid = "%032X" % i
+        user = 'hot' if i % (documents // user_documents) == 0 and len(hot) < user_documents else f"user-{i % 5000}"
+        store[guid] = {'_id': guid, 'guid': guid, 'user': user, 'expire': expire + i % 86400}
+        if user == 'hot':
+            hot.append((expire + i % 86400, guid))
+    hot.sort()
+    return hot
+
+
+async def run(args):
+    db = Database(client=FakeMongoClient())
+    started = time.perf_counter()
+    hot = seed(db, args.documents, args.user_documents)
+    await db.ensure_indexes()
+    await db.count_user_guids('hot')  # builds the stand-in's sorted index
+    print(f"seeded {args.documents} documents ({len(hot)} for the listed user) in {time.perf_counter() - started:.1f}s")
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=db, cache=Cache(client=FakeRedis())))
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True)
+    sort = [('expire', 1), ('_id', 1)]
+    query = {'user': 'hot', 'expire': {'$gt': int(time.time())}}
+
+    depths = [depth for depth in (0, 1000, 10000, 50000, 100000, 200000, 500000) if depth < len(hot)]
+    print(f"{'offset':>8}  {'keyset GET':>12}  {'skip/limit':>12}")
+    for depth in depths:
+        keyset = []
+        for _ in range(args.repeat):
+            after = "&after=%d-%s" % hot[depth - 1] if depth else ''
+            started = time.perf_counter()
+            response = await client.fetch(f"http://127.0.0.1:{port}/guid?user=hot&limit={args.limit}{after}")
+            keyset.append(time.perf_counter() - started)
+            assert len(response.body) > 20
+        skipped = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await db._run(lambda: list(db.guids.find(query, sort=sort, skip=depth, limit=args.limit)))
+            skipped.append(time.perf_counter() - started)
+        print(f"{depth:>8}  {statistics.median(keyset) * 1000:10.2f}ms  {statistics.median(skipped) * 1000:10.2f}ms")
+
+    started = time.perf_counter()
+    response = await client.fetch(f"http://127.0.0.1:{port}/guid/_count?user=hot")
+    print(f"count: {response.body.decode()} in {(time.perf_counter() - started) * 1000:.1f}ms")
+    client.close()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=2000000)
+    parser.add_argument('--user-documents', type=int, default=400000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    IOLoop.current().run_sync(lambda: run(args), timeout=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Measures PATCH /guid/{guid} latency with the former write path (update_one, then find_one,
+then a cache write) against the single find_one_and_update, under both cache write policies.
+
+    python -m bench.patch [--requests N] [--concurrency C] [--latency SECONDS]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+class TwoHopDatabase(Database):
+    """Database that updates and then re-reads the document, as PATCH did before find_one_and_update."""
+
+    async def update_guid(self, guid, metadata):
+        await self._run(self.guids.update_one, {'_id': guid}, {'$set': metadata})
+        return await self.get_guid(guid)
+
+
+async def run_patches(app, guids, requests, concurrency):
+    """Issues `requests` PATCHes from `concurrency` workers and returns their latencies in seconds."""
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    remaining = [requests]
+    latencies = []
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            body = json.dumps({'user': f"user-{random.randrange(1000)}"})
+            started = time.perf_counter()
+            response = await client.fetch(f"http://127.0.0.1:{port}/guid/{random.choice(guids)}",
+                                          method='PATCH', body=body, raise_error=False)
+            latencies.append(time.perf_counter() - started)
+            assert response.code == 200, response.code
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    client.close()
+    server.stop()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.002, help='per-call backend latency in seconds')
+    parser.add_argument('--keys', type=int, default=500)
+    args = parser.parse_args()
+
+    for label, db_class, policy in [('update + find_one', TwoHopDatabase, 'write-through'),
+                                    ('find_one_and_update', Database, 'write-through'),
+                                    ('find_one_and_update', Database, 'invalidate')]:
+        db = db_class(client=FakeMongoClient(args.latency))
+        cache = Cache(client=FakeRedis(args.latency), negative_ttl=30, write_policy=policy)
+        guids = seed(db, args.keys)
+        latencies = sorted(IOLoop.current().run_sync(
+            lambda: run_patches(make_app(db=db, cache=cache), guids, args.requests, args.concurrency)))
+        print(f"{label:>20} / {policy:<13}: mean {statistics.mean(latencies) * 1000:6.2f}ms  "
+              f"p50 {latencies[len(latencies) // 2] * 1000:6.2f}ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f}ms  "
+              f"({db.guids.calls / args.requests:.1f} Mongo calls per PATCH)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares GET /guid/{guid} throughput and latency for several connection pool sizes, as set by
+MONGO_MAX_POOL_SIZE and REDIS_MAX_CONNECTIONS (each also sizes the executor its driver calls run on).
+Every request misses the cache, so each one costs a Redis and a Mongo round trip. The Mongo stand-in
+serves at most --capacity operations at once, like a busy mongod, so pools beyond it only add queueing.
+
+    python -m bench.pools [--pools 2,4,8,16,32,64] [--concurrency C] [--latency SECONDS] [--capacity N]
+"""
+import argparse
+import asyncio
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.config import Config
+from src.database import Database
+from src.router import make_app
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+async def run_gets(app, guids, concurrency):
+    """
+    Issues one GET per GUID in `guids` from `concurrency` workers, so each one misses the cache,
+    and returns requests/sec and the sorted latencies.
+    """
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    pending = list(guids)
+    latencies = []
+
+    async def worker():
+        while pending:
+            guid = pending.pop()
+            started = time.perf_counter()
+            response = await client.fetch(f"http://127.0.0.1:{port}/guid/{guid}", raise_error=False)
+            latencies.append(time.perf_counter() - started)
+            assert response.code == 200, response.code
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    client.close()
+    server.stop()
+    return len(guids) / elapsed, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pools', default='2,4,8,16,32,64')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.005, help='per-call backend latency in seconds')
+    parser.add_argument('--capacity', type=int, default=16, help='concurrent operations the Mongo stand-in serves')
+    args = parser.parse_args()
+
+    for size in [int(size) for size in args.pools.split(',')]:
+        config = Config(mongo_max_pool_size=size, redis_max_connections=size)
+        db = Database(client=FakeMongoClient(args.latency, args.capacity), executor=config.mongo_executor(),
+                      read_preference=config.read_preference())
+        cache = Cache(client=FakeRedis(args.latency), executor=config.redis_executor())
+        guids = seed(db, args.requests)
+        rate, latencies = IOLoop.current().run_sync(
+            lambda: run_gets(make_app(db=db, cache=cache), guids, args.concurrency))
+        print(f"pool {size:3d}: {rate:8.1f} req/s  p50 {latencies[len(latencies) // 2] * 1000:7.2f}ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures the overhead of the profiling hooks: requests/sec for GET /guid/{guid} with no hooks, with
+the admin endpoints routed but idle, with every request traced by the slow request log (threshold
+above any request, so only the tracing is measured), and while a profile samples the worker every
+--interval seconds. Also prints the cost of record_stage() outside a traced request, which every
+timed backend call pays.
+
+    python -m bench.profiling [--requests N] [--concurrency C] [--latency SECONDS] [--interval SECONDS]
+"""
+import argparse
+import statistics
+import timeit
+
+from tornado.ioloop import IOLoop
+
+from src import profiling
+from src.cache import Cache
+from src.database import Database
+from src.profiling import SlowRequestLog, StackSampler
+from src.router import make_app
+from .asyncBackends import run_load, seed
+from .standins import FakeMongoClient, FakeRedis
+
+MODES = ['no hooks', 'idle', 'slow log', 'profiling']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='per-call backend latency in seconds')
+    parser.add_argument('--interval', type=float, default=0.01, help='sampling interval while profiling')
+    parser.add_argument('--keys', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    count = 1000000
+    seconds = timeit.timeit(lambda: profiling.record_stage('redis.get', 0.0, 0.001), number=count)
+    seconds -= timeit.timeit(lambda: None, number=count)
+    print(f"record_stage outside a traced request: {seconds / count * 1e9:.0f} ns per call")
+
+    # Alternate the modes over several rounds so that warm-up and noise affect them alike.
+    rates = {mode: [] for mode in MODES}
+    for _ in range(args.rounds):
+        for mode in MODES:
+            db = Database(client=FakeMongoClient(args.latency))
+            cache = Cache(client=FakeRedis(args.latency))
+            guids = seed(db, args.keys)
+            if mode == 'no hooks':
+                app = make_app(db=db, cache=cache)
+            else:
+                app = make_app(db=db, cache=cache, admin_token='bench',
+                               slow_log=SlowRequestLog(threshold=3600) if mode == 'slow log' else None)
+            sampler = StackSampler(args.interval) if mode == 'profiling' else None
+            if sampler is not None:
+                sampler.start()
+            rates[mode].append(IOLoop.current().run_sync(
+                lambda: run_load(app, guids, args.requests, args.concurrency)))
+            if sampler is not None:
+                sampler.stop()
+                samples = sampler.samples
+
+    base = statistics.median(rates['no hooks'])
+    for mode in MODES:
+        rate = statistics.median(rates[mode])
+        extra = f", {samples} samples in the last round" if mode == 'profiling' else ''
+        print(f"{mode:>9}: {rate:8.1f} req/s median of {args.rounds}  ({(base - rate) / base * 100:+.1f}% overhead{extra})")
+
+
+if __name__ == '__main__':
+    main()
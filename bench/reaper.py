@@ -0,0 +1,61 @@
+"""
+Reaps a backlog of expired GUIDs while serving GETs for live ones. It reports the purge throughput,
+the collection size before and after, and the GET latency with and without the reaper running.
+
+    python -m bench.reaper [--expired N] [--live N] [--rate R] [--batch B] [--latency SECONDS]
+"""
+import argparse
+import time
+
+from tornado.ioloop import IOLoop
+
+from src.cache import Cache
+from src.database import Database
+from src.reaper import Reaper
+from src.router import make_app
+from .asyncBackends import seed
+from .pools import run_gets
+from .standins import FakeMongoClient, FakeRedis
+
+
+async def run(args):
+    db = Database(client=FakeMongoClient(args.latency))
+    cache = Cache(client=FakeRedis(args.latency))
+    live = seed(db, args.live)
+    now = int(time.time())
+    for guid in seed(db, args.expired):
+        db.guids.documents[guid]['expire'] = now - 60
+    app = make_app(db=db, cache=cache)
+
+    _, quiet = await run_gets(app, live[:args.requests], args.concurrency)
+    print(f"collection size before: {await db.count_guids()}")
+
+    reaper = Reaper(db, cache, batch_size=args.batch, rate=args.rate)
+    started = time.perf_counter()
+    task = IOLoop.current().asyncio_loop.create_task(reaper.reap())
+    _, busy = await run_gets(app, live[args.requests:args.requests * 2], args.concurrency)
+    deleted = await task
+    elapsed = time.perf_counter() - started
+    print(f"reaped {deleted} GUIDs in {elapsed:.2f}s = {deleted / elapsed:.0f}/s "
+          f"(rate limit {args.rate:.0f}/s, batches of {args.batch})")
+    print(f"collection size after: {await db.count_guids()}")
+    for label, latencies in [('GET without reaper', quiet), ('GET while reaping', busy)]:
+        print(f"{label:>19}: p50 {latencies[len(latencies) // 2] * 1000:6.2f}ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expired', type=int, default=50000)
+    parser.add_argument('--live', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=20000, help='reaper limit in GUIDs per second')
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.002, help='per-call backend latency in seconds')
+    args = parser.parse_args()
+    IOLoop.current().run_sync(lambda: run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Runs the API on in-memory backend stand-ins, optionally pre-forked, for load tests that
+need a real server process. The HTTP server settings take the same values as the API's.
+
+    python -m bench.serve [--port P] [--workers N] [--latency SECONDS] [--keys K]
+                          [--compression gzip,br] [--event-loop uvloop] [--idle-timeout SECONDS]
+"""
+import argparse
+import logging
+import os
+
+import tornado.netutil
+
+from src.cache import Cache
+from src.config import Config
+from src.database import Database
+from src.router import make_app
+from src.server import Worker, fork_workers
+from .standins import FakeMongoClient, FakeRedis
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--workers', type=int, default=1, help='worker processes, 0 for one per CPU')
+    parser.add_argument('--latency', type=float, default=0.0, help='per-call backend latency in seconds')
+    parser.add_argument('--keys', type=int, default=0, help='GUIDs to seed, numbered from %%032X of 0')
+    parser.add_argument('--compression', default='', help='COMPRESSION, none by default')
+    parser.add_argument('--compression-min-size', type=int, default=1024, help='COMPRESSION_MIN_SIZE')
+    parser.add_argument('--event-loop', default='asyncio', help='EVENT_LOOP')
+    parser.add_argument('--idle-timeout', type=float, default=75, help='HTTP_IDLE_CONNECTION_TIMEOUT')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    config = Config(compression=args.compression, compression_min_size=args.compression_min_size,
+                    event_loop=args.event_loop, http_idle_connection_timeout=args.idle_timeout)
+    config.install_event_loop()
+
+    sockets = tornado.netutil.bind_sockets(args.port, '127.0.0.1')
+    if args.workers != 1:
+        fork_workers(args.workers or os.cpu_count())
+
+    db = Database(client=FakeMongoClient(args.latency))
+    for i in range(args.keys):
+        guid = "%032X" % i
+        db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'bench', 'expire': 2 ** 31}
+    cache = Cache(client=FakeRedis(args.latency))
+    Worker(make_app(db=db, cache=cache, compression=config.response_compression()), sockets,
+           shutdown_timeout=10, **config.server_settings()).start()
+
+
+if __name__ == '__main__':
+    main()
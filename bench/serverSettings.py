@@ -0,0 +1,118 @@
+"""
+Benchmark matrix for the HTTP server settings: starts bench.serve with each event loop (uvloop when
+installed) and response compression, and drives it with a small GET of one GUID and a large GET of a
+1000-GUID listing page, over a new connection per request (like clients that open short-lived
+connections) and over keep-alive connections. For each combination it reports requests/sec, which
+for new connections is connections/sec, and the bytes each response takes on the wire, headers and
+chunk framing included. Clients accept gzip and br.
+
+    python -m bench.serverSettings [--duration SECONDS] [--concurrency C] [--keys K]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import subprocess
+import sys
+import time
+
+from tornado.testing import bind_unused_port
+
+from src import compression
+from .workers import wait_for
+
+WORKLOADS = [
+    ('small GET', '/guid/%032X' % 1),
+    ('1000-GUID page', '/guid?user=bench&limit=1000'),
+]
+
+
+async def read_response(reader):
+    """Reads one response and returns the bytes it took, from the status line to the last chunk."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    headers = dict(line.split(': ', 1) for line in head.decode('latin-1').split('\r\n')[1:] if ': ' in line)
+    headers = {name.lower(): value for name, value in headers.items()}
+    assert head.startswith(b'HTTP/1.1 200'), head[:40]
+    if 'content-length' in headers:
+        return len(head) + len(await reader.readexactly(int(headers['content-length'])))
+    size = len(head)
+    while True:
+        line = await reader.readline()
+        length = int(line.strip(), 16)
+        size += len(line) + len(await reader.readexactly(length + 2))
+        if length == 0:
+            return size
+
+
+def client_process(port, path, keep_alive, duration, concurrency, results):
+    """Issues GETs for `duration` seconds from `concurrency` connections and reports (requests, bytes)."""
+    connection = 'keep-alive' if keep_alive else 'close'
+    request = (f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept-Encoding: gzip, br\r\n"
+               f"Connection: {connection}\r\n\r\n").encode()
+
+    async def worker(totals):
+        deadline = time.monotonic() + duration
+        reader = writer = None
+        while time.monotonic() < deadline:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            size = await read_response(reader)
+            totals[0] += 1
+            totals[1] += size
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    async def run():
+        totals = [0, 0]
+        await asyncio.gather(*[worker(totals) for _ in range(concurrency)])
+        return totals
+
+    results.put(asyncio.run(run()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=3)
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent connections')
+    parser.add_argument('--keys', type=int, default=2000)
+    args = parser.parse_args()
+
+    loops = ['asyncio']
+    try:
+        import uvloop  # noqa: F401
+        loops.append('uvloop')
+    except ImportError:
+        print("uvloop is not installed, only the asyncio loop is measured")
+    encodings = [''] + [name for name in ('gzip', 'br') if compression.available(name)]
+
+    for loop in loops:
+        for encoding in encodings:
+            sock, port = bind_unused_port()
+            sock.close()
+            server = subprocess.Popen([sys.executable, '-m', 'bench.serve', '--port', str(port),
+                                       '--keys', str(args.keys), '--compression', encoding, '--event-loop', loop],
+                                      stderr=subprocess.DEVNULL)
+            try:
+                wait_for(port)
+                for label, path in WORKLOADS:
+                    for keep_alive in (False, True):
+                        results = multiprocessing.Queue()
+                        client = multiprocessing.Process(target=client_process, args=(
+                            port, path, keep_alive, args.duration, args.concurrency, results))
+                        client.start()
+                        requests, size = results.get()
+                        client.join()
+                        print(f"{loop:>7} {encoding or 'identity':>8} {label:>14} "
+                              f"{'keep-alive' if keep_alive else 'new conn':>10}: "
+                              f"{requests / args.duration:8.1f} req/s, {size / requests:8.0f} bytes per response")
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Synthetic cache stampede: every key is requested by many concurrent clients at the moment it
+is missing from Redis (cold) or inside its stale window. Reports Mongo queries per key and
+request latency with and without single-flight coalescing.
+
+    python -m bench.stampede [--keys K] [--clients C] [--latency SECONDS]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from src.singleflight import SingleFlight
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+class NoFlight:
+    """Stand-in for SingleFlight that runs every call, as the handler did before coalescing."""
+
+    async def do(self, key, fn):
+        return await fn()
+
+
+async def stampede(port, guids, clients):
+    """Fires `clients` concurrent GETs for every GUID at once and returns the slowest latency."""
+    client = AsyncHTTPClient(force_instance=True, max_clients=len(guids) * clients)
+
+    async def fetch(guid):
+        started = time.perf_counter()
+        await client.fetch(f"http://127.0.0.1:{port}/guid/{guid}")
+        return time.perf_counter() - started
+
+    latencies = await asyncio.gather(*[fetch(guid) for guid in guids for _ in range(clients)])
+    client.close()
+    return max(latencies)
+
+
+async def run(flights, args):
+    mongo = FakeMongoClient(args.latency)
+    redis = FakeRedis()
+    db = Database(client=mongo)
+    cache = Cache(client=redis, stale_ttl=30)
+    guids = seed(db, args.keys)
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=db, cache=cache, flights=flights))
+    server.add_sockets([sock])
+
+    cold = await stampede(port, guids, args.clients)
+    cold_queries = db.guids.calls
+
+    # Push every cached entry into its stale window and stampede again.
+    for guid in guids:
+        redis.set(guid, json.dumps(await db.get_guid(guid)), ex=10)
+    db.guids.calls = 0
+    stale = await stampede(port, guids, args.clients)
+    await asyncio.sleep(args.latency * 2)
+    stale_queries = db.guids.calls
+
+    server.stop()
+    return cold_queries, cold, stale_queries, stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=25, help='concurrent requests per key')
+    parser.add_argument('--latency', type=float, default=0.02, help='Mongo stand-in latency in seconds')
+    args = parser.parse_args()
+
+    for label, flights in [('no coalescing', NoFlight()), ('single-flight', SingleFlight())]:
+        cold_queries, cold, stale_queries, stale = IOLoop.current().run_sync(lambda: run(flights, args))
+        print(f"{label:>13}: cold  mongo queries/key={cold_queries / args.keys:5.1f}  max latency={cold * 1000:7.1f}ms")
+        print(f"{'':>13}  stale mongo queries/key={stale_queries / args.keys:5.1f}  max latency={stale * 1000:7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,724 @@
+"""
+In-memory stand-ins for the pymongo and redis-py clients used by Database and Cache.
+They block the calling thread for a configurable latency on every call, the same way
+the real drivers block on a network round trip, so benchmarks can run without Mongo or Redis.
+For chaos tests, faults can be injected while they are in use: raising `latency` makes calls hang,
+and setting `down` makes them fail with the driver's connection error, like a dropped connection.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from bson import Timestamp
+from pymongo.errors import AutoReconnect, BulkWriteError
+import redis
+
+from src.admission import TOKEN_BUCKET_SCRIPT
+
+
+def _match(document, query):
+    """Returns True if the document satisfies a (small subset of a) Mongo query filter."""
+    for field, condition in query.items():
+        if field == '$or':
+            if not any(_match(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == '$gt' and not (value is not None and value > operand):
+                    return False
+                if op == '$gte' and not (value is not None and value >= operand):
+                    return False
+                if op == '$lt' and not (value is not None and value < operand):
+                    return False
+                if op == '$lte' and not (value is not None and value <= operand):
+                    return False
+                if op == '$in' and value not in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _bound(condition):
+    """Returns the lower bound a single field condition puts on the value, or None."""
+    if isinstance(condition, dict):
+        for op in ('$gt', '$gte'):
+            if op in condition:
+                return condition[op]
+        return None
+    return condition
+
+
+def _lower_bound(query, field):
+    """Returns the smallest value `field` can take in a document matching the query, or None if unbounded."""
+    bounds = []
+    if _bound(query.get(field)) is not None:
+        bounds.append(_bound(query.get(field)))
+    branches = [_bound(branch.get(field)) for branch in query.get('$or', [])]
+    if branches and None not in branches:
+        bounds.append(min(branches))
+    return max(bounds) if bounds else None
+
+
+class _Documents(dict):
+    """A collection's documents keyed by _id; any change drops the sorted indexes, rebuilt on next use."""
+
+    def __init__(self, collection):
+        super().__init__()
+        self.collection = collection
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.collection.sorted = {}
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.collection.sorted = {}
+
+    def pop(self, *args):
+        self.collection.sorted = {}
+        return super().pop(*args)
+
+    def clear(self):
+        self.collection.sorted = {}
+        super().clear()
+
+
+class _Result:
+    """Mimics the pymongo *Result classes."""
+
+    def __init__(self, **fields):
+        self.acknowledged = True
+        self.__dict__.update(fields)
+
+
+class _Cursor:
+    """Iterates over a snapshot of the matching documents, like a pymongo Cursor."""
+
+    def __init__(self, documents):
+        self.documents = iter(documents)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.documents)
+
+    def close(self):
+        self.documents = iter(())
+
+
+class FakeCollection:
+    """
+    A thread-safe dict-backed collection with injected per-call latency.
+    With a capacity, at most that many calls are served at once and the others queue,
+    like operations waiting for a busy mongod.
+    A compound index ending in _id created with create_index() is kept as a sorted list of keys.
+    A sorted find() or a count_documents() with an equality on the index's first field walks that
+    list from the query's lower bound, so it costs what an index range scan costs instead of a
+    collection scan. The list is rebuilt after writes. Documents changed in place bypass that, so
+    change them before the first indexed query.
+    Once watch() has been called, writes through its methods are recorded for change streams.
+    """
+
+    def __init__(self, latency=0.0, capacity=None):
+        self.latency = latency
+        self.documents = _Documents(self)
+        self.indexes = {}
+        self.sorted = {}
+        self.calls = 0
+        self.down = False
+        self.lock = threading.Lock()
+        self.capacity = threading.BoundedSemaphore(capacity) if capacity else None
+        self.changes = None
+
+    def _changed(self, operation, key):
+        """Records a change for the change streams. The caller must hold the lock."""
+        if self.changes is None:
+            return
+        document = self.documents.get(key)
+        self.changes.append({
+            '_id': {'_data': str(len(self.changes))},
+            'operationType': operation,
+            'documentKey': {'_id': key},
+            'fullDocument': dict(document) if document is not None else None,
+            'clusterTime': Timestamp(int(time.time()), len(self.changes) + 1),
+        })
+
+    def watch(self, resume_after=None, full_document=None, max_await_time_ms=None):
+        self._wait()
+        with self.lock:
+            if self.changes is None:
+                self.changes = []
+            position = int(resume_after['_data']) + 1 if resume_after else len(self.changes)
+        return _FakeChangeStream(self, position, (max_await_time_ms or 1000) / 1000)
+
+    def _wait(self):
+        with self.lock:
+            self.calls += 1
+        if self.down:
+            raise AutoReconnect('connection refused')
+        if self.latency:
+            if self.capacity is None:
+                time.sleep(self.latency)
+            else:
+                with self.capacity:
+                    time.sleep(self.latency)
+
+    def _candidates(self, query):
+        """Narrows the scan to the matching documents for plain and $in _id lookups."""
+        key = query.get('_id')
+        if isinstance(key, dict) and set(key) == {'$in'}:
+            return [self.documents[k] for k in key['$in'] if k in self.documents]
+        if key is not None and not isinstance(key, dict):
+            document = self.documents.get(key)
+            return [document] if document is not None else []
+        return list(self.documents.values())
+
+    def _index_scan(self, query, sort=None):
+        """
+        Returns the documents in index order from the query's lower bound onwards, for a query with an
+        equality on the first field of an index (sorted by its remaining fields, if a sort is given),
+        or None if no index applies. The caller must hold the lock.
+        """
+        for spec in self.indexes.values():
+            fields = tuple(field for field, _ in spec['key'])
+            if len(fields) < 2 or fields[-1] != '_id' or fields[0] not in query or isinstance(query[fields[0]], dict):
+                continue
+            if sort is not None and tuple(field for field, _ in sort) != fields[1:]:
+                continue
+            keys = self.sorted.get(fields)
+            if keys is None:
+                keys = self.sorted[fields] = sorted(
+                    tuple(document.get(field) for field in fields) for document in self.documents.values()
+                    if all(document.get(field) is not None for field in fields))
+            value = query[fields[0]]
+            bound = _lower_bound(query, fields[1])
+            start = bisect_left(keys, (value,) if bound is None else (value, bound))
+            return self._walk(keys, start, value)
+        return None
+
+    def _walk(self, keys, start, value):
+        for position in range(start, len(keys)):
+            key = keys[position]
+            if key[0] != value:
+                return
+            yield self.documents[key[-1]]
+
+    def with_options(self, **options):
+        # Read preferences only matter with replicas; the stand-in has one copy of the data.
+        return self
+
+    def find_one(self, query):
+        self._wait()
+        with self.lock:
+            for document in self._candidates(query):
+                if _match(document, query):
+                    return dict(document)
+        return None
+
+    def insert_one(self, document):
+        self._wait()
+        with self.lock:
+            if document['_id'] in self.documents:
+                raise KeyError(f"duplicate key: {document['_id']}")
+            self.documents[document['_id']] = dict(document)
+            self._changed('insert', document['_id'])
+        return _Result(inserted_id=document['_id'])
+
+    def insert_many(self, documents, ordered=True):
+        self._wait()
+        errors = []
+        with self.lock:
+            for index, document in enumerate(documents):
+                if document['_id'] in self.documents:
+                    errors.append({'index': index, 'code': 11000, 'errmsg': 'duplicate key', 'op': document})
+                    if ordered:
+                        break
+                    continue
+                self.documents[document['_id']] = dict(document)
+                self._changed('insert', document['_id'])
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(documents) - len(errors)})
+        return _Result(inserted_ids=[document['_id'] for document in documents])
+
+    def find(self, query, projection=None, batch_size=0, limit=0, sort=None, skip=0):
+        self._wait()
+        with self.lock:
+            ordered = self._index_scan(query, sort) if sort else None
+            if ordered is None:
+                ordered = self._candidates(query)
+                if sort:
+                    # The direction of the first field applies to the whole key.
+                    ordered = sorted(ordered, key=lambda document: tuple(document.get(field) for field, _ in sort),
+                                     reverse=sort[0][1] < 0)
+            matches = []
+            for document in ordered:
+                if not _match(document, query):
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                matches.append(dict(document))
+                if len(matches) == limit:
+                    break
+        if projection:
+            matches = [{field: document[field] for field in projection if field in document} for document in matches]
+        return _Cursor(matches)
+
+    def create_index(self, keys, **options):
+        self._wait()
+        self.indexes[options.get('name', '_'.join(f"{field}_{direction}" for field, direction in keys))] = \
+            dict(options, key=keys)
+
+    def count_documents(self, query):
+        self._wait()
+        with self.lock:
+            candidates = self._index_scan(query)
+            if candidates is None:
+                candidates = self._candidates(query)
+            return sum(1 for document in candidates if _match(document, query))
+
+    def estimated_document_count(self):
+        self._wait()
+        return len(self.documents)
+
+    def delete_many(self, query):
+        self._wait()
+        with self.lock:
+            matches = [document['_id'] for document in self._candidates(query) if _match(document, query)]
+            for key in matches:
+                del self.documents[key]
+                self._changed('delete', key)
+        return _Result(deleted_count=len(matches))
+
+    def update_one(self, query, update):
+        self._wait()
+        with self.lock:
+            for document in self._candidates(query):
+                if _match(document, query):
+                    document.update(update.get('$set', {}))
+                    self.sorted = {}
+                    self._changed('update', document['_id'])
+                    return _Result(matched_count=1, modified_count=1)
+        return _Result(matched_count=0, modified_count=0)
+
+    def find_one_and_update(self, query, update, projection=None, return_document=False):
+        self._wait()
+        with self.lock:
+            for document in self._candidates(query):
+                if _match(document, query):
+                    before = dict(document)
+                    document.update(update.get('$set', {}))
+                    self.sorted = {}
+                    self._changed('update', document['_id'])
+                    result = dict(document) if return_document else before
+                    for field, included in (projection or {}).items():
+                        if not included:
+                            result.pop(field, None)
+                    return result
+        return None
+
+    def delete_one(self, query):
+        self._wait()
+        with self.lock:
+            for document in self._candidates(query):
+                if _match(document, query):
+                    del self.documents[document['_id']]
+                    self._changed('delete', document['_id'])
+                    return _Result(deleted_count=1)
+        return _Result(deleted_count=0)
+
+
+class _FakeChangeStream:
+    """Reads the changes a FakeCollection records, like a pymongo ChangeStream."""
+
+    def __init__(self, collection, position, max_await):
+        self.collection = collection
+        self.position = position
+        self.max_await = max_await
+        self.resume_token = {'_data': str(position - 1)} if position else None
+
+    def try_next(self):
+        # A change already read is returned at once; otherwise wait for one up to max_await, like a getMore.
+        deadline = time.monotonic() + self.max_await
+        while True:
+            with self.collection.lock:
+                if self.position < len(self.collection.changes):
+                    change = self.collection.changes[self.position]
+                    self.position += 1
+                    self.resume_token = change['_id']
+                    return change
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.001)
+
+    def close(self):
+        pass
+
+
+class FakeMongoClient:
+    """Stands in for MongoClient: client[db][collection] returns a shared FakeCollection."""
+
+    def __init__(self, latency=0.0, capacity=None):
+        self.latency = latency
+        self.capacity = capacity
+        self.databases = {}
+
+    def __getitem__(self, name):
+        return self.databases.setdefault(name, _FakeMongoDatabase(self.latency, self.capacity))
+
+
+class _FakeMongoDatabase:
+
+    def __init__(self, latency, capacity):
+        self.latency = latency
+        self.capacity = capacity
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self.latency, self.capacity)
+        return self.collections[name]
+
+
+class FakeRedis:
+    """
+    A thread-safe dict-backed Redis stand-in with injected per-call latency. With `max_keys`, it
+    evicts the least recently used key past that many, like Redis with maxmemory and allkeys-lru.
+    """
+
+    def __init__(self, latency=0.0, max_keys=None):
+        self.latency = latency
+        self.max_keys = max_keys
+        self.store = {}
+        self.hashes = {}
+        self.zsets = {}
+        self.streams = {}
+        self.subscribers = {}
+        self.calls = 0
+        self.down = False
+        self.lock = threading.Lock()
+
+    def _wait(self):
+        with self.lock:
+            self.calls += 1
+        if self.down:
+            raise redis.ConnectionError('Connection refused')
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _live(self, key):
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        value, deadline = entry
+        if deadline is not None and deadline <= time.time():
+            del self.store[key]
+            return None
+        if self.max_keys:
+            self.store[key] = self.store.pop(key)  # most recently used last
+        return value
+
+    def __getattr__(self, name):
+        # Every public command pays one round trip and then runs its _-prefixed implementation.
+        command = getattr(type(self), '_' + name, None)
+        if command is None or name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self._wait()
+            return command(self, *args, **kwargs)
+        return call
+
+    def _get(self, key):
+        with self.lock:
+            return self._live(key)
+
+    def _mget(self, keys):
+        with self.lock:
+            return [self._live(key) for key in keys]
+
+    def _set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self.lock:
+            self.store.pop(key, None)
+            self.store[key] = (value, time.time() + ex if ex else None)
+            if self.max_keys and len(self.store) > self.max_keys:
+                del self.store[next(iter(self.store))]
+        return True
+
+    def _ttl(self, key):
+        with self.lock:
+            if self._live(key) is None:
+                return -2
+            deadline = self.store[key][1]
+            return -1 if deadline is None else int(deadline - time.time())
+
+    def _exists(self, *keys):
+        with self.lock:
+            return sum(self._live(key) is not None for key in keys)
+
+    def _delete(self, *keys):
+        with self.lock:
+            return sum(self.store.pop(key, None) is not None for key in keys)
+
+    def _publish(self, channel, message):
+        """Delivers a message synchronously to every handler subscribed to the channel."""
+        if isinstance(message, str):
+            message = message.encode()
+        handlers = list(self.subscribers.get(channel, []))
+        for handler in handlers:
+            handler({'type': 'message', 'pattern': None, 'channel': channel.encode(), 'data': message})
+        return len(handlers)
+
+    def _hset(self, name, key, value):
+        if isinstance(value, str):
+            value = value.encode()
+        with self.lock:
+            fields = self.hashes.setdefault(name, {})
+            added = key not in fields
+            fields[key] = value
+            return int(added)
+
+    def _hget(self, name, key):
+        with self.lock:
+            return self.hashes.get(name, {}).get(key)
+
+    def _hmget(self, name, keys):
+        with self.lock:
+            fields = self.hashes.get(name, {})
+            return [fields.get(key) for key in keys]
+
+    def _hdel(self, name, *keys):
+        with self.lock:
+            fields = self.hashes.get(name, {})
+            return sum(fields.pop(key, None) is not None for key in keys)
+
+    def _hlen(self, name):
+        with self.lock:
+            return len(self.hashes.get(name, {}))
+
+    # Sorted sets: member -> score dicts, ranked on demand.
+    def _ranked(self, name):
+        zset = self.zsets.get(name, {})
+        return sorted(zset, key=lambda member: (zset[member], member))
+
+    def _zadd(self, name, mapping):
+        with self.lock:
+            zset = self.zsets.setdefault(name, {})
+            added = 0
+            for member, score in mapping.items():
+                member = member.encode() if isinstance(member, str) else member
+                added += member not in zset
+                zset[member] = float(score)
+            return added
+
+    def _zcard(self, name):
+        with self.lock:
+            return len(self.zsets.get(name, {}))
+
+    def _zrevrange(self, name, start, end):
+        with self.lock:
+            ranked = self._ranked(name)[::-1]
+            return ranked[start:len(ranked) if end == -1 else end + 1]
+
+    def _zremrangebyrank(self, name, start, end):
+        with self.lock:
+            ranked = self._ranked(name)
+            end = len(ranked) + end if end < 0 else end
+            start = max(0, len(ranked) + start if start < 0 else start)
+            removed = ranked[start:end + 1] if 0 <= start <= end else []
+            for member in removed:
+                del self.zsets[name][member]
+            return len(removed)
+
+    # Streams: entries are kept in id order; each consumer group tracks its last delivered id and
+    # the entries delivered to its consumers but not acknowledged yet.
+
+    @staticmethod
+    def _stream_id(value):
+        if isinstance(value, bytes):
+            value = value.decode()
+        ms, _, seq = value.partition('-')
+        return int(ms), int(seq or 0)
+
+    def _stream(self, name):
+        return self.streams.setdefault(name, {'entries': {}, 'last': (0, 0), 'groups': {}})
+
+    def _xadd(self, name, fields, id='*', maxlen=None, approximate=True):
+        fields = {key.encode() if isinstance(key, str) else key: value.encode() if isinstance(value, str) else value
+                  for key, value in fields.items()}
+        with self.lock:
+            stream = self._stream(name)
+            ms = int(time.time() * 1000)
+            last_ms, last_seq = stream['last']
+            entry_id = (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+            stream['entries'][entry_id] = fields
+            stream['last'] = entry_id
+            if maxlen is not None and len(stream['entries']) > maxlen:
+                for old in sorted(stream['entries'])[:-maxlen]:
+                    del stream['entries'][old]
+        return b'%d-%d' % entry_id
+
+    def _xlen(self, name):
+        with self.lock:
+            return len(self.streams.get(name, {}).get('entries', ()))
+
+    def _xrange(self, name, min='-', max='+', count=None):
+        with self.lock:
+            entries = sorted(self.streams.get(name, {}).get('entries', {}).items())
+        low = (0, 0) if min == '-' else self._stream_id(min)
+        high = None if max == '+' else self._stream_id(max)
+        selected = [(b'%d-%d' % entry_id, dict(fields)) for entry_id, fields in entries
+                    if entry_id >= low and (high is None or entry_id <= high)]
+        return selected[:count] if count else selected
+
+    def _xdel(self, name, *ids):
+        with self.lock:
+            entries = self._stream(name)['entries']
+            return sum(entries.pop(self._stream_id(entry_id), None) is not None for entry_id in ids)
+
+    def _xgroup_create(self, name, groupname, id='$', mkstream=False):
+        with self.lock:
+            if name not in self.streams and not mkstream:
+                raise redis.ResponseError('The XGROUP subcommand requires the key to exist.')
+            stream = self._stream(name)
+            if groupname in stream['groups']:
+                raise redis.ResponseError('BUSYGROUP Consumer Group name already exists')
+            start = stream['last'] if id == '$' else self._stream_id(id)
+            stream['groups'][groupname] = {'last': start, 'pending': {}}
+        return True
+
+    def _xreadgroup(self, groupname, consumername, streams, count=None, block=None, noack=False):
+        # Only new entries ('>') wait up to `block` milliseconds; a consumer's own pending entries never block.
+        deadline = time.monotonic() + (block or 0) / 1000
+        while True:
+            response = []
+            with self.lock:
+                for name, position in streams.items():
+                    stream = self.streams.get(name)
+                    if stream is None or groupname not in stream['groups']:
+                        raise redis.ResponseError('NOGROUP No such key or consumer group')
+                    group = stream['groups'][groupname]
+                    if position in ('>', b'>'):
+                        ids = [entry_id for entry_id in sorted(stream['entries']) if entry_id > group['last']]
+                    else:
+                        start = self._stream_id(position)
+                        ids = sorted(entry_id for entry_id, (consumer, _, _) in group['pending'].items()
+                                     if consumer == consumername and entry_id > start)
+                    ids = ids[:count] if count else ids
+                    entries = []
+                    for entry_id in ids:
+                        if position in ('>', b'>'):
+                            group['last'] = entry_id
+                        delivered = group['pending'].get(entry_id, (consumername, 0, 0))[2]
+                        group['pending'][entry_id] = (consumername, time.monotonic(), delivered + 1)
+                        fields = stream['entries'].get(entry_id)
+                        entries.append((b'%d-%d' % entry_id, dict(fields) if fields is not None else None))
+                    if entries or position not in ('>', b'>'):
+                        response.append([name.encode(), entries])
+            if any(entries for _, entries in response) or block is None or time.monotonic() >= deadline:
+                return response
+            time.sleep(0.001)
+
+    def _xack(self, name, groupname, *ids):
+        with self.lock:
+            pending = self._stream(name)['groups'][groupname]['pending']
+            return sum(pending.pop(self._stream_id(entry_id), None) is not None for entry_id in ids)
+
+    def _xpending_range(self, name, groupname, min, max, count, consumername=None):
+        with self.lock:
+            pending = sorted(self._stream(name)['groups'][groupname]['pending'].items())
+        low = (0, 0) if min == '-' else self._stream_id(min)
+        now = time.monotonic()
+        return [{'message_id': b'%d-%d' % entry_id, 'consumer': consumer.encode(),
+                 'time_since_delivered': int((now - delivered_at) * 1000), 'times_delivered': delivered}
+                for entry_id, (consumer, delivered_at, delivered) in pending
+                if entry_id >= low and (consumername is None or consumer == consumername)][:count]
+
+    def _xclaim(self, name, groupname, consumername, min_idle_time, message_ids):
+        claimed = []
+        with self.lock:
+            stream = self._stream(name)
+            pending = stream['groups'][groupname]['pending']
+            now = time.monotonic()
+            for entry_id in map(self._stream_id, message_ids):
+                entry = pending.get(entry_id)
+                if entry is None or (now - entry[1]) * 1000 < min_idle_time:
+                    continue
+                pending[entry_id] = (consumername, now, entry[2] + 1)
+                fields = stream['entries'].get(entry_id)
+                claimed.append((b'%d-%d' % entry_id, dict(fields) if fields is not None else None))
+        return claimed
+
+    def register_script(self, script):
+        """Returns a callable that runs the Python emulation of one of the API's Lua scripts in one round trip."""
+        emulation = {TOKEN_BUCKET_SCRIPT: self._token_bucket}[script]
+
+        def call(keys=(), args=(), client=None):
+            self._wait()
+            return emulation(keys, args)
+        return call
+
+    def _token_bucket(self, keys, args):
+        rate, burst, wanted = (float(arg) for arg in args)
+        now = time.time()
+        with self.lock:
+            bucket = self.hashes.setdefault(keys[0], {})
+            tokens = float(bucket.get('tokens', burst))
+            elapsed = max(0, now - float(bucket.get('ts', now)))
+            tokens = min(burst, tokens + elapsed * rate)
+            granted = min(int(wanted), int(tokens))
+            bucket['tokens'], bucket['ts'] = tokens - granted, now
+        return granted
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+class FakePipeline:
+    """Buffers commands and replays them against FakeRedis for the cost of a single round trip."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        self.redis._wait()
+        results = [getattr(self.redis, '_' + name)(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+class FakePubSub:
+    """Registers callback handlers on FakeRedis; messages are delivered on publish."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = {}
+
+    def subscribe(self, **handlers):
+        for channel, handler in handlers.items():
+            self.channels[channel] = handler
+            self.redis.subscribers.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, sleep_time=0, daemon=False):
+        return self
+
+    def stop(self):
+        for channel, handler in self.channels.items():
+            self.redis.subscribers[channel].remove(handler)
+        self.channels = {}
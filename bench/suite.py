@@ -0,0 +1,192 @@
+"""
+Load-tests the API under read-heavy, write-heavy and mixed workloads and writes the results as JSON:
+throughput and p50/p95/p99 latency per workload and per operation, with the commit they were measured at.
+Each workload runs against make_app with fresh in-memory stand-ins for MongoDB and Redis, seeded with
+--keys GUIDs, so the whole suite runs offline. Pass a previous result file as --compare to print the
+change in throughput and p99 for each workload; the exit status is 1 if any throughput dropped by more
+than --tolerance. --slow-request-threshold traces every request for the slow request log, so that a run
+with it compared against one without shows what tracing costs.
+
+    python -m bench.suite [--workloads read-heavy,write-heavy,mixed] [--requests N] [--concurrency C]
+                          [--output results.json] [--compare baseline.json] [--tolerance 0.1]
+                          [--slow-request-threshold SECONDS]
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.profiling import SlowRequestLog
+from src.router import make_app
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+# Share of each operation in a workload.
+WORKLOADS = {
+    'read-heavy': {'GET': 0.95, 'POST': 0.05},
+    'write-heavy': {'GET': 0.1, 'POST': 0.7, 'PATCH': 0.15, 'DELETE': 0.05},
+    'mixed': {'GET': 0.5, 'POST': 0.25, 'PATCH': 0.2, 'DELETE': 0.05},
+}
+
+
+def percentile(latencies, p):
+    """Returns the nearest-rank percentile of sorted latencies, in milliseconds."""
+    if not latencies:
+        return None
+    return round(latencies[min(len(latencies) - 1, max(0, math.ceil(p / 100 * len(latencies)) - 1))] * 1000, 3)
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+async def run_workload(app, guids, mix, requests, concurrency, rng):
+    """
+    Issues `requests` requests drawn from `mix` from `concurrency` workers against `app`.
+    GETs, PATCHes and DELETEs pick a live GUID; POSTs and DELETEs add and remove them.
+    Returns the summary for the whole workload and per operation, plus the count of unexpected statuses.
+    """
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    live = list(guids)
+    operations, weights = zip(*mix.items())
+    remaining = [requests]
+    latencies = {operation: [] for operation in operations}
+    errors = [0]
+    url = f"http://127.0.0.1:{port}/guid"
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            operation = rng.choices(operations, weights)[0]
+            if operation == 'POST':
+                request = dict(path=url, method='POST', body=json.dumps({'user': 'bench'}))
+            elif operation == 'GET':
+                request = dict(path=f"{url}/{rng.choice(live)}")
+            elif operation == 'PATCH':
+                expire = int(time.time()) + 7200
+                request = dict(path=f"{url}/{rng.choice(live)}", method='PATCH',
+                               body=json.dumps({'user': 'bench', 'expire': expire}))
+            else:
+                guid = live.pop(rng.randrange(len(live)))
+                request = dict(path=f"{url}/{guid}", method='DELETE')
+
+            started = time.perf_counter()
+            response = await client.fetch(request.pop('path'), raise_error=False, **request)
+            latencies[operation].append(time.perf_counter() - started)
+            if response.code >= 300:
+                errors[0] += 1
+            elif operation == 'POST':
+                live.append(json.loads(response.body)['guid'])
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    client.close()
+    server.stop()
+
+    result = summarize([latency for values in latencies.values() for latency in values], elapsed)
+    result['errors'] = errors[0]
+    result['operations'] = {operation: summarize(values, elapsed) for operation, values in latencies.items() if values}
+    return result
+
+
+def commit():
+    """Returns the current git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change of each workload against a baseline and returns False if throughput regressed."""
+    ok = True
+    print(f"compared with {baseline.get('commit') or 'baseline'}:", file=sys.stderr)
+    for name, result in results['workloads'].items():
+        before = baseline.get('workloads', {}).get(name)
+        if before is None:
+            continue
+        change = result['throughput'] / before['throughput'] - 1
+        regressed = change < -tolerance
+        ok = ok and not regressed
+        print(f"{name:>12}: {before['throughput']:8.1f} -> {result['throughput']:8.1f} req/s ({change:+.1%})  "
+              f"p99 {before['p99_ms']:7.2f} -> {result['p99_ms']:7.2f}ms{'  REGRESSION' if regressed else ''}",
+              file=sys.stderr)
+    return ok
+
+
+async def run(args):
+    results = {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'workloads': {},
+    }
+    rng = random.Random(args.seed)
+    for name in args.workloads.split(','):
+        db = Database(client=FakeMongoClient(args.mongo_latency))
+        cache = Cache(client=FakeRedis(args.redis_latency), negative_ttl=30)
+        guids = seed(db, args.keys)
+        slow_log = SlowRequestLog(args.slow_request_threshold) if args.slow_request_threshold else None
+        results['workloads'][name] = await run_workload(make_app(db=db, cache=cache, slow_log=slow_log), guids,
+                                                        WORKLOADS[name], args.requests, args.concurrency, rng)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workloads', default=','.join(WORKLOADS))
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--keys', type=int, default=1000)
+    parser.add_argument('--mongo-latency', type=float, default=0.002, help='per-call Mongo latency in seconds')
+    parser.add_argument('--redis-latency', type=float, default=0.0005, help='per-call Redis latency in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='throughput drop reported as a regression')
+    parser.add_argument('--slow-request-threshold', type=float, default=0,
+                        help='SLOW_REQUEST_THRESHOLD, 0 for no slow request log')
+    args = parser.parse_args()
+    unknown = set(args.workloads.split(',')) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    results = IOLoop.current().run_sync(lambda: run(args))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Simulates a restart with an empty Redis: replays a Zipf-distributed read workload against a cold cache,
+and against a cache warmed up first from the hot GUIDs recorded during an earlier run of the same
+workload (--history reads), then from the most recent GUIDs. Reports the warm-up time, the MongoDB calls made while
+serving the reads and their latency. MongoDB is a stand-in that serves --capacity operations at once.
+
+    python -m bench.warmup [--guids N] [--history N] [--requests N] [--concurrency C] [--warmup N] [--zipf S]
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from src.warmup import HotKeys, Warmer
+from .asyncBackends import seed
+from .standins import FakeMongoClient, FakeRedis
+
+
+def workload(guids, requests, exponent, rng):
+    """Draws `requests` GUIDs, the i-th most popular one with a probability proportional to 1 / i^exponent."""
+    weights = list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(len(guids))))
+    return rng.choices(guids, cum_weights=weights, k=requests)
+
+
+async def serve(db, cache, reads, concurrency, hot_keys=None):
+    sock, port = bind_unused_port()
+    server = HTTPServer(make_app(db=db, cache=cache, hot_keys=hot_keys))
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    url = f"http://127.0.0.1:{port}/guid/"
+    pending = iter(reads)
+    latencies = []
+
+    async def reader():
+        for guid in pending:
+            started = time.perf_counter()
+            response = await client.fetch(url + guid, raise_error=False)
+            assert response.code == 200, response.code
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[reader() for _ in range(concurrency)])
+    client.close()
+    server.stop()
+    latencies.sort()
+    return latencies
+
+
+async def run(args):
+    db = Database(client=FakeMongoClient(args.latency, args.capacity))
+    guids = seed(db, args.guids)
+    expire = int(time.time()) + 30 * 24 * 3600
+    for age, guid in enumerate(guids):
+        db.guids.documents[guid]['expire'] = expire - age  # popularity, drawn below, ignores age
+    rng = random.Random(1)
+    popular = rng.sample(guids, len(guids))
+    redis = FakeRedis(args.latency)
+
+    # An earlier run of the workload records the hot GUIDs in Redis.
+    hot_keys = HotKeys(Cache(client=redis), size=args.warmup)
+    await serve(db, Cache(client=redis), workload(popular, args.history, args.zipf, rng), args.concurrency, hot_keys)
+    await hot_keys.flush()
+    reads = workload(popular, args.requests, args.zipf, rng)
+
+    results = []
+    for label in ('cold', 'hot keys', 'recent GUIDs'):
+        redis.store.clear()
+        cache = Cache(client=redis)
+        started = time.perf_counter()
+        if label != 'cold':
+            await Warmer(db, cache, hot_keys if label == 'hot keys' else None, limit=args.warmup).run()
+        warmup = time.perf_counter() - started
+        calls = db.guids.calls
+        latencies = await serve(db, cache, reads, args.concurrency)
+        results.append((label, warmup, db.guids.calls - calls, latencies))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guids', type=int, default=100000)
+    parser.add_argument('--history', type=int, default=20000, help='reads recorded by the hot keys before the restart')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--warmup', type=int, default=10000, help='GUIDs loaded by the warm-up')
+    parser.add_argument('--zipf', type=float, default=1.0, help='exponent of the popularity distribution')
+    parser.add_argument('--latency', type=float, default=0.002, help='per-call backend latency in seconds')
+    parser.add_argument('--capacity', type=int, default=4, help='concurrent operations the Mongo stand-in serves')
+    args = parser.parse_args()
+    logging.getLogger('tornado.access').setLevel(logging.CRITICAL)
+
+    for label, warmup, calls, latencies in IOLoop.current().run_sync(lambda: run(args)):
+        print(f"{label:>12}: warm-up {warmup:6.2f}s, then {args.requests} GETs made {calls:5d} Mongo calls, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:6.2f}ms  p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Load test for the pre-fork launcher: starts bench.serve with 1, 2, 4, ... workers (up to the
+number of CPUs) and drives it from several client processes, reporting requests/sec for each.
+
+    python -m bench.workers [--duration SECONDS] [--clients N] [--concurrency C] [--workers 1,2,4]
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+
+def client_process(port, duration, concurrency, keys, results):
+    """Issues GETs for `duration` seconds from `concurrency` coroutines and reports the count."""
+    import asyncio
+    import random
+
+    async def run():
+        client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+        deadline = time.monotonic() + duration
+        count = [0]
+
+        async def worker():
+            while time.monotonic() < deadline:
+                guid = "%032X" % random.randrange(keys)
+                await client.fetch(f"http://127.0.0.1:{port}/guid/{guid}")
+                count[0] += 1
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return count[0]
+
+    results.put(IOLoop.current().run_sync(run))
+
+
+def wait_for(port, timeout=10):
+    """Waits until the server answers on the port."""
+    async def ping():
+        await AsyncHTTPClient(force_instance=True).fetch(f"http://127.0.0.1:{port}/")
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return IOLoop(make_current=False).run_sync(ping)
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent requests per client process')
+    parser.add_argument('--keys', type=int, default=1000)
+    parser.add_argument('--workers', help='comma-separated worker counts, by default powers of two up to the CPUs')
+    args = parser.parse_args()
+
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(',')]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= os.cpu_count():
+            counts.append(counts[-1] * 2)
+    print(f"{os.cpu_count()} CPUs")
+
+    for workers in counts:
+        sock, port = bind_unused_port()
+        sock.close()
+        server = subprocess.Popen([sys.executable, '-m', 'bench.serve', '--port', str(port),
+                                   '--workers', str(workers), '--keys', str(args.keys)],
+                                  stderr=subprocess.DEVNULL)
+        try:
+            wait_for(port)
+            results = multiprocessing.Queue()
+            clients = [multiprocessing.Process(target=client_process,
+                                               args=(port, args.duration, args.concurrency, args.keys, results))
+                       for _ in range(args.clients)]
+            for client in clients:
+                client.start()
+            total = sum(results.get() for _ in clients)
+            for client in clients:
+                client.join()
+        finally:
+            server.send_signal(signal.SIGTERM)
+            status = server.wait(timeout=30)
+        print(f"{workers:3d} workers: {total / args.duration:9.1f} req/s  (server exit status {status})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares sustained POST /guid throughput with synchronous inserts and in write-behind mode.
+Synchronously, every create waits for its own insert_one; in write-behind mode it waits for one Redis
+pipeline, and the flusher writes the queue with one insert_many per batch. The write-behind rate is
+reported both as acknowledged by the API and up to the point where the last create is in the database.
+The Mongo stand-in serves at most --capacity operations at once, and an insert_many costs one round trip
+whatever its size, so real batches would be somewhat slower than here.
+
+    python -m bench.writeBehind [--requests N] [--concurrency C] [--mongo-latency S] [--redis-latency S]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+
+from src.cache import Cache
+from src.database import Database
+from src.router import make_app
+from src.writeBehind import WriteBehind
+from .standins import FakeMongoClient, FakeRedis
+
+
+async def run_posts(app, requests, concurrency):
+    """Issues `requests` POST /guid calls from `concurrency` workers and returns requests/sec and the sorted latencies."""
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    client = AsyncHTTPClient(force_instance=True, max_clients=concurrency)
+    remaining = [requests]
+    latencies = []
+    body = json.dumps({'user': 'bench'})
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            response = await client.fetch(f"http://127.0.0.1:{port}/guid", method='POST', body=body,
+                                          raise_error=False)
+            latencies.append(time.perf_counter() - started)
+            assert response.code == 201, response.code
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    client.close()
+    server.stop()
+    return requests / elapsed, sorted(latencies)
+
+
+def report(label, rate, latencies):
+    print(f"{label:>26}: {rate:8.1f} creates/s  p50 {latencies[len(latencies) // 2] * 1000:7.2f}ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f}ms")
+
+
+async def run(args):
+    db = Database(client=FakeMongoClient(args.mongo_latency, args.capacity))
+    cache = Cache(client=FakeRedis(args.redis_latency))
+    rate, latencies = await run_posts(make_app(db=db, cache=cache), args.requests, args.concurrency)
+    report('synchronous', rate, latencies)
+
+    db = Database(client=FakeMongoClient(args.mongo_latency, args.capacity))
+    cache = Cache(client=FakeRedis(args.redis_latency))
+    writes = WriteBehind(db, cache, batch_size=args.batch, interval=args.interval)
+    writes.start()
+    started = time.perf_counter()
+    rate, latencies = await run_posts(make_app(db=db, cache=cache, writes=writes), args.requests, args.concurrency)
+    report('write-behind, acknowledged', rate, latencies)
+    await writes.stop(timeout=60)
+    elapsed = time.perf_counter() - started
+    stored = await db.count_guids()
+    print(f"{'write-behind, in database':>26}: {stored / elapsed:8.1f} creates/s  "
+          f"({stored} of {args.requests} stored, {db.guids.calls} Mongo calls)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--mongo-latency', type=float, default=0.01, help='per-call Mongo latency in seconds')
+    parser.add_argument('--redis-latency', type=float, default=0.0005, help='per-call Redis latency in seconds')
+    parser.add_argument('--capacity', type=int, default=2, help='concurrent operations the Mongo stand-in serves')
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--interval', type=float, default=0.05)
+    args = parser.parse_args()
+    IOLoop.current().run_sync(lambda: run(args))
+
+
+if __name__ == '__main__':
+    main()
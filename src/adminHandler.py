@@ -0,0 +1,69 @@
+from .baseHandler import BaseHandler
+from .profiling import ProfilerBusy
+
+class AdminHandler(BaseHandler):
+    """
+    Common base class for the operations endpoints under /admin, which are only routed when an admin
+    token is configured. Requests must send it as 'Authorization: Bearer <token>'; they are never shed
+    or rate limited, since they are most needed when the worker is overloaded, nor traced as slow requests.
+    """
+
+    traced = False
+
+    def initialize(self, token):
+        """Initializes the handler with the admin token."""
+        self.token = token
+
+    def priority(self):
+        return 'critical'
+
+    async def prepare(self):
+        """Admits the request, then refuses it with a 401 unless it carries the admin token."""
+        await super().prepare()
+        if self.admitted:
+            self.admitted = self.authorize(self.token)
+
+
+class ProfileHandler(AdminHandler):
+    """
+    POST /admin/profile?seconds=S&interval=I: samples the worker that answers for S seconds (default 10,
+    at most MAX_SECONDS), every I seconds (default 0.01), and returns the collapsed stacks as text/plain.
+    With several workers, the profile is of whichever one accepted the connection.
+    """
+
+    MAX_SECONDS = 60
+
+    async def post(self):
+        try:
+            seconds = float(self.get_query_argument('seconds', '10'))
+            interval = float(self.get_query_argument('interval', '0.01'))
+        except ValueError:
+            seconds = interval = 0
+        if not 0 < seconds <= self.MAX_SECONDS or not 0.001 <= interval <= 1:
+            self.set_status(400)
+            self.write({'error': f"Seconds must be between 0 and {self.MAX_SECONDS} and interval between "
+                                 f"0.001 and 1."})
+            return
+        try:
+            collapsed = await self.application.settings['profiler'].profile(seconds, interval)
+        except ProfilerBusy:
+            self.set_status(409)
+            self.write({'error': 'A profile is already running in this worker.'})
+            return
+        self.set_header('Content-Type', 'text/plain; charset=utf-8')
+        self.write(collapsed)
+
+
+class SlowRequestsHandler(AdminHandler):
+    """
+    GET /admin/slow-requests: returns the last requests the worker that answers served slower than the
+    slow request threshold, newest first, with the timings of their stages.
+    """
+
+    def get(self):
+        slow_log = self.application.settings.get('slow_log')
+        if slow_log is None:
+            self.set_status(404)
+            self.write({'error': 'The slow request log is disabled.'})
+            return
+        self.write({'threshold_ms': slow_log.threshold * 1000, 'items': list(reversed(slow_log.entries))})
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from tornado.log import app_log
+from .breaker import BackendUnavailable
+
+# Refills a token bucket stored as a hash {tokens, ts} and takes up to ARGV[3] tokens from it.
+# ARGV: rate (tokens per second), burst (bucket size), tokens wanted. Returns the tokens granted.
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(wanted, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return granted
+"""
+
+
+class RateLimiter:
+    """
+    A token bucket per client, shared by every worker and pod through Redis, refilled at `rate` tokens
+    per second up to `burst`. To keep Redis off the common path, a worker takes up to `lease` tokens at
+    a time and spends them locally; unspent tokens are dropped after `lease_ttl` seconds. A client can
+    therefore exceed its rate by at most `lease` requests per worker, and a worker makes one Redis round
+    trip per `lease` requests of a client. Refusals are remembered locally until the bucket has refilled
+    one token. Leases are taken through the Cache's Redis client and circuit breaker; if Redis fails,
+    or the breaker is open, requests are let through.
+    """
+
+    KEY_PREFIX = 'ratelimit:'
+    MAX_CLIENTS = 100000  # leases kept before expired ones are pruned
+
+    def __init__(self, cache, rate, burst, lease=10, lease_ttl=1.0):
+        """Initializes a new instance of the RateLimiter class."""
+        self.cache = cache
+        self.rate = rate
+        self.burst = burst
+        self.lease = min(lease, burst)
+        self.lease_ttl = lease_ttl
+        self.script = cache.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.leases = {}  # client -> [tokens left, deadline, refused]
+        self.refills = {}  # client -> future of the lease being fetched
+        self.round_trips = 0
+
+    async def allow(self, key):
+        """Takes a token for the client `key` and returns True, or returns False if it has none left."""
+        while True:
+            lease = self.leases.get(key)
+            if lease is not None and lease[1] > time.monotonic():
+                if lease[0] > 0:
+                    lease[0] -= 1
+                    return True
+                if lease[2]:
+                    return False  # a refusal stands until its deadline
+            refill = self.refills.get(key)
+            if refill is None:
+                # Concurrent requests of the same client share one lease request.
+                refill = self.refills[key] = asyncio.ensure_future(self._refill(key))
+                refill.add_done_callback(lambda _: self.refills.pop(key, None))
+            await asyncio.shield(refill)
+
+    async def _refill(self, key):
+        """Leases tokens from the client's bucket in Redis and returns the new local lease."""
+        if len(self.leases) > self.MAX_CLIENTS:
+            now = time.monotonic()
+            self.leases = {client: lease for client, lease in self.leases.items() if lease[1] > now}
+        self.round_trips += 1
+        try:
+            granted = int(await self.cache.run(self.script, keys=[self.KEY_PREFIX + key],
+                                               args=[self.rate, self.burst, self.lease]))
+        except BackendUnavailable:
+            granted = self.lease  # the breaker has logged the outage
+        except Exception as e:
+            app_log.error("Rate limiter lease failed, letting requests through: %s", e)
+            granted = self.lease
+        # Without tokens, ask again once the bucket has refilled one.
+        lease = [granted, time.monotonic() + (self.lease_ttl if granted else 1 / self.rate), not granted]
+        self.leases[key] = lease
+        return lease
+
+
+class Admission:
+    """
+    Admission control for a worker: a cap of `max_in_flight` concurrent requests (0 disables it), of
+    which 'low' priority requests (writes, bulk and streaming endpoints) may only take `low_share`, so
+    'high' ones (reads) keep a reserve of slots during a write storm; 'critical' ones (/, /metrics) are
+    never refused. Requests over the cap are answered with a 503 without touching the backends.
+    With a RateLimiter, requests other than 'critical' ones are also limited per client.
+    """
+
+    def __init__(self, max_in_flight=0, low_share=0.8, limiter=None):
+        """Initializes a new instance of the Admission class."""
+        self.max_in_flight = max_in_flight
+        self.limits = {
+            'critical': None,
+            'high': max_in_flight or None,
+            'low': max(1, int(max_in_flight * low_share)) if max_in_flight else None,
+        }
+        self.limiter = limiter
+
+    def admit(self, in_flight, priority):
+        """Returns True if a request of the given priority may start while `in_flight` others are served."""
+        limit = self.limits[priority]
+        return limit is None or in_flight < limit
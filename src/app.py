@@ -1,7 +1,108 @@
+import multiprocessing
+import os
+import sys
 import tornado.ioloop
+import tornado.netutil
 from .router import make_app
+from .cache import Cache, LocalCache
+from .config import Config, ConfigError
+from .database import Database
+from . import codec
+from .server import Worker, fork_workers
+from .metrics import LoopLagMonitor
+from .reaper import Reaper
+from .admission import Admission, RateLimiter
+from .writeBehind import WriteBehind
+from .warmup import HotKeys, Warmer
+from .changeCapture import ChangeCapture
+
+def main():
+    """
+    Loads and validates the configuration, binds the listening socket, forks WORKERS processes
+    sharing it (0 starts one per CPU) and serves the API in each of them until SIGTERM.
+    """
+    try:
+        config = Config.load()
+    except ConfigError as e:
+        sys.exit(str(e))
+    codec.use(config.json_codec)
+    config.install_event_loop()
+
+    sockets = tornado.netutil.bind_sockets(config.port)
+    # Counts the workers done warming up, shared with them by the fork (see Warmer).
+    warmed = multiprocessing.Value('i', 0)
+    index, count = 0, 1
+    if config.workers != 1:
+        count = config.workers or os.cpu_count()
+        index = fork_workers(count)
+
+    # Backend clients are created per worker, after the fork: pymongo and redis-py
+    # connection pools must not be shared between processes.
+    # The in-process cache tier is opt-in: LOCAL_CACHE_ENTRIES=0 (the default) disables it.
+    db = Database(client=config.mongo_client(), executor=config.mongo_executor(),
+                  read_preference=config.read_preference(), breaker=config.mongo_breaker())
+    local_entries = config.local_cache_entries
+    cache = Cache(client=config.redis_client(), executor=config.redis_executor(),
+                  local=LocalCache(max_entries=local_entries) if local_entries else None,
+                  stale_ttl=config.cache_stale_ttl,
+                  negative_ttl=config.cache_negative_ttl,
+                  write_policy=config.cache_write_policy,
+                  encoding=config.cache_encoding, dual_read=config.cache_dual_read,
+                  adaptive_ttl=config.cache_adaptive_ttl, min_ttl=config.cache_min_ttl,
+                  max_ttl=config.cache_max_ttl, admission=config.cache_admission,
+                  breaker=config.redis_breaker())
+    cache.start_listener()
+    # Index creation is idempotent, so every worker can ask for it.
+    tornado.ioloop.IOLoop.current().run_sync(db.ensure_indexes)
+
+    # Write-behind is opt-in; every worker runs a flusher, and they share the queue.
+    writes = None
+    if config.write_behind:
+        writes = WriteBehind(db, cache, batch_size=config.write_behind_batch_size,
+                             interval=config.write_behind_interval, claim_idle=config.write_behind_claim_idle)
+        writes.start()
+
+    limiter = None
+    if config.rate_limit:
+        limiter = RateLimiter(cache, rate=config.rate_limit,
+                              burst=config.rate_limit_burst, lease=config.rate_limit_lease)
+    admission = Admission(max_in_flight=config.max_in_flight, low_share=config.low_priority_share, limiter=limiter)
+
+    # The worker reports ready once its share of the warm-up is loaded; HOT_KEYS_SIZE=0 stops
+    # recording hot GUIDs, and the warm-up then loads the most recent ones instead.
+    hot_keys = None
+    if config.hot_keys_size:
+        hot_keys = HotKeys(cache, size=config.hot_keys_size, interval=config.hot_keys_interval)
+        hot_keys.start()
+    warmer = Warmer(db, cache, hot_keys, limit=config.warmup_guids, batch_size=config.warmup_batch_size,
+                    index=index, count=count, warmed=warmed)
+    warmer.start()
+
+    worker = Worker(make_app(db=db, cache=cache, writes=writes, admission=admission, warmer=warmer,
+                             hot_keys=hot_keys, max_age=config.http_max_age,
+                             compression=config.response_compression(), admin_token=config.admin_token or None,
+                             slow_log=config.slow_request_log(), guid_generator=config.id_generator()),
+                    sockets, config.shutdown_timeout, **config.server_settings())
+    if hot_keys is not None:
+        worker.on_shutdown(hot_keys.stop)
+    if writes is not None:
+        worker.on_shutdown(writes.stop)
+    worker.on_shutdown(cache.stop_listener)
+    if config.reaper_enabled and index == 0:
+        reaper = Reaper(db, cache, interval=config.reaper_interval, batch_size=config.reaper_batch_size,
+                        rate=config.reaper_rate)
+        reaper.start()
+        worker.on_shutdown(reaper.stop)
+    # Change capture needs a replica set; one worker tails the stream, as every one would see the same changes.
+    if config.cdc_enabled and index == 0:
+        capture = ChangeCapture(db, cache, sink=config.change_sink(cache), batch_size=config.cdc_batch_size,
+                                max_await=config.cdc_max_await)
+        capture.start()
+        worker.on_shutdown(capture.stop)
+    lag_monitor = LoopLagMonitor()
+    lag_monitor.start()
+    worker.on_shutdown(lag_monitor.stop)
+    worker.start()
 
 if __name__ == "__main__":
-    app = make_app()
-    app.listen(8888)
-    tornado.ioloop.IOLoop.current().start()
\ No newline at end of file
+    main()
@@ -0,0 +1,25 @@
+import asyncio
+from tornado.ioloop import IOLoop
+
+class BackgroundTask:
+    """
+    Base class for the components a worker runs next to the API, such as the Reaper: start() runs
+    the run() coroutine that subclasses define as a task on the current IOLoop, and stop() cancels it.
+    """
+
+    task = None
+
+    def start(self):
+        """Starts run() in the background on the current IOLoop, unless it is running already."""
+        if self.task is None:
+            self.task = IOLoop.current().asyncio_loop.create_task(self.run())
+
+    async def stop(self):
+        """Cancels run() and waits until it has ended."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
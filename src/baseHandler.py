@@ -0,0 +1,132 @@
+import hmac
+import time
+import tornado.web
+from . import codec, metrics, profiling
+
+class RequestTracker:
+    """
+    Counts the requests a worker process is currently serving, so that a graceful
+    shutdown can wait for them to finish. `draining` is set once that shutdown has begun.
+    """
+
+    def __init__(self):
+        """Initializes a new instance of the RequestTracker class."""
+        self.in_flight = 0
+        self.draining = False
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    """
+    Common base class for the API handlers.
+    Registers every request with the application's RequestTracker from prepare() until on_finish(),
+    and records its status and latency, and the time spent encoding JSON bodies, in the metrics.
+    When the application has an Admission, prepare() first rejects requests over the in-flight cap
+    with a 503 and requests over the client's rate limit with a 429; `admitted` tells whether it did not.
+    When it has a SlowRequestLog, the stages of requests to `traced` handlers are recorded and
+    on_finish() hands them to it.
+    """
+
+    traced = True
+    tracked = False
+    admitted = False
+    stages = None
+
+    def priority(self):
+        """Returns the request's admission priority: 'high' for reads, 'low' for writes."""
+        return 'high' if self.request.method in ('GET', 'HEAD') else 'low'
+
+    def client_key(self):
+        """Returns the key requests are rate limited by: the X-API-Key header, else the client's IP."""
+        api_key = self.request.headers.get('X-API-Key')
+        return f"key:{api_key}" if api_key else f"ip:{self.request.remote_ip}"
+
+    async def prepare(self):
+        """Admits the request and marks it as in flight."""
+        if self.traced and self.application.settings.get('slow_log') is not None:
+            # Stage times are given from the start of the request, before its body was read.
+            now = time.perf_counter()
+            self.stages = profiling.trace_stages()
+            self.origin = now - self.request.request_time()
+            self.stages.append(('receive', self.origin, now - self.origin))
+            try:
+                await self._admit()
+            finally:
+                self.stages.append(('admission', now, time.perf_counter() - now))
+            return
+        await self._admit()
+
+    async def _admit(self):
+        admission = self.application.settings.get('admission')
+        tracker = self.application.settings['tracker']
+        priority = self.priority() if admission is not None else None
+        if admission is not None and not admission.admit(tracker.in_flight, priority):
+            self.reject(503, 'overload', priority, 'Server is overloaded, retry later.')
+            return
+        tracker.in_flight += 1
+        self.tracked = True
+        if admission is not None and admission.limiter is not None and priority != 'critical':
+            if not await admission.limiter.allow(self.client_key()):
+                self.reject(429, 'rate_limit', priority, 'Rate limit exceeded, retry later.')
+                return
+        self.admitted = True
+
+    def reject(self, status, reason, priority, message):
+        """Answers a request that was not admitted."""
+        metrics.REJECTED.inc(reason, priority)
+        self.set_status(status)
+        self.set_header('Retry-After', '1')
+        self.write({'error': message})
+        self.finish()
+
+    def authorize(self, token):
+        """
+        Returns whether the request carries `token` as 'Authorization: Bearer <token>'.
+        If it does not, sends a 401 error response.
+        """
+        expected = f"Bearer {token}".encode()
+        if hmac.compare_digest(self.request.headers.get('Authorization', '').encode(), expected):
+            return True
+        self.set_status(401)
+        self.set_header('WWW-Authenticate', 'Bearer')
+        self.finish({'error': 'Missing or invalid admin token.'})
+        return False
+
+    def write_error(self, status_code, **kwargs):
+        """
+        Answers errors raised by a handler, such as BackendUnavailable, with a JSON body.
+        A 503 also gets a Retry-After, like the requests refused by admission control.
+        """
+        if status_code == 503:
+            self.set_header('Retry-After', '1')
+        self.finish({'error': self._reason})
+
+    def write(self, chunk):
+        """Writes a chunk of the response, encoding dicts to JSON with the configured codec."""
+        if isinstance(chunk, dict):
+            started = time.perf_counter()
+            chunk = codec.dumps(chunk)
+            if metrics.enabled:
+                elapsed = time.perf_counter() - started
+                metrics.JSON_ENCODE_LATENCY.observe(elapsed)
+                profiling.record_stage('json.encode', started, elapsed)
+            self.set_header("Content-Type", "application/json; charset=UTF-8")
+        super().write(chunk)
+
+    def write_json(self, payload):
+        """Writes bytes that are already JSON, such as a cached GUID, as the response body."""
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        super().write(payload)
+
+    def on_finish(self):
+        """Marks the request as done. Requests rejected before prepare() were never counted."""
+        if self.tracked:
+            self.application.settings['tracker'].in_flight -= 1
+            self.tracked = False
+        if self.stages is not None:
+            self.application.settings['slow_log'].record(self.request.method, self.request.uri, self.get_status(),
+                                                         self.request.request_time(), self.origin, self.stages)
+        if not metrics.enabled:
+            return
+        name = type(self).__name__
+        metrics.REQUESTS.inc(name, self.request.method, self.get_status())
+        metrics.REQUEST_LATENCY.observe(self.request.request_time(), name, self.request.method)
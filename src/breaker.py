@@ -0,0 +1,112 @@
+import asyncio
+import time
+import tornado.web
+from tornado.ioloop import IOLoop
+from tornado.log import app_log
+from .metrics import BACKEND_TIMEOUTS, BREAKER_STATE, FAST_FAILS
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half-open', 'open'
+STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class BackendUnavailable(tornado.web.HTTPError):
+    """
+    Raised by a Database or Cache call when its backend cannot be reached, did not answer within the
+    deadline, or its circuit breaker is open. Handlers that can do without the backend catch it;
+    anywhere else it turns into a 503 response.
+    """
+
+    def __init__(self, backend, reason):
+        """Initializes a new instance of the BackendUnavailable class."""
+        super().__init__(503, f"{backend} unavailable: {reason}")
+        self.backend = backend
+
+
+class CircuitBreaker:
+    """
+    Guards the calls to one backend. Each call runs on an executor and must finish within `deadline`
+    seconds (0 waits forever); a call that times out or fails with one of `errors` (connection errors,
+    as opposed to e.g. a duplicate key, which shows the backend is up) counts as a failure and is
+    raised as BackendUnavailable. After `failures` consecutive failures the breaker opens: calls fail
+    at once, without queueing on the executor, for `reset_timeout` seconds. Then a single probe call is
+    let through (half-open); its success closes the breaker and its failure opens it again.
+    The state, the timeouts and the calls failed fast are exported in the metrics.
+    """
+
+    def __init__(self, name, errors=(), deadline=0, failures=5, reset_timeout=5):
+        """Initializes a new instance of the CircuitBreaker class."""
+        self.name = name
+        self.errors = tuple(errors)
+        self.deadline = deadline
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened_at = 0
+        self.probing = False
+        BREAKER_STATE.set(STATES[CLOSED], name)
+
+    def available(self):
+        """Returns False while the breaker is open and not yet due for a probe, i.e. while calls fail fast."""
+        return self.state != OPEN or time.monotonic() >= self.opened_at + self.reset_timeout
+
+    async def call(self, executor, fn, deadline=None):
+        """
+        Runs the blocking function `fn` on the executor through the breaker and returns its result.
+        `deadline` overrides the breaker's own; pass 0 for calls that may legitimately take long.
+        """
+        probe = self._admit()
+        deadline = self.deadline if deadline is None else deadline
+        future = IOLoop.current().run_in_executor(executor, fn)
+        try:
+            result = await (asyncio.wait_for(future, deadline) if deadline else future)
+        except asyncio.TimeoutError:
+            BACKEND_TIMEOUTS.inc(self.name)
+            self._failed(probe)
+            raise BackendUnavailable(self.name, f"no answer within {deadline}s")
+        except self.errors as e:
+            self._failed(probe)
+            raise BackendUnavailable(self.name, str(e)) from e
+        except asyncio.CancelledError:
+            if probe:
+                self.probing = False
+            raise
+        except Exception:
+            self._succeeded(probe)
+            raise
+        self._succeeded(probe)
+        return result
+
+    def _admit(self):
+        """Lets a call through or raises BackendUnavailable; returns True if the call is the half-open probe."""
+        if self.state == CLOSED:
+            return False
+        if self.state == OPEN and time.monotonic() >= self.opened_at + self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        FAST_FAILS.inc(self.name)
+        raise BackendUnavailable(self.name, "circuit open")
+
+    def _succeeded(self, probe):
+        if probe:
+            self.probing = False
+        self.consecutive = 0
+        if self.state != CLOSED and (probe or self.state == HALF_OPEN):
+            self._set_state(CLOSED)
+
+    def _failed(self, probe):
+        if probe:
+            self.probing = False
+        self.consecutive += 1
+        if probe or (self.state == CLOSED and self.consecutive >= self.failures):
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state != self.state:
+            app_log.warning("%s circuit breaker %s", self.name, state)
+        self.state = state
+        BREAKER_STATE.set(STATES[state], self.name)
+
@@ -0,0 +1,208 @@
+import re
+from .breaker import BackendUnavailable
+from .guidHandler import GUIDHandler
+from . import codec
+
+GUID_PATTERN = re.compile(r'^[A-F0-9]{32}$')
+
+class BulkHandler(GUIDHandler):
+    """
+    Base class for the batch GUID endpoints.
+    Every item is validated like a single request and reported with its own status code,
+    while the backend work is one database call and one cache round trip for the whole batch.
+    With the cache unavailable they degrade like the single-GUID requests: creates and reads go to
+    the database alone, and deletes get a 503.
+    """
+
+    MAX_ITEMS = 1000
+
+    def priority(self):
+        """Batch and streaming requests are shed before single-GUID reads, whatever their method."""
+        return 'low'
+
+    def read_items(self, field):
+        """
+        Returns the list found under `field` in the JSON request body.
+        If the body is malformed or the list is empty or too long, sends a 400 error response and returns None.
+        """
+        try:
+            items = codec.loads(self.request.body).get(field)
+        except (ValueError, AttributeError):
+            items = None
+
+        if not isinstance(items, list) or not items:
+            self.set_status(400)
+            self.write({'error': f"Request body must contain a non-empty '{field}' list."})
+            return None
+        if len(items) > self.MAX_ITEMS:
+            self.set_status(400)
+            self.write({'error': f"At most {self.MAX_ITEMS} items are allowed per request."})
+            return None
+        return items
+
+    def read_guids(self):
+        """
+        Reads the 'guids' list from the request body.
+        Returns the list together with an ordered dict of the distinct well-formed GUIDs it contains,
+        or (None, None) after sending a 400 error response.
+        """
+        guids = self.read_items('guids')
+        if guids is None:
+            return None, None
+        valid = dict.fromkeys(guid for guid in guids if isinstance(guid, str) and GUID_PATTERN.match(guid))
+        return guids, valid
+
+    def validate_item(self, data, seen):
+        """
+        Validates one item of a batch create like a single POST, plus its optional 'guid'
+        field, which must be well formed and not among the GUIDs already `seen` in the request.
+        """
+        errors = self.validate_input(data)
+        guid = data.get('guid')
+        if guid is not None and not (isinstance(guid, str) and GUID_PATTERN.match(guid)):
+            errors['guid'] = 'GUID must be 32 uppercase hexadecimal characters.'
+        elif guid is not None and guid in seen:
+            errors['guid'] = 'GUID is repeated in the request.'
+        return errors
+
+    def invalid_guid(self, guid):
+        """Returns the per-item result for a malformed GUID."""
+        return {'status': 400, 'guid': guid, 'error': 'GUID must be 32 uppercase hexadecimal characters.'}
+
+
+class BulkGUIDHandler(BulkHandler):
+    """
+    Handles POST /guid/_bulk to create GUIDs and DELETE /guid/_bulk to delete them in batches.
+    """
+
+    SUPPORTED_METHODS = ("POST", "DELETE")
+
+    async def post(self):
+        """
+        Creates the GUIDs described by the 'items' list with a single insert_many.
+        Each item takes the same fields as POST /guid plus an optional 'guid'. A generated GUID that
+        turns out to be taken is replaced by another one, so it never fails the item.
+        """
+        items = self.read_items('items')
+        if items is None:
+            return
+
+        results = []
+        documents = {}
+        generated = set()
+        generate = self.application.settings['guid_generator']
+        for data in items:
+            if not isinstance(data, dict):
+                results.append({'status': 400, 'errors': {'invalid': 'Item must be a JSON object.'}})
+                continue
+
+            errors = self.validate_item(data, documents)
+            if errors:
+                results.append({'status': 400, 'errors': errors})
+                continue
+
+            metadata = self.build_metadata(data, data.get('guid'))
+            if data.get('guid') is None:
+                while metadata['guid'] in documents:
+                    metadata['guid'] = generate()
+                generated.add(metadata['guid'])
+            documents[metadata['guid']] = metadata
+            results.append(metadata)
+
+        created = await self.db.create_guids(documents, generated=generated, regenerate=generate) if documents else set()
+        # Regenerated GUIDs were renamed in their metadata, the results included.
+        documents = {metadata['guid']: metadata for metadata in documents.values()}
+        try:
+            await self.cache.set_many({guid: documents[guid] for guid in created})
+        except BackendUnavailable:
+            pass  # new GUIDs have no cached copy to update
+
+        for index, result in enumerate(results):
+            if 'status' in result:
+                continue
+            if result['guid'] in created:
+                results[index] = {'status': 201, **result}
+            else:
+                results[index] = {'status': 500, 'guid': result['guid'], 'error': 'Failed to create GUID.'}
+        self.write({'items': results})
+
+    async def delete(self):
+        """
+        Deletes the GUIDs in the 'guids' list with a single delete_many.
+        In write-behind mode GUIDs that are still queued are dropped from the queue first.
+        """
+        guids, valid = self.read_guids()
+        if guids is None:
+            return
+        self.require_cache()
+
+        discarded = set()
+        if self.writes is not None:
+            for guid in valid:
+                if await self.writes.discard(guid):
+                    discarded.add(guid)
+        deleted = await self.db.delete_guids(valid) if valid else set()
+        if deleted is None:
+            self.set_status(500)
+            self.write({'error': 'Failed to delete GUIDs.'})
+            return
+        deleted |= discarded
+        await self.cache.delete_many(valid)
+
+        results = []
+        for guid in guids:
+            if not (isinstance(guid, str) and guid in valid):
+                results.append(self.invalid_guid(guid))
+            elif guid in deleted:
+                results.append({'status': 204, 'guid': guid})
+            else:
+                results.append({'status': 404, 'guid': guid, 'error': 'GUID not found.'})
+        self.write({'items': results})
+
+
+class MultiGetHandler(BulkHandler):
+    """
+    Handles POST /guid/_mget to read a batch of GUIDs.
+    Cached GUIDs come from one MGET; the rest are fetched with one database query and cached.
+    """
+
+    SUPPORTED_METHODS = ("POST",)
+
+    async def post(self):
+        """
+        Returns the metadata of every GUID in the 'guids' list, in request order.
+        In write-behind mode GUIDs found neither in the cache nor in the database are looked up in the queue.
+        """
+        guids, valid = self.read_guids()
+        if guids is None:
+            return
+
+        try:
+            found = await self.cache.get_many(valid) if valid else {}
+        except BackendUnavailable:
+            found = {}
+        pending = [guid for guid in valid if guid not in found]
+        if pending:
+            loaded = await self.db.get_guids(pending)
+            if loaded is None:
+                self.set_status(500)
+                self.write({'error': 'Failed to fetch GUIDs.'})
+                return
+            queued = [guid for guid in pending if guid not in loaded]
+            if queued and self.writes is not None:
+                loaded.update(await self.writes.pending_many(queued))
+            try:
+                await self.cache.fill_many(loaded)
+            except BackendUnavailable:
+                pass
+            found.update(loaded)
+
+        results = []
+        for guid in guids:
+            if not (isinstance(guid, str) and guid in valid):
+                results.append(self.invalid_guid(guid))
+            elif guid in found:
+                results.append({'status': 200, **found[guid]})
+            else:
+                results.append({'status': 404, 'guid': guid, 'error': 'GUID not found or has expired.'})
+        self.write({'items': results})
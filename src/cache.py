@@ -1,35 +1,481 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from tornado.ioloop import IOLoop
+from .breaker import CircuitBreaker
+from .frequencySketch import FrequencySketch
+from .metrics import CACHE_ADMISSIONS, CACHE_LOOKUPS, timed
+from . import cacheEncoding, codec
+import functools
+import threading
 import redis
-import json
 import time
+import uuid
+
+# Returned by Cache.get for a GUID recorded as missing, as opposed to None for "not cached".
+MISSING = object()
+
+class LocalCache:
+    """
+    A bounded in-process LRU tier kept in front of Redis.
+    Entries hold the decoded GUID dict and expire after a short TTL, clamped by the document's
+    own 'expire' field, together with its encoded JSON when the caller has it, so a hit can be
+    served without encoding it again. The tier is bounded both by entry count and by the approximate
+    JSON size of the stored documents. Access is guarded by a lock because invalidations arrive on
+    the pub/sub listener thread.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, default_ttl=60):
+        """Initializes a new instance of the LocalCache class."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()  # guid -> (value, deadline, size, payload)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, guid):
+        """Returns a copy of the cached GUID data, or None if it is absent or has expired."""
+        entry = self._lookup(guid)
+        return dict(entry[0]) if entry is not None else None
+
+    def get_payload(self, guid):
+        """Returns the cached GUID data as JSON bytes, or None if it is absent, has expired or was stored without them."""
+        entry = self._lookup(guid)
+        return entry[3] if entry is not None else None
+
+    def _lookup(self, guid):
+        """Returns the live entry for a GUID and counts the hit or miss."""
+        with self.lock:
+            entry = self.entries.get(guid)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    self._remove(guid)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(guid)
+            self.hits += 1
+            return entry
+
+    def set(self, guid, value, size, payload=None):
+        """
+        Stores GUID data whose encoded form is `size` bytes, evicting least recently used entries.
+        Pass the encoded form itself as `payload` to make it available to get_payload().
+        """
+        ttl = self.default_ttl
+        remaining_time = value['expire'] - int(time.time())
+        if remaining_time < ttl:
+            ttl = remaining_time
+        if ttl <= 0 or size > self.max_bytes:
+            self.delete(guid)
+            return
+
+        with self.lock:
+            if guid in self.entries:
+                self._remove(guid)
+            self.entries[guid] = (dict(value), time.time() + ttl, size, payload)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def delete(self, guid):
+        """Evicts GUID data from the local tier."""
+        with self.lock:
+            if guid in self.entries:
+                self._remove(guid)
+
+    def _remove(self, guid):
+        """Drops an entry and its byte accounting. The caller must hold the lock."""
+        _, _, size, _ = self.entries.pop(guid)
+        self.bytes -= size
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters together with the current occupancy."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+            }
+
 
 class Cache:
     """
     A class used to interact with a Redis cache for caching GUID data.
+    All public methods are coroutines: the blocking redis-py calls run on a thread pool
+    so a slow Redis round trip never stalls the IOLoop.
+    When a LocalCache is given it is consulted before Redis, and deletes and invalidating
+    writes are published on a Redis channel so that the other replicas evict their copy.
+    With a stale_ttl, values are kept that many seconds past their refresh point and
+    get() can trigger a background refresh while still serving the stale value.
+    With a negative_ttl, GUIDs the database does not know are recorded under a separate
+    'missing:' key for that many seconds, and get() answers MISSING for them.
+    The write_policy decides what stored() does after a GUID is written to the database:
+    'write-through' caches the new value, 'invalidate' only drops the cached copy.
+    Redis calls go through a CircuitBreaker, which enforces their deadline; when Redis cannot be
+    reached the methods raise BackendUnavailable.
+    With adaptive_ttl, every lookup is counted in a FrequencySketch and a GUID is cached for min_ttl
+    seconds per recent lookup, between min_ttl and max_ttl, instead of default_ttl: GUIDs read once
+    leave Redis early and hot ones stay longer. With an `admission` threshold, fill() only caches GUIDs
+    looked up at least that many times recently, so one-off reads and scans do not take Redis memory.
+    The `encoding` (see cacheEncoding) decides the keys and values written. With dual_read, lookups
+    fall back to the other encoding's key, in the same round trip, and writes and deletes also remove
+    the GUID's keys in the other encoding, so replicas can switch encodings without a cold cache.
     """
 
-    def __init__(self):
+    INVALIDATION_CHANNEL = 'guid:invalidate'
+    MISSING_PREFIX = 'missing:'
+
+    WRITE_POLICIES = ('write-through', 'invalidate')
+
+    def __init__(self, client=None, executor=None, local=None, stale_ttl=0, negative_ttl=0,
+                 write_policy='write-through', breaker=None, encoding='json', dual_read=False,
+                 adaptive_ttl=False, min_ttl=300, max_ttl=14400, admission=0):
         """Initializes a new instance of the Cache class."""
-        self.client = redis.Redis(host='redis', port=6379, db=0)
+        self.client = client if client is not None else redis.Redis(host='redis', port=6379, db=0)
         self.default_ttl = 3600  # default TTL of 1 hour
+        self.stale_ttl = stale_ttl  # grace period served past the refresh point, 0 disables it
+        self.negative_ttl = negative_ttl  # lifetime of "known missing" tombstones, 0 disables them
+        self.negative_hits = 0  # database lookups avoided thanks to a tombstone
+        self.adaptive_ttl = adaptive_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.admission = admission  # lookups needed before fill() caches a GUID, 0 disables the filter
+        self.frequency = FrequencySketch() if adaptive_ttl or admission else None
+        if write_policy not in self.WRITE_POLICIES:
+            raise ValueError(f"Unknown cache write policy: {write_policy}")
+        self.write_policy = write_policy
+        self.encoding = cacheEncoding.encoding(encoding)
+        # The other encoding, whose keys are read and deleted too while migrating from or to it.
+        self.fallback = cacheEncoding.encoding(
+            next(name for name in cacheEncoding.ENCODINGS if name != encoding)) if dual_read else None
+        self.executor = executor or ThreadPoolExecutor(max_workers=32, thread_name_prefix='redis')
+        self.local = local
+        self.breaker = breaker or CircuitBreaker('redis', errors=(redis.ConnectionError, redis.TimeoutError))
+        self.node_id = uuid.uuid4().hex
+        self.listener = None
 
-    def get(self, guid):
-        """Retrieves GUID data from the cache."""
-        result = self.client.get(guid)
+    def run(self, fn, *args, deadline=None, **kwargs):
+        """
+        Runs a blocking driver call on the executor, through the breaker, and returns an awaitable for its result.
+        Besides the Cache itself, the components that keep their own keys in Redis make their calls through it.
+        `deadline` overrides the breaker's (see CircuitBreaker.call).
+        """
+        return self.breaker.call(self.executor, functools.partial(fn, *args, **kwargs), deadline=deadline)
+
+    def cache_keys(self, guid, prefix=''):
+        """
+        Returns the keys a GUID, or its companion key with the given prefix, may be stored under:
+        this encoding's first, then, with dual_read, the other encoding's.
+        """
+        keys = [self.encoding.key(guid, prefix)]
+        if self.fallback is not None and self.fallback.key(guid, prefix) != keys[0]:
+            keys.append(self.fallback.key(guid, prefix))
+        return keys
+
+    def tombstone_keys(self, guid):
+        """Returns the keys a GUID's "known missing" record may be stored under."""
+        return self.cache_keys(guid, self.MISSING_PREFIX)
+
+    def _remember(self, guid, value, payload):
+        """Keeps a value in the local tier, with the JSON that get(raw=True) answers with."""
+        if not cacheEncoding.is_json(payload):
+            payload = codec.dumps(value)
+        self.local.set(guid, value, len(payload), payload)
+
+    def available(self):
+        """Returns False while Redis is considered down, i.e. while the breaker fails calls fast."""
+        return self.breaker.available()
+
+    @timed('redis')
+    async def get(self, guid, refresh=None, raw=False):
+        """
+        Retrieves GUID data from the cache.
+        Returns None if the GUID is not cached, or MISSING if it is recorded as not existing.
+        If the value is past its refresh point and a refresh coroutine function is given, it is
+        scheduled in the background and the stale value is returned meanwhile.
+        With raw=True a hit returns the stored JSON bytes instead of the decoded dict, and the
+        payload is only decoded when the local tier or the staleness check needs it.
+        """
+        if self.frequency is not None:
+            self.frequency.add(guid)
+        if self.local is not None:
+            value = self.local.get_payload(guid) if raw else self.local.get(guid)
+            if value is not None:
+                CACHE_LOOKUPS.inc('hit')
+                return value
+
+        remaining = missing = None
+        if self.stale_ttl or self.negative_ttl or self.fallback is not None:
+            result, remaining, missing = await self.run(self._fetch, guid)
+        else:
+            result = await self.run(self.client.get, self.encoding.key(guid))
         if result:
-            return json.loads(result)
+            value = None
+            in_grace = self.stale_ttl and remaining is not None and 0 <= remaining <= self.stale_ttl
+            as_json = cacheEncoding.is_json(result)
+            if not raw or not as_json or self.local is not None or (refresh is not None and in_grace):
+                value = cacheEncoding.loads(guid, result)
+                if self.local is not None and value is not None:
+                    self._remember(guid, value, result)
+                if refresh is not None and self.stale_ttl and self._is_stale(value, remaining):
+                    IOLoop.current().spawn_callback(refresh)
+            CACHE_LOOKUPS.inc('hit')
+            return result if raw and as_json else value
+        elif missing:
+            self.negative_hits += 1
+            CACHE_LOOKUPS.inc('negative')
+            return MISSING
         else:
+            CACHE_LOOKUPS.inc('miss')
             return None
 
-    def set(self, guid, value):
-        """Stores GUID data in the cache with an appropriate time-to-live."""
+    def _fetch(self, guid):
+        """
+        Fetches a value, its remaining TTL and its tombstone in one round trip, trying each of the GUID's
+        keys in turn. Runs on the executor.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for key in self.cache_keys(guid):
+            pipe.get(key)
+            pipe.ttl(key)
+        pipe.exists(*self.tombstone_keys(guid))
+        *values, missing = pipe.execute()
+        for result, remaining in zip(values[::2], values[1::2]):
+            if result:
+                return result, remaining, missing
+        return None, None, missing
+
+    def _is_stale(self, value, remaining):
+        """
+        A value is stale once its remaining TTL falls inside the stale_ttl grace period,
+        unless the TTL is only that short because the GUID itself is about to expire.
+        """
+        if value is None or remaining is None or remaining < 0:
+            return False
+        return remaining <= self.stale_ttl and value['expire'] - int(time.time()) > remaining + 1
+
+    @timed('redis')
+    async def set(self, guid, value, invalidate=False, extra=()):
+        """
+        Stores GUID data in the cache with an appropriate time-to-live.
+        Any "known missing" tombstone for the GUID is cleared in the same round trip.
+        Pass invalidate=True when the value replaces an existing one, so other replicas drop
+        their local copy. `extra` commands (see _pipeline) are sent in the same round trip, after the value.
+        """
+        ttl = self._ttl(value, guid)
+        key, *others = self.cache_keys(guid)
+        payload = self.encoding.dumps(guid, value)
+        if self.local is not None:
+            if value is None:
+                self.local.delete(guid)
+            else:
+                self._remember(guid, value, payload)
+
+        commands = [('set', key, payload, ttl)]
+        commands.extend(('delete', other) for other in others)
+        if self.negative_ttl:
+            commands.extend(('delete', tombstone) for tombstone in self.tombstone_keys(guid))
+        if self.local is not None and invalidate:
+            commands.append(('publish', guid))
+        commands.extend(extra)
+
+        if len(commands) > 1:
+            await self.run(self._pipeline, *commands)
+        else:
+            await self.run(self.client.set, key, payload, ex=ttl)
+
+    @timed('redis')
+    async def stored(self, guid, value, invalidate=False):
+        """
+        Updates the cache after a GUID was written to the database, in at most one round trip.
+        Write-through stores the value like set(); invalidate-only deletes the cached value
+        (when invalidate=True, i.e. it replaced an existing one) and any tombstone, so the next
+        read loads the GUID from the database.
+        """
+        if self.write_policy == 'write-through':
+            await self.set(guid, value, invalidate=invalidate)
+            return
+
+        commands = []
+        if invalidate:
+            commands.extend(('delete', key) for key in self.cache_keys(guid))
+        if self.negative_ttl:
+            commands.extend(('delete', tombstone) for tombstone in self.tombstone_keys(guid))
+        if self.local is not None:
+            self.local.delete(guid)
+            if invalidate:
+                commands.append(('publish', guid))
+        if commands:
+            await self.run(self._pipeline, *commands)
+
+    async def fill(self, guid, value):
+        """
+        Caches a GUID just read from the database after a miss, like set(), unless the admission
+        threshold turns it away. Returns True if it was cached.
+        """
+        if not self._admit(guid):
+            return False
+        await self.set(guid, value)
+        return True
+
+    async def fill_many(self, values):
+        """Caches several GUIDs read from the database, like set_many(), except those the admission threshold turns away."""
+        await self.set_many({guid: value for guid, value in values.items() if self._admit(guid)})
+
+    def _admit(self, guid):
+        """Returns True if a GUID was looked up often enough recently to be cached."""
+        if not self.admission:
+            return True
+        admitted = self.frequency.estimate(guid) >= self.admission
+        CACHE_ADMISSIONS.inc('admitted' if admitted else 'rejected')
+        return admitted
+
+    def _ttl(self, value, guid=None):
+        """
+        Returns the Redis TTL for a GUID's value: the default TTL, or with adaptive_ttl one that grows
+        with its recent lookups, clamped by the GUID's own expire.
+        """
         ttl = self.default_ttl
+        if self.adaptive_ttl and guid is not None:
+            ttl = max(self.min_ttl, min(self.max_ttl, self.min_ttl * self.frequency.estimate(guid)))
+        ttl += self.stale_ttl
         if value is not None:
             remaining_time = value['expire'] - int(time.time())
 
             if remaining_time < ttl:
                 ttl = remaining_time
-        self.client.set(guid, json.dumps(value), ex=ttl)
+        return ttl
 
-    def delete(self, guid):
+    @timed('redis')
+    async def get_many(self, guids):
+        """Retrieves several GUIDs with one MGET and returns the cached ones as a dict keyed by GUID."""
+        found = {}
+        if self.local is not None:
+            for guid in guids:
+                value = self.local.get(guid)
+                if value is not None:
+                    found[guid] = value
+        if self.frequency is not None:
+            for guid in guids:
+                self.frequency.add(guid)
+        pending = [guid for guid in guids if guid not in found]
+        if not pending:
+            return found
+
+        keys = [self.cache_keys(guid) for guid in pending]
+        results = iter(await self.run(self.client.mget, [key for guid_keys in keys for key in guid_keys]))
+        for guid, guid_keys in zip(pending, keys):
+            result = next(filter(None, [next(results) for _ in guid_keys]), None)
+            if result:
+                value = cacheEncoding.loads(guid, result)
+                if value is None:
+                    continue
+                if self.local is not None:
+                    self._remember(guid, value, result)
+                found[guid] = value
+        return found
+
+    @timed('redis')
+    async def set_many(self, values):
+        """Stores several GUIDs, given as a dict keyed by GUID, in one pipelined round trip."""
+        commands = []
+        for guid, value in values.items():
+            key, *others = self.cache_keys(guid)
+            payload = self.encoding.dumps(guid, value)
+            if self.local is not None:
+                self._remember(guid, value, payload)
+            commands.append(('set', key, payload, self._ttl(value, guid)))
+            commands.extend(('delete', other) for other in others)
+            if self.negative_ttl:
+                commands.extend(('delete', tombstone) for tombstone in self.tombstone_keys(guid))
+        if commands:
+            await self.run(self._pipeline, *commands)
+
+    @timed('redis')
+    async def delete_many(self, guids, tombstones=False):
+        """Deletes several GUIDs in one pipelined round trip, and with tombstones=True their missing records."""
+        commands = [('delete', key) for guid in guids for key in self.cache_keys(guid)]
+        if tombstones and self.negative_ttl:
+            commands.extend(('delete', key) for guid in guids for key in self.tombstone_keys(guid))
+        if self.local is not None:
+            for guid in guids:
+                self.local.delete(guid)
+                commands.append(('publish', guid))
+        if commands:
+            await self.run(self._pipeline, *commands)
+
+    @timed('redis')
+    async def set_missing(self, guid):
+        """Records that a GUID does not exist, so lookups skip the database for negative_ttl seconds."""
+        if self.negative_ttl:
+            await self.run(self.client.set, self.tombstone_keys(guid)[0], 1, ex=self.negative_ttl)
+
+    @timed('redis')
+    async def clear_missing(self, guids):
+        """Deletes the "known missing" records of several GUIDs that were just created, in one pipelined round trip."""
+        if self.negative_ttl and guids:
+            await self.run(self._pipeline, *[('delete', key) for guid in guids for key in self.tombstone_keys(guid)])
+
+    @timed('redis')
+    async def delete(self, guid):
         """Deletes GUID data from the cache."""
-        self.client.delete(guid)
\ No newline at end of file
+        keys = self.cache_keys(guid)
+        if self.local is None:
+            await self.run(self.client.delete, *keys)
+        else:
+            self.local.delete(guid)
+            await self.run(self._pipeline, *[('delete', key) for key in keys], ('publish', guid))
+
+    def _pipeline(self, *commands):
+        """Sends several commands to Redis in one round trip. Runs on the executor."""
+        pipe = self.client.pipeline(transaction=False)
+        for command, key, *args in commands:
+            if command == 'set':
+                payload, ttl = args
+                pipe.set(key, payload, ex=ttl)
+            elif command == 'delete':
+                pipe.delete(key)
+            elif command == 'publish':
+                pipe.publish(self.INVALIDATION_CHANNEL, f"{self.node_id}:{key}")
+            elif command == 'hset':
+                field, payload = args
+                pipe.hset(key, field, payload)
+            elif command == 'xadd':
+                pipe.xadd(key, *args)
+        return pipe.execute()
+
+    def start_listener(self):
+        """Subscribes to invalidations from other replicas on a background thread."""
+        if self.local is None or self.listener is not None:
+            return
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.INVALIDATION_CHANNEL: self._on_invalidate})
+        self.listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def stop_listener(self):
+        """Stops the invalidation listener thread, if one is running."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _on_invalidate(self, message):
+        """Evicts the local copy of a GUID that another replica changed."""
+        data = message['data']
+        if isinstance(data, bytes):
+            data = data.decode()
+        node_id, _, guid = data.partition(':')
+        if node_id != self.node_id:
+            self.local.delete(guid)
+
+    def stats(self):
+        """Returns the tombstone hit counter and the local tier counters, if a local tier is configured."""
+        return {
+            'negative_hits': self.negative_hits,
+            'local': self.local.stats() if self.local is not None else None,
+        }
@@ -0,0 +1,80 @@
+"""
+Encodings of the GUIDs cached in Redis: the key a GUID is stored under and the value its metadata is
+stored as. 'json' stores the metadata as JSON under the GUID itself. 'compact' stores it under the
+GUID's 16 bytes and packs the value as a format byte, 'expire' as a 32-bit integer, the 'version' in
+8 bytes when there is one, and the user in UTF-8; the GUID is not repeated in the value, since the key holds it. Metadata that does not fit that
+layout (other fields, an expire past 2106) is stored as JSON under the compact key.
+Values are told apart by their first byte, so loads() reads what either encoding wrote.
+"""
+import re
+import struct
+from . import codec
+
+ENCODINGS = ('json', 'compact')
+COMPACT = b'\x01'  # never the first byte of a JSON document
+COMPACT_VERSIONED = b'\x02'
+_EXPIRE = struct.Struct('>I')
+_VERSIONED = struct.Struct('>I8s')
+_HEX_GUID = re.compile(r'^[A-Fa-f0-9]{32}$')
+_VERSION = re.compile(r'^[0-9a-f]{16}$')
+
+
+class JsonEncoding:
+    """Keys are the GUIDs, values their JSON."""
+
+    name = 'json'
+
+    def key(self, guid, prefix=''):
+        """Returns the Redis key of a GUID, or of one of its companion keys when given a prefix."""
+        return prefix + guid
+
+    def dumps(self, guid, value):
+        """Encodes a GUID's metadata."""
+        return codec.dumps(value)
+
+
+class CompactEncoding:
+    """Keys are the GUIDs' 16 bytes, values a packed (expire, version, user) when the metadata allows it."""
+
+    name = 'compact'
+
+    def key(self, guid, prefix=''):
+        """Returns the Redis key of a GUID, or of one of its companion keys when given a prefix."""
+        if _HEX_GUID.match(guid):
+            return prefix.encode() + bytes.fromhex(guid)
+        return prefix + guid
+
+    def dumps(self, guid, value):
+        """Encodes a GUID's metadata."""
+        if (isinstance(value, dict) and value.get('guid') == guid
+                and isinstance(value.get('user'), str) and type(value.get('expire')) is int
+                and 0 <= value['expire'] < 2 ** 32):
+            if value.keys() == {'guid', 'user', 'expire'}:
+                return COMPACT + _EXPIRE.pack(value['expire']) + value['user'].encode()
+            if (value.keys() == {'guid', 'user', 'expire', 'version'} and isinstance(value['version'], str)
+                    and _VERSION.match(value['version'])):
+                return (COMPACT_VERSIONED + _VERSIONED.pack(value['expire'], bytes.fromhex(value['version']))
+                        + value['user'].encode())
+        return codec.dumps(value)
+
+
+def encoding(name):
+    """Returns the encoding called `name`."""
+    if name not in ENCODINGS:
+        raise ValueError(f"Unknown cache encoding: {name}")
+    return CompactEncoding() if name == 'compact' else JsonEncoding()
+
+
+def is_json(payload):
+    """Returns True if a cached value is JSON, which can be sent to a client as it is."""
+    return payload[:1] not in (COMPACT, COMPACT_VERSIONED)
+
+
+def loads(guid, payload):
+    """Decodes a cached value of the GUID `guid`, whichever encoding wrote it."""
+    if payload[:1] == COMPACT:
+        return {'guid': guid, 'user': payload[_EXPIRE.size + 1:].decode(), 'expire': _EXPIRE.unpack_from(payload, 1)[0]}
+    if payload[:1] == COMPACT_VERSIONED:
+        expire, version = _VERSIONED.unpack_from(payload, 1)
+        return {'guid': guid, 'user': payload[_VERSIONED.size + 1:].decode(), 'expire': expire, 'version': version.hex()}
+    return codec.loads(payload)
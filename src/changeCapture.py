@@ -0,0 +1,173 @@
+"""
+Change data capture for the GUID collection: ChangeCapture tails MongoDB's change stream, invalidates
+the cache for every changed GUID and publishes the changes to a sink for downstream consumers.
+Each change becomes an event {'op', 'guid', 'document', 'time'}: the operation (insert, update,
+replace or delete), the GUID, its metadata after the change (None once deleted) and the change's
+cluster time in Unix seconds.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pymongo.errors import OperationFailure
+from tornado.ioloop import IOLoop
+from tornado.log import app_log
+from .background import BackgroundTask
+from .database import public_document
+from .metrics import CHANGE_EVENTS, CHANGE_LAG
+from . import codec
+
+SINKS = ('none', 'redis', 'kafka')
+
+
+def change_event(change):
+    """Turns a change stream document into an event, or returns None for a change to the collection itself."""
+    key = change.get('documentKey')
+    if key is None:
+        return None
+    document = change.get('fullDocument')
+    cluster_time = change.get('clusterTime')
+    return {
+        'op': change['operationType'],
+        'guid': key['_id'],
+        'document': public_document(dict(document)) if document else None,
+        'time': cluster_time.time if cluster_time is not None else time.time(),
+    }
+
+
+class RedisStreamSink:
+    """
+    Appends events to a Redis stream, in one pipelined round trip per batch, trimmed to about `maxlen`
+    entries. Each entry's fields are the event's, the document as JSON (empty once deleted).
+    Consumers read it with XREAD, or XREADGROUP to share it.
+    """
+
+    STREAM = 'guid:changes'
+
+    def __init__(self, cache, stream=STREAM, maxlen=100000):
+        """Initializes a new instance of the RedisStreamSink class."""
+        self.cache = cache
+        self.stream = stream
+        self.maxlen = maxlen
+
+    async def publish(self, events):
+        """Appends the events to the stream."""
+        await self.cache.run(self._publish, events)
+
+    def _publish(self, events):
+        """Sends the XADDs. Runs on the executor."""
+        pipe = self.cache.client.pipeline(transaction=False)
+        for event in events:
+            document = codec.dumps(event['document']) if event['document'] is not None else b''
+            pipe.xadd(self.stream, {'op': event['op'], 'guid': event['guid'], 'document': document,
+                                    'time': str(event['time'])}, maxlen=self.maxlen, approximate=True)
+        pipe.execute()
+
+
+class KafkaSink:
+    """
+    Sends events to a Kafka topic as JSON, keyed by GUID so that each GUID's events stay in order
+    within a partition. Needs the kafka-python package.
+    """
+
+    def __init__(self, servers, topic='guid-changes'):
+        """Initializes a new instance of the KafkaSink class."""
+        from kafka import KafkaProducer
+        self.producer = KafkaProducer(bootstrap_servers=servers, key_serializer=str.encode,
+                                      value_serializer=lambda event: codec.dumps(event))
+        self.topic = topic
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='kafka')
+
+    async def publish(self, events):
+        """Sends the events and waits until Kafka acknowledged them."""
+        await IOLoop.current().run_in_executor(self.executor, self._publish, events)
+
+    def _publish(self, events):
+        """Sends the events. Runs on the executor."""
+        for event in events:
+            self.producer.send(self.topic, key=event['guid'], value=event)
+        self.producer.flush()
+
+
+class ChangeCapture(BackgroundTask):
+    """
+    Keeps the cache coherent with MongoDB whatever writes to it: a handler, a crash between the
+    database write and the cache update, a script or a manual fix. It tails the GUID collection's
+    change stream and, for each batch of up to `batch_size` changes (a batch closes `max_await` seconds
+    after its first change, and an idle stream is polled as often), deletes the changed GUIDs from
+    Redis, their missing records and the replicas' local tiers included, publishes the events to the
+    `sink`, if any, and then saves the stream's resume token in Redis. After a restart it resumes after
+    that token, so every change is applied at least once. Needs MongoDB to run as a replica set; run
+    it in one worker, since every instance would publish the same events. Changes applied since the
+    last saved token when it stops are applied again on the next start.
+    """
+
+    TOKEN_KEY = 'guid:changes:token'
+    TOKEN_INTERVAL = 60  # seconds between saves of the token while there are no changes
+    HISTORY_LOST = (136, 280, 286)  # error codes of a resume token the oplog no longer covers
+
+    def __init__(self, db, cache, sink=None, batch_size=500, max_await=0.1):
+        """Initializes a new instance of the ChangeCapture class."""
+        self.db = db
+        self.cache = cache
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_await = max_await
+        self.token = None
+        self.saved = 0
+
+    async def run(self):
+        """Tails the change stream until stopped, reopening it after a failure."""
+        self.token = await self.load_token()
+        while True:
+            try:
+                await self.tail()
+            except OperationFailure as e:
+                if e.code in self.HISTORY_LOST and self.token is not None:
+                    app_log.warning("Change stream cannot resume, changes made meanwhile stay cached until "
+                                    "their TTL: %s", e)
+                    self.token = None
+                else:
+                    app_log.error("Change capture failed: %s", e)
+                await asyncio.sleep(1)
+            except Exception as e:
+                app_log.error("Change capture failed: %s", e)
+                await asyncio.sleep(1)
+
+    async def tail(self):
+        """Opens the change stream after the saved token and applies its changes as they come."""
+        stream = await self.db.watch_guids(self.token, self.max_await)
+        try:
+            while True:
+                changes, token = await self.db.read_changes(stream, self.batch_size, self.max_await)
+                events = [event for event in map(change_event, changes) if event is not None]
+                if events:
+                    await self.apply(events)
+                if token is not None and (changes or time.monotonic() - self.saved > self.TOKEN_INTERVAL):
+                    await self.save_token(token)
+        finally:
+            stream.close()
+
+    async def apply(self, events):
+        """Invalidates the cache for a batch of events, then publishes them."""
+        await self.cache.delete_many(list(dict.fromkeys(event['guid'] for event in events)), tombstones=True)
+        if self.sink is not None:
+            await self.sink.publish(events)
+        for event in events:
+            CHANGE_EVENTS.inc(event['op'])
+        CHANGE_LAG.set(max(0, time.time() - events[-1]['time']))
+
+    async def load_token(self):
+        """Returns the resume token saved in Redis, or None."""
+        try:
+            saved = await self.cache.run(self.cache.client.get, self.TOKEN_KEY)
+        except Exception as e:
+            app_log.error("Cannot read the change stream resume token: %s", e)
+            return None
+        return json.loads(saved) if saved else None
+
+    async def save_token(self, token):
+        """Saves the resume token in Redis, once the changes before it are applied."""
+        self.token = token
+        self.saved = time.monotonic()
+        await self.cache.run(self.cache.client.set, self.TOKEN_KEY, json.dumps(token))
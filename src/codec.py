@@ -0,0 +1,41 @@
+"""
+JSON encoding and decoding for the cache payloads, request bodies and responses.
+`dumps` returns bytes and `loads` accepts bytes or str, whichever codec is in use.
+The standard library codec is the default; use('orjson') switches to orjson when it is installed.
+It writes compact JSON (no space after ':' and ',') and is several times faster.
+Call the functions through the module (codec.dumps) so a switch applies everywhere.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CODECS = ('json', 'orjson')
+
+
+def _json_dumps(value):
+    return json.dumps(value).encode()
+
+
+dumps = _json_dumps
+loads = json.loads
+
+
+def available(name):
+    """Returns True if the named codec can be used in this environment."""
+    return name == 'json' or (name == 'orjson' and orjson is not None)
+
+
+def use(name):
+    """Selects the codec used by dumps and loads."""
+    global dumps, loads
+    if name not in CODECS:
+        raise ValueError(f"Unknown JSON codec: {name}")
+    if not available(name):
+        raise ValueError(f"The {name} codec needs the {name} package")
+    if name == 'orjson':
+        dumps, loads = orjson.dumps, orjson.loads
+    else:
+        dumps, loads = _json_dumps, json.loads
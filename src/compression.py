@@ -0,0 +1,122 @@
+"""
+Compression of the API's responses, negotiated with Accept-Encoding. gzip is always available and
+brotli ('br') when the brotli package is installed. Responses are compressed as they are written, so
+streamed ones (the NDJSON export, the listing) are compressed chunk by chunk. Complete responses
+smaller than `min_size` are sent as they are: for a single GUID the compression costs more than the
+few bytes it saves.
+"""
+import re
+import zlib
+from tornado.web import OutputTransform
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ('br', 'gzip')
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+_CODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def available(name):
+    """Returns True if the named encoding can be used in this environment."""
+    return name == 'gzip' or (name == 'br' and brotli is not None)
+
+
+def accepted(header):
+    """Returns the codings an Accept-Encoding header accepts (q above 0), with their weights."""
+    codings = {}
+    for part in header.split(','):
+        match = _CODING.match(part)
+        if match:
+            try:
+                codings[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    return {coding: weight for coding, weight in codings.items() if weight > 0}
+
+
+class _GzipCompressor:
+    """Streams a gzip member through zlib, which avoids GzipFile's extra buffering."""
+
+    LEVEL = 6
+
+    def __init__(self):
+        self.zlib = zlib.compressobj(self.LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, finishing):
+        return self.zlib.compress(data) + self.zlib.flush(zlib.Z_FINISH if finishing else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliCompressor:
+    """Streams a brotli stream at a quality suited to dynamic responses."""
+
+    QUALITY = 5
+
+    def __init__(self):
+        self.brotli = brotli.Compressor(quality=self.QUALITY)
+
+    def compress(self, data, finishing):
+        return self.brotli.process(data) + (self.brotli.finish() if finishing else self.brotli.flush())
+
+
+COMPRESSORS = {'gzip': _GzipCompressor, 'br': _BrotliCompressor}
+
+
+class Compression:
+    """
+    Compresses responses with the first of `encodings` the client accepts (see the module docstring).
+    Pass it to make_app(); Tornado calls it once per request to get that request's transform.
+    """
+
+    def __init__(self, encodings=('gzip',), min_size=1024):
+        """Initializes a new instance of the Compression class."""
+        for name in encodings:
+            if name not in ENCODINGS:
+                raise ValueError(f"Unknown compression: {name}")
+            if not available(name):
+                raise ValueError(f"The {name} compression needs the brotli package")
+        self.encodings = tuple(encodings)
+        self.min_size = min_size
+
+    def negotiate(self, header):
+        """Returns the encoding to use for a request's Accept-Encoding header, or None."""
+        codings = accepted(header)
+        for name in self.encodings:
+            if codings.get(name, codings.get('*', 0)) > 0:
+                return name
+        return None
+
+    def __call__(self, request):
+        return _CompressionTransform(self, request)
+
+
+class _CompressionTransform(OutputTransform):
+    """Compresses one response, in the manner of Tornado's GZipContentEncoding."""
+
+    def __init__(self, compression, request):
+        self.min_size = compression.min_size
+        self.encoding = compression.negotiate(request.headers.get('Accept-Encoding', ''))
+        self.compressor = None
+
+    def transform_first_chunk(self, status_code, headers, chunk, finishing):
+        headers['Vary'] = headers['Vary'] + ', Accept-Encoding' if 'Vary' in headers else 'Accept-Encoding'
+        content_type = headers.get('Content-Type', '').split(';')[0].strip()
+        if (self.encoding is not None and status_code not in (204, 304) and 'Content-Encoding' not in headers
+                and content_type in COMPRESSIBLE_TYPES and (not finishing or len(chunk) >= self.min_size)):
+            headers['Content-Encoding'] = self.encoding
+            self.compressor = COMPRESSORS[self.encoding]()
+            chunk = self.transform_chunk(chunk, finishing)
+            if 'Content-Length' in headers:
+                # Only a response written in one chunk knows its compressed length.
+                if finishing:
+                    headers['Content-Length'] = str(len(chunk))
+                else:
+                    del headers['Content-Length']
+        return status_code, headers, chunk
+
+    def transform_chunk(self, chunk, finishing):
+        if self.compressor is None:
+            return chunk
+        return self.compressor.compress(chunk, finishing)
@@ -0,0 +1,354 @@
+"""
+Runtime configuration, read from an optional JSON file named by CONFIG_FILE and from environment
+variables, which take precedence. Keys are the environment variable names; the file may use them
+in lower case. Config.load() validates every setting and reports all problems at once, so a bad
+deployment fails at startup instead of on its first request.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, ReadPreference
+from pymongo.errors import ConnectionFailure, InvalidURI
+from pymongo.uri_parser import parse_uri
+import json
+import os
+import redis
+import redis.sentinel
+from .breaker import CircuitBreaker
+from .cache import Cache
+from . import cacheEncoding, changeCapture, codec, compression, guidGenerator
+from .profiling import SlowRequestLog
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+REDIS_MODES = ('standalone', 'sentinel', 'cluster')
+EVENT_LOOPS = ('asyncio', 'uvloop')
+
+
+class ConfigError(ValueError):
+    """Raised when the configuration is invalid."""
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    lowered = str(value).strip().lower()
+    if lowered in ('1', 'true', 'yes', 'on'):
+        return True
+    if lowered in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+def _addresses(value):
+    """Parses 'host:port,host:port' into a list of (host, port) tuples."""
+    if isinstance(value, list):
+        value = ','.join(value)
+    addresses = []
+    for item in filter(None, (part.strip() for part in str(value).split(','))):
+        host, _, port = item.rpartition(':')
+        if not host:
+            raise ValueError(f"expected host:port, got {item!r}")
+        addresses.append((host, int(port)))
+    return addresses
+
+
+def _names(value):
+    """Parses 'a,b' into a list of names."""
+    if isinstance(value, list):
+        value = ','.join(value)
+    return [part.strip() for part in str(value).split(',') if part.strip()]
+
+
+def _choice(*choices):
+    def parse(value):
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}, got {value!r}")
+        return value
+    return parse
+
+
+# name: (parser, default, minimum). Timeouts are in seconds; a 0 socket timeout or deadline means none.
+# Socket timeouts default to twice the deadline: a call abandoned at its deadline still holds an executor
+# thread until its socket gives up.
+SETTINGS = {
+    'PORT': (int, 8888, 1),
+    'WORKERS': (int, 1, 0),
+    'SHUTDOWN_TIMEOUT': (float, 30, 0),
+    'LOCAL_CACHE_ENTRIES': (int, 0, 0),
+    'CACHE_STALE_TTL': (int, 0, 0),
+    'CACHE_NEGATIVE_TTL': (int, 30, 0),
+    'CACHE_WRITE_POLICY': (_choice(*Cache.WRITE_POLICIES), 'write-through', None),
+    'CACHE_ENCODING': (_choice(*cacheEncoding.ENCODINGS), 'json', None),
+    'CACHE_DUAL_READ': (_bool, False, None),
+    'CACHE_ADAPTIVE_TTL': (_bool, False, None),
+    'CACHE_MIN_TTL': (int, 300, 1),
+    'CACHE_MAX_TTL': (int, 14400, 1),
+    'CACHE_ADMISSION': (int, 0, 0),
+    'HTTP_MAX_AGE': (int, 60, 0),
+    'HTTP_IDLE_CONNECTION_TIMEOUT': (float, 75, 0.1),
+    'HTTP_BODY_TIMEOUT': (float, 0, 0),
+    'HTTP_MAX_BODY_SIZE': (int, 100 * 1024 * 1024, 1),
+    'HTTP_MAX_HEADER_SIZE': (int, 64 * 1024, 1024),
+    'HTTP_DECOMPRESS_REQUEST': (_bool, False, None),
+    'HTTP_XHEADERS': (_bool, False, None),
+    'COMPRESSION': (_names, ['gzip'], None),
+    'COMPRESSION_MIN_SIZE': (int, 1024, 0),
+    'EVENT_LOOP': (_choice(*EVENT_LOOPS), 'asyncio', None),
+    'JSON_CODEC': (_choice(*codec.CODECS), 'json', None),
+    'GUID_GENERATOR': (_choice(*guidGenerator.GENERATORS), 'random', None),
+    'GUID_BATCH_SIZE': (int, 256, 1),
+    'REAPER_ENABLED': (_bool, False, None),
+    'REAPER_INTERVAL': (float, 60, 1),
+    'REAPER_BATCH_SIZE': (int, 500, 1),
+    'REAPER_RATE': (float, 1000, 1),
+    'MAX_IN_FLIGHT': (int, 0, 0),
+    'LOW_PRIORITY_SHARE': (float, 0.8, 0.01),
+    'RATE_LIMIT': (float, 0, 0),
+    'RATE_LIMIT_BURST': (int, 100, 1),
+    'RATE_LIMIT_LEASE': (int, 10, 1),
+    'WRITE_BEHIND': (_bool, False, None),
+    'WRITE_BEHIND_BATCH_SIZE': (int, 500, 1),
+    'WRITE_BEHIND_INTERVAL': (float, 0.05, 0.001),
+    'WRITE_BEHIND_CLAIM_IDLE': (float, 30, 1),
+    'WARMUP_GUIDS': (int, 10000, 0),
+    'WARMUP_BATCH_SIZE': (int, 500, 1),
+    'HOT_KEYS_SIZE': (int, 10000, 0),
+    'HOT_KEYS_INTERVAL': (float, 30, 1),
+    'CDC_ENABLED': (_bool, False, None),
+    'CDC_SINK': (_choice(*changeCapture.SINKS), 'none', None),
+    'CDC_BATCH_SIZE': (int, 500, 1),
+    'CDC_MAX_AWAIT': (float, 0.1, 0.001),
+    'CDC_STREAM_MAXLEN': (int, 100000, 1),
+    'CDC_KAFKA_SERVERS': (_names, [], None),
+    'CDC_KAFKA_TOPIC': (str, 'guid-changes', None),
+    'ADMIN_TOKEN': (str, '', None),
+    'SLOW_REQUEST_THRESHOLD': (float, 0, 0),
+    'SLOW_REQUEST_LOG_SIZE': (int, 100, 1),
+    'BREAKER_FAILURES': (int, 5, 1),
+    'BREAKER_RESET_TIMEOUT': (float, 5, 0.1),
+
+    'MONGO_URI': (str, 'mongodb://db:27017', None),
+    'MONGO_MAX_POOL_SIZE': (int, 32, 1),
+    'MONGO_MIN_POOL_SIZE': (int, 0, 0),
+    'MONGO_CONNECT_TIMEOUT': (float, 20, 0.001),
+    'MONGO_SOCKET_TIMEOUT': (float, 20, 0),
+    'MONGO_SERVER_SELECTION_TIMEOUT': (float, 30, 0.001),
+    'MONGO_RETRY_READS': (_bool, True, None),
+    'MONGO_RETRY_WRITES': (_bool, True, None),
+    'MONGO_READ_PREFERENCE': (_choice(*READ_PREFERENCES), 'primary', None),
+    'MONGO_DEADLINE': (float, 10, 0),
+
+    'REDIS_MODE': (_choice(*REDIS_MODES), 'standalone', None),
+    'REDIS_HOST': (str, 'redis', None),
+    'REDIS_PORT': (int, 6379, 1),
+    'REDIS_DB': (int, 0, 0),
+    'REDIS_PASSWORD': (str, '', None),
+    'REDIS_SENTINELS': (_addresses, [], None),
+    'REDIS_SENTINEL_SERVICE': (str, 'mymaster', None),
+    'REDIS_CLUSTER_NODES': (_addresses, [], None),
+    'REDIS_MAX_CONNECTIONS': (int, 32, 1),
+    'REDIS_CONNECT_TIMEOUT': (float, 5, 0.001),
+    'REDIS_SOCKET_TIMEOUT': (float, 2, 0),
+    'REDIS_RETRY_ON_TIMEOUT': (_bool, False, None),
+    'REDIS_DEADLINE': (float, 1, 0),
+}
+
+
+class Config:
+    """
+    Validated settings, exposed as lower-case attributes (config.mongo_max_pool_size), plus
+    factories for the backend clients and the thread pools their blocking calls run on.
+    Each pool size also sizes the matching executor: a thread beyond the pool would only
+    wait for a connection.
+    """
+
+    def __init__(self, **values):
+        """Initializes a new instance of the Config class; unspecified settings take their default."""
+        values = {key.upper(): value for key, value in values.items()}
+        unknown = sorted(set(values) - set(SETTINGS))
+        errors = [f"{key}: unknown setting" for key in unknown]
+        for key, (parse, default, minimum) in SETTINGS.items():
+            value = values.get(key, default)
+            try:
+                value = parse(value)
+                if minimum is not None and value < minimum:
+                    raise ValueError(f"must be at least {minimum}")
+            except (TypeError, ValueError) as e:
+                errors.append(f"{key}: {e}")
+                continue
+            setattr(self, key.lower(), value)
+        if not errors:
+            errors.extend(self._check())
+        if errors:
+            raise ConfigError("Invalid configuration:\n  " + "\n  ".join(errors))
+
+    def _check(self):
+        """Validates the combinations of settings."""
+        if not self.mongo_uri.startswith('mongodb+srv://'):  # SRV URIs need a DNS lookup to validate
+            try:
+                parse_uri(self.mongo_uri)
+            except (InvalidURI, ValueError) as e:
+                yield f"MONGO_URI: {e}"
+        if not codec.available(self.json_codec):
+            yield f"JSON_CODEC: the {self.json_codec} codec needs the {self.json_codec} package"
+        for name in self.compression:
+            if name not in compression.ENCODINGS:
+                yield f"COMPRESSION: expected some of {', '.join(compression.ENCODINGS)}, got {name!r}"
+            elif not compression.available(name):
+                yield f"COMPRESSION: {name} needs the brotli package"
+        if self.event_loop == 'uvloop':
+            try:
+                import uvloop  # noqa: F401
+            except ImportError:
+                yield "EVENT_LOOP: uvloop needs the uvloop package"
+        if self.cdc_sink == 'kafka':
+            if not self.cdc_kafka_servers:
+                yield "CDC_KAFKA_SERVERS: required when CDC_SINK is kafka"
+            try:
+                import kafka  # noqa: F401
+            except ImportError:
+                yield "CDC_SINK: the kafka sink needs the kafka-python package"
+        if self.low_priority_share > 1:
+            yield "LOW_PRIORITY_SHARE: must not exceed 1"
+        if self.cache_min_ttl > self.cache_max_ttl:
+            yield "CACHE_MIN_TTL: must not exceed CACHE_MAX_TTL"
+        if self.mongo_deadline and not self.mongo_socket_timeout:
+            yield "MONGO_SOCKET_TIMEOUT: must not be 0 while MONGO_DEADLINE is set"
+        if self.redis_deadline and not self.redis_socket_timeout:
+            yield "REDIS_SOCKET_TIMEOUT: must not be 0 while REDIS_DEADLINE is set"
+        if self.mongo_min_pool_size > self.mongo_max_pool_size:
+            yield "MONGO_MIN_POOL_SIZE: must not exceed MONGO_MAX_POOL_SIZE"
+        if self.redis_mode == 'sentinel' and not self.redis_sentinels:
+            yield "REDIS_SENTINELS: required when REDIS_MODE is sentinel"
+        if self.redis_mode == 'cluster':
+            if not self.redis_cluster_nodes:
+                yield "REDIS_CLUSTER_NODES: required when REDIS_MODE is cluster"
+            try:
+                import rediscluster  # noqa: F401
+            except ImportError:
+                yield "REDIS_MODE: cluster mode needs the redis-py-cluster package"
+            if self.local_cache_entries:
+                yield "LOCAL_CACHE_ENTRIES: the local tier relies on pub/sub, which is not supported in cluster mode"
+            if self.write_behind:
+                yield "WRITE_BEHIND: the queue's stream and hash cannot share a pipeline with the cache in cluster mode"
+
+    @classmethod
+    def load(cls, environ=None):
+        """Reads the settings from the CONFIG_FILE JSON file, if any, overridden by the environment."""
+        environ = os.environ if environ is None else environ
+        values = {}
+        path = environ.get('CONFIG_FILE')
+        if path:
+            try:
+                with open(path) as f:
+                    values.update({key.upper(): value for key, value in json.load(f).items()})
+            except (OSError, ValueError, AttributeError) as e:
+                raise ConfigError(f"Cannot read CONFIG_FILE {path}: {e}")
+        values.update({key: value for key, value in environ.items() if key in SETTINGS})
+        return cls(**values)
+
+    def mongo_client(self):
+        """Creates a MongoClient with the configured pool, timeouts and retry policy."""
+        return MongoClient(
+            self.mongo_uri,
+            maxPoolSize=self.mongo_max_pool_size,
+            minPoolSize=self.mongo_min_pool_size,
+            connectTimeoutMS=int(self.mongo_connect_timeout * 1000),
+            socketTimeoutMS=int(self.mongo_socket_timeout * 1000) or None,
+            serverSelectionTimeoutMS=int(self.mongo_server_selection_timeout * 1000),
+            retryReads=self.mongo_retry_reads,
+            retryWrites=self.mongo_retry_writes,
+            connect=False,
+        )
+
+    def mongo_executor(self):
+        """Creates the thread pool the Database runs its driver calls on."""
+        return ThreadPoolExecutor(max_workers=self.mongo_max_pool_size, thread_name_prefix='mongo')
+
+    def read_preference(self):
+        """Returns the pymongo read preference used for GUID lookups."""
+        return READ_PREFERENCES[self.mongo_read_preference]
+
+    def redis_client(self):
+        """Creates a standalone, sentinel-backed or cluster Redis client with the configured pool and timeouts."""
+        options = dict(
+            password=self.redis_password or None,
+            socket_connect_timeout=self.redis_connect_timeout,
+            socket_timeout=self.redis_socket_timeout or None,
+            retry_on_timeout=self.redis_retry_on_timeout,
+        )
+        # One connection more than executor threads, for the invalidation listener.
+        max_connections = self.redis_max_connections + 1
+        if self.redis_mode == 'sentinel':
+            sentinel = redis.sentinel.Sentinel(self.redis_sentinels, socket_timeout=self.redis_connect_timeout)
+            return sentinel.master_for(self.redis_sentinel_service, db=self.redis_db,
+                                       max_connections=max_connections, **options)
+        if self.redis_mode == 'cluster':
+            from rediscluster import RedisCluster
+            nodes = [{'host': host, 'port': port} for host, port in self.redis_cluster_nodes]
+            return RedisCluster(startup_nodes=nodes, max_connections=max_connections, **options)
+        pool = redis.BlockingConnectionPool(host=self.redis_host, port=self.redis_port, db=self.redis_db,
+                                            max_connections=max_connections, timeout=self.redis_connect_timeout,
+                                            **options)
+        return redis.Redis(connection_pool=pool)
+
+    def server_settings(self):
+        """Returns the HTTPServer's keep-alive, size and proxy settings."""
+        return dict(
+            idle_connection_timeout=self.http_idle_connection_timeout,
+            body_timeout=self.http_body_timeout or None,
+            max_body_size=self.http_max_body_size,
+            max_header_size=self.http_max_header_size,
+            decompress_request=self.http_decompress_request,
+            xheaders=self.http_xheaders,
+        )
+
+    def response_compression(self):
+        """Creates the response Compression, or returns None when COMPRESSION is empty."""
+        if not self.compression:
+            return None
+        return compression.Compression(self.compression, min_size=self.compression_min_size)
+
+    def install_event_loop(self):
+        """Makes the event loops created from now on uvloop ones, when EVENT_LOOP asks for it."""
+        if self.event_loop == 'uvloop':
+            import asyncio
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+    def change_sink(self, cache):
+        """Creates the sink change capture publishes to, or returns None when CDC_SINK is none."""
+        if self.cdc_sink == 'redis':
+            return changeCapture.RedisStreamSink(cache, maxlen=self.cdc_stream_maxlen)
+        if self.cdc_sink == 'kafka':
+            return changeCapture.KafkaSink(self.cdc_kafka_servers, topic=self.cdc_kafka_topic)
+        return None
+
+    def id_generator(self):
+        """Creates the GUID_GENERATOR for new GUIDs. Call it in each worker, after the fork."""
+        return guidGenerator.make_generator(self.guid_generator, batch_size=self.guid_batch_size)
+
+    def slow_request_log(self):
+        """Creates the SlowRequestLog, or returns None when SLOW_REQUEST_THRESHOLD is 0."""
+        if not self.slow_request_threshold:
+            return None
+        return SlowRequestLog(self.slow_request_threshold, size=self.slow_request_log_size)
+
+    def mongo_breaker(self):
+        """Creates the circuit breaker guarding the Database's calls, with the configured deadline."""
+        return CircuitBreaker('mongo', errors=(ConnectionFailure,), deadline=self.mongo_deadline,
+                              failures=self.breaker_failures, reset_timeout=self.breaker_reset_timeout)
+
+    def redis_breaker(self):
+        """Creates the circuit breaker guarding the Cache's calls, with the configured deadline."""
+        return CircuitBreaker('redis', errors=(redis.ConnectionError, redis.TimeoutError),
+                              deadline=self.redis_deadline, failures=self.breaker_failures,
+                              reset_timeout=self.breaker_reset_timeout)
+
+    def redis_executor(self):
+        """Creates the thread pool the Cache runs its driver calls on."""
+        return ThreadPoolExecutor(max_workers=self.redis_max_connections, thread_name_prefix='redis')
@@ -1,53 +1,360 @@
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, ConnectionFailure
+from tornado.log import app_log
+from .breaker import BackendUnavailable, CircuitBreaker
+from .metrics import BACKEND_ERRORS, timed
+import functools
+import itertools
 import time
 
+# Fields the database adds to a GUID's metadata, left out of everything the API returns.
+INTERNAL_FIELDS = ('_id', 'expire_at')
+
+
+def stored_document(guid, metadata):
+    """
+    Builds the document stored for a GUID: its metadata plus 'expire_at', the 'expire' timestamp as
+    a date, which is what the TTL index expires documents on.
+    """
+    document = {'_id': guid, **metadata}
+    if metadata.get('expire') is not None:
+        document['expire_at'] = datetime.fromtimestamp(int(metadata['expire']), timezone.utc)
+    return document
+
+
+def public_document(document):
+    """Strips the internal fields from a stored document, in place, and returns it."""
+    for field in INTERNAL_FIELDS:
+        document.pop(field, None)
+    return document
+
+
 class Database:
     """
     A class used to interact with a MongoDB database for managing GUIDs.
+    All public methods are coroutines: the blocking pymongo calls run on a thread pool
+    so a slow Mongo round trip never stalls the IOLoop.
+    GUID lookups use `read_preference` when one is given, e.g. to serve them from secondaries;
+    writes always go to the primary.
+    Expired GUIDs are removed by MongoDB's TTL monitor through the index created by ensure_indexes(),
+    and optionally sooner by a Reaper; lookups still filter on 'expire' because the TTL monitor
+    only runs about once a minute.
+    Driver calls go through a CircuitBreaker, which enforces their deadline; when MongoDB cannot be
+    reached the methods raise BackendUnavailable instead of reporting a failure or a missing GUID.
     """
 
-    def __init__(self):
+    def __init__(self, client=None, executor=None, read_preference=None, breaker=None):
         """Initializes a new instance of the Database class."""
-        self.client = MongoClient('db', 27017)
+        self.client = client if client is not None else MongoClient('db', 27017)
         self.db = self.client['guids_data']
         self.guids = self.db['guids']
+        self.reads = self.guids if read_preference is None else self.guids.with_options(read_preference=read_preference)
+        self.executor = executor or ThreadPoolExecutor(max_workers=32, thread_name_prefix='mongo')
+        self.breaker = breaker or CircuitBreaker('mongo', errors=(ConnectionFailure,))
 
-    def get_guid(self, guid):
+    def _run(self, fn, *args, **kwargs):
+        """Runs a blocking driver call on the executor, through the breaker, and returns an awaitable for its result."""
+        return self.breaker.call(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def _failed(self, operation, error):
+        """
+        Logs a failed driver call and counts it in the backend error metric.
+        BackendUnavailable is raised again, for the handlers to answer 503.
+        """
+        if isinstance(error, BackendUnavailable):
+            raise error
+        app_log.error("Mongo %s failed: %s", operation, error)
+        BACKEND_ERRORS.inc('mongo', operation)
+
+    @timed('mongo')
+    async def get_guid(self, guid):
         """Fetches a GUID document from the MongoDB collection."""
         try:
-            result = self.guids.find_one({'_id': guid, 'expire': {'$gt': int(time.time())}})
+            result = await self._run(self.reads.find_one, {'_id': guid, 'expire': {'$gt': int(time.time())}})
             if result is not None:
-                # Remove '_id' key from the dict
-                result.pop('_id', None)
+                # Remove '_id' and the other internal keys from the dict
+                public_document(result)
             return result
         except Exception as e:
-            print(f"An error occurred: {e}")
+            self._failed('get_guid', e)
             return None
 
-    def create_guid(self, guid, metadata):
+    @timed('mongo')
+    async def create_guid(self, guid, metadata):
         """Creates a new GUID document in the MongoDB collection."""
         try:
-            result = self.guids.insert_one({'_id': guid, **metadata})
+            result = await self._run(self.guids.insert_one, stored_document(guid, metadata))
             return result.acknowledged
         except Exception as e:
-            print(f"An error occurred: {e}")
+            self._failed('create_guid', e)
             return False
 
-    def update_guid(self, guid, metadata):
-        """Updates an existing GUID document in the MongoDB collection."""
+    @timed('mongo')
+    async def update_guid(self, guid, metadata, versions=None):
+        """
+        Updates an unexpired GUID document with one find_one_and_update and returns the updated document.
+        Given `versions`, only a document at one of them is updated, atomically.
+        Returns None if no unexpired GUID matched, or False if the update failed.
+        """
+        update = stored_document(guid, metadata)
+        del update['_id']
+        query = {'_id': guid, 'expire': {'$gt': int(time.time())}}
+        if versions is not None:
+            query['version'] = {'$in': versions}
         try:
-            result = self.guids.update_one({'_id': guid}, {'$set': metadata})
-            return result.acknowledged
+            return await self._run(self.guids.find_one_and_update, query, {'$set': update},
+                                   projection={field: False for field in INTERNAL_FIELDS},
+                                   return_document=ReturnDocument.AFTER)
         except Exception as e:
-            print(f"An error occurred: {e}")
+            self._failed('update_guid', e)
             return False
 
-    def delete_guid(self, guid):
-        """Deletes a GUID document from the MongoDB collection."""
+    @timed('mongo')
+    async def delete_guid(self, guid, versions=None):
+        """
+        Deletes a GUID document from the MongoDB collection. Given `versions`, only a document at one
+        of them is deleted, and the result tells whether one was.
+        """
         try:
-            result = self.guids.delete_one({'_id': guid})
+            if versions is not None:
+                result = await self._run(self.guids.delete_one, {'_id': guid, 'version': {'$in': versions}})
+                return result.deleted_count > 0
+            result = await self._run(self.guids.delete_one, {'_id': guid})
             return result.acknowledged
         except Exception as e:
-            print(f"An error occurred: {e}")
+            self._failed('delete_guid', e)
+            return False
+
+    @timed('mongo')
+    async def get_guids(self, guids):
+        """Fetches the unexpired GUID documents among `guids` in one query, as a dict keyed by GUID."""
+        try:
+            cursor = await self._run(
+                lambda: list(self.reads.find({'_id': {'$in': list(guids)}, 'expire': {'$gt': int(time.time())}})))
+            return {document['_id']: public_document(document) for document in cursor}
+        except Exception as e:
+            self._failed('get_guids', e)
+            return None
+
+    @timed('mongo')
+    async def create_guids(self, documents, ordered=False, generated=(), regenerate=None, retries=3):
+        """
+        Creates several GUID documents with one insert_many.
+        `documents` maps GUID to metadata; returns the set of GUIDs that were created.
+        An ordered insert stops at the first failing document, an unordered one skips it.
+        Given `regenerate`, a function returning a new GUID, the documents of an unordered insert whose
+        GUID is among the `generated` ones and already taken are inserted again under new GUIDs, up to
+        `retries` times; their metadata's 'guid' is updated in place and the new GUIDs are returned.
+        """
+        created = set()
+        for _ in range(retries + 1 if regenerate is not None and not ordered else 1):
+            inserted, duplicates = await self._insert_guids(documents, ordered)
+            created |= inserted
+            collided = [documents[guid] for guid in duplicates if guid in generated]
+            if not collided:
+                break
+            documents = {}
+            for metadata in collided:
+                metadata['guid'] = regenerate()
+                documents[metadata['guid']] = metadata
+            generated = documents
+        return created
+
+    async def _insert_guids(self, documents, ordered):
+        """Inserts GUID documents and returns the GUIDs inserted and the GUIDs that were already taken."""
+        try:
+            await self._run(self.guids.insert_many,
+                            [stored_document(guid, metadata) for guid, metadata in documents.items()], ordered=ordered)
+            return set(documents), ()
+        except BulkWriteError as e:
+            guids = list(documents)
+            errors = e.details.get('writeErrors', [])
+            duplicates = [guids[error['index']] for error in errors if error.get('code') == 11000]
+            if ordered and errors:
+                return set(guids[:errors[0]['index']]), duplicates
+            return set(guids) - {guids[error['index']] for error in errors}, duplicates
+        except Exception as e:
+            self._failed('create_guids', e)
+            return set(), ()
+
+    @timed('mongo')
+    async def store_guids(self, documents):
+        """
+        Inserts GUID documents that may have been inserted before, as when queued creates are replayed.
+        `documents` maps GUID to metadata; returns True once every one of them is in the database,
+        a duplicate key counting as done, and False if any insert failed for another reason.
+        """
+        try:
+            await self._run(self.guids.insert_many,
+                            [stored_document(guid, metadata) for guid, metadata in documents.items()], ordered=False)
+            return True
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if not e.details.get('writeConcernErrors') and all(error.get('code') == 11000 for error in errors):
+                return True
+            self._failed('store_guids', e)
+            return False
+        except Exception as e:
+            self._failed('store_guids', e)
+            return False
+
+    @timed('mongo')
+    async def delete_guids(self, guids):
+        """Deletes several GUID documents and returns the set of GUIDs that existed."""
+        def delete():
+            existing = {document['_id'] for document in self.guids.find({'_id': {'$in': list(guids)}}, {'_id': 1})}
+            if existing:
+                self.guids.delete_many({'_id': {'$in': list(existing)}})
+            return existing
+
+        try:
+            return await self._run(delete)
+        except Exception as e:
+            self._failed('delete_guids', e)
+            return None
+
+    async def watch_guids(self, resume_after=None, max_await=0.1):
+        """
+        Opens a change stream on the GUID collection, after the change `resume_after` (a token from
+        read_changes) or from now. Changes to a document carry it as it is after them, or None once
+        deleted. Needs MongoDB to run as a replica set; errors are raised to the caller.
+        """
+        return await self._run(self.guids.watch, resume_after=resume_after, full_document='updateLookup',
+                               max_await_time_ms=int(max_await * 1000))
+
+    async def read_changes(self, stream, limit, linger=0.1):
+        """
+        Reads up to `limit` changes from a change stream and returns them with the token to resume
+        after them. It waits for up to the stream's max await time when there are none, and stops
+        `linger` seconds after the first change, so that a trickle of changes does not hold a batch open.
+        """
+        def read():
+            changes, deadline = [], None
+            while len(changes) < limit and (deadline is None or time.monotonic() < deadline):
+                change = stream.try_next()
+                if change is None:
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + linger
+                changes.append(change)
+            return changes, stream.resume_token
+
+        return await self._run(read)
+
+    async def iter_guids(self, batch_size=1000):
+        """
+        Yields every GUID document in the collection, in lists of up to batch_size documents.
+        Only one batch is held in memory at a time; each one is pulled from the cursor on the executor.
+        """
+        async for batch in self._iter_cursor(self.guids.find({}, batch_size=batch_size), batch_size):
+            yield batch
+
+    async def iter_user_guids(self, user, after=None, limit=100, batch_size=100):
+        """
+        Yields up to `limit` unexpired GUID documents of `user`, ordered by expire then GUID, in lists
+        of up to batch_size documents. `after` is the (expire, guid) pair of the last document of the
+        previous page. The query walks the {user, expire, _id} index from that position, so every page
+        costs the same however deep it is.
+        """
+        query = {'user': user, 'expire': {'$gt': int(time.time())}}
+        if after is not None:
+            expire, guid = after
+            query['$or'] = [{'expire': {'$gt': expire}}, {'expire': expire, '_id': {'$gt': guid}}]
+        cursor = await self._run(self.reads.find, query, sort=[('expire', ASCENDING), ('_id', ASCENDING)],
+                                 limit=limit, batch_size=batch_size)
+        async for batch in self._iter_cursor(cursor, batch_size):
+            yield batch
+
+    async def _iter_cursor(self, cursor, batch_size):
+        """Yields a cursor's documents, stripped of their internal fields, in lists pulled on the executor."""
+        try:
+            while True:
+                batch = await self._run(lambda: list(itertools.islice(cursor, batch_size)))
+                if not batch:
+                    return
+                for document in batch:
+                    public_document(document)
+                yield batch
+        finally:
+            cursor.close()
+
+    @timed('mongo')
+    async def ensure_indexes(self):
+        """
+        Creates the indexes the API relies on, if they do not exist yet:
+        a TTL index on 'expire_at', so MongoDB deletes GUIDs once they expire,
+        an index on 'expire' for the Reaper's scans, and a {user, expire, _id} index for
+        listing and counting a user's GUIDs (_id makes the listing order total).
+        Returns True if they are in place.
+        """
+        def create():
+            self.guids.create_index([('expire_at', ASCENDING)], name='expire_at_ttl', expireAfterSeconds=0)
+            self.guids.create_index([('expire', ASCENDING)], name='expire')
+            self.guids.create_index([('user', ASCENDING), ('expire', ASCENDING), ('_id', ASCENDING)],
+                                    name='user_expire')
+
+        try:
+            # Building an index on a large collection takes as long as it takes. If it outlasts the socket
+            # timeout, MongoDB carries on with the build and the next start finds it in place.
+            await self.breaker.call(self.executor, create, deadline=0)
+            return True
+        except BackendUnavailable as e:
+            app_log.error("Mongo ensure_indexes failed: %s", e)
             return False
+        except Exception as e:
+            self._failed('ensure_indexes', e)
+            return False
+
+    @timed('mongo')
+    async def delete_expired(self, limit):
+        """
+        Deletes up to `limit` expired GUIDs, including ones stored before 'expire_at' existed, and
+        returns the list of deleted GUIDs, or None on error.
+        """
+        def delete():
+            now = int(time.time())
+            expired = [document['_id'] for document in
+                       self.guids.find({'expire': {'$lte': now}}, {'_id': 1}, limit=limit)]
+            if expired:
+                # Re-check the expiry so a GUID extended in the meantime survives.
+                self.guids.delete_many({'_id': {'$in': expired}, 'expire': {'$lte': now}})
+            return expired
 
+        try:
+            return await self._run(delete)
+        except Exception as e:
+            self._failed('delete_expired', e)
+            return None
+
+    @timed('mongo')
+    async def count_user_guids(self, user):
+        """Returns the number of unexpired GUIDs of `user`, or None on error."""
+        try:
+            return await self._run(self.reads.count_documents, {'user': user, 'expire': {'$gt': int(time.time())}})
+        except Exception as e:
+            self._failed('count_user_guids', e)
+            return None
+
+    @timed('mongo')
+    async def recent_guids(self, limit):
+        """
+        Returns the `limit` unexpired GUIDs that expire last, i.e. the most recently created ones when
+        GUIDs get the default lifetime, or None on error. The query walks the 'expire' index backwards.
+        """
+        try:
+            return await self._run(lambda: [document['_id'] for document in self.reads.find(
+                {'expire': {'$gt': int(time.time())}}, {'_id': 1}, sort=[('expire', DESCENDING)], limit=limit)])
+        except Exception as e:
+            self._failed('recent_guids', e)
+            return None
+
+    @timed('mongo')
+    async def count_guids(self):
+        """Returns the estimated number of documents in the collection, or None on error."""
+        try:
+            return await self._run(self.guids.estimated_document_count)
+        except Exception as e:
+            self._failed('count_guids', e)
+            return None
@@ -0,0 +1,55 @@
+"""
+A count-min sketch of how often keys were seen recently, for the Cache's adaptive TTLs and admission filter.
+"""
+
+# Halves every counter of a row in one bytes.translate call.
+_HALVE = bytes(count >> 1 for count in range(256))
+
+
+class FrequencySketch:
+    """
+    Estimates how often each key was added recently, in `depth` rows of `width` 8-bit counters
+    (256 KB by default), whatever the number of keys. A key is counted in one counter per row and its
+    estimate is the smallest of them; collisions can only make it too high. Only the smallest counters
+    are incremented (conservative update), which keeps that error low. After `sample` additions every
+    counter is halved, as in TinyLFU, so the estimates follow recent popularity and keys that were hot
+    an hour ago fade out. Not thread-safe: use it from the IOLoop.
+    """
+
+    MAX_COUNT = 255
+
+    def __init__(self, width=65536, depth=4, sample=None):
+        """Initializes a new instance of the FrequencySketch class."""
+        self.width = width
+        self.rows = [bytearray(width) for _ in range(depth)]
+        self.sample = sample or 10 * width
+        self.additions = 0
+
+    def _indexes(self, key):
+        """Returns the key's counter in each row, derived from one hash by double hashing."""
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        step = (h >> 32) | 1
+        return [(h + i * step) % self.width for i in range(len(self.rows))]
+
+    def add(self, key):
+        """Counts one occurrence of `key` and returns its new estimate."""
+        indexes = self._indexes(key)
+        estimate = min(row[index] for row, index in zip(self.rows, indexes))
+        if estimate < self.MAX_COUNT:
+            for row, index in zip(self.rows, indexes):
+                if row[index] == estimate:
+                    row[index] = estimate + 1
+            estimate += 1
+        self.additions += 1
+        if self.additions >= self.sample:
+            self.age()
+        return estimate
+
+    def estimate(self, key):
+        """Returns how many times `key` was added recently, never less than the truth."""
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def age(self):
+        """Halves every counter, so older occurrences weigh half as much as newer ones."""
+        self.rows = [bytearray(row.translate(_HALVE)) for row in self.rows]
+        self.additions //= 2
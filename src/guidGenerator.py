@@ -0,0 +1,109 @@
+"""
+Generators of the GUIDs the API assigns to new documents, all 32 uppercase hexadecimal characters in
+the layout of a UUID, so any of them matches the routes and validation.
+
+- 'random': random (version 4) UUIDs, like uuid.uuid4(). Unguessable, but consecutive inserts land
+  anywhere in the _id index, so its pages keep being split and a large index no longer fits in memory.
+- 'time-ordered': version 7 UUIDs (RFC 9562): a 48-bit Unix timestamp in milliseconds, then 74 bits
+  that keep increasing within a millisecond by a random step of up to 2**32. New GUIDs sort after the
+  previous ones, so inserts append to the right edge of the index. They reveal their creation time,
+  and within a millisecond the next one is only 32 bits away from the last.
+
+Both generate GUIDs `batch_size` at a time, from one os.urandom() call, and hand them out one by one.
+They are not thread-safe and keep state, so create one per process after forking.
+"""
+import os
+import struct
+import time
+from abc import ABC, abstractmethod
+
+GENERATORS = ('random', 'time-ordered')
+
+
+class GUIDGenerator(ABC):
+    """Hands out GUIDs from batches of `batch_size`; calling it returns the next one. Subclasses implement generate()."""
+
+    MAX_AGE = None  # seconds after which the rest of a batch is discarded, None to keep it
+
+    def __init__(self, batch_size=256):
+        """Initializes a new instance of the GUIDGenerator class."""
+        self.batch_size = batch_size
+        self.pool = []
+        self.generated = 0
+
+    def __call__(self):
+        """Returns the next GUID, generating a new batch when the current one is used up or too old."""
+        if not self.pool or (self.MAX_AGE is not None and time.monotonic() - self.generated > self.MAX_AGE):
+            self.pool = self.generate(self.batch_size)
+            self.pool.reverse()  # popped from the end, in the order they were generated
+            self.generated = time.monotonic()
+        return self.pool.pop()
+
+    @abstractmethod
+    def generate(self, count):
+        """Returns `count` new GUIDs."""
+
+
+class RandomGUIDs(GUIDGenerator):
+    """Version 4 UUIDs, see the module docstring."""
+
+    _CLEAR = ~((0xF << 76) | (0x3 << 62))
+    _SET = (0x4 << 76) | (0x2 << 62)
+
+    def generate(self, count):
+        """Returns `count` random GUIDs, with the version and variant bits of a version 4 UUID set."""
+        random = os.urandom(16 * count)
+        clear, set_ = self._CLEAR, self._SET
+        return ['%032X' % (int.from_bytes(random[i:i + 16], 'big') & clear | set_) for i in range(0, 16 * count, 16)]
+
+
+class TimeOrderedGUIDs(GUIDGenerator):
+    """
+    Version 7 UUIDs, see the module docstring. A batch is discarded after MAX_AGE seconds, so that
+    GUIDs handed out after a quiet spell still carry about the time of their creation.
+    """
+
+    MAX_AGE = 1.0
+    _COUNTER_BITS = 74
+    _VERSION = (0x7 << 76) | (0x2 << 62)
+
+    def __init__(self, batch_size=256):
+        """Initializes a new instance of the TimeOrderedGUIDs class."""
+        super().__init__(batch_size)
+        self.milliseconds = 0
+        self.counter = 0
+
+    def _seed(self):
+        """Starts the counter of a new millisecond at a random value."""
+        # A random start in the lower half of the counter leaves room for increments in the same millisecond.
+        self.counter = int.from_bytes(os.urandom(10), 'big') >> (80 - self._COUNTER_BITS + 1)
+
+    def generate(self, count):
+        """
+        Returns `count` GUIDs that sort after the previous ones: the current millisecond, or the last one
+        used if the clock is behind it, and the counter increased by a random step for each GUID.
+        """
+        now = time.time_ns() // 1000000
+        if now > self.milliseconds:
+            self.milliseconds = now
+            self._seed()
+        guids = []
+        version = self._VERSION
+        for step in struct.unpack(f'>{count}I', os.urandom(4 * count)):
+            self.counter += step + 1
+            if self.counter >> self._COUNTER_BITS:
+                self.milliseconds += 1
+                self._seed()
+            counter = self.counter
+            guids.append('%032X' % ((self.milliseconds << 80) | ((counter >> 62) << 64) | (counter & (2**62 - 1))
+                                    | version))
+        return guids
+
+
+def make_generator(name, batch_size=256):
+    """Creates the named GUID generator."""
+    if name == 'time-ordered':
+        return TimeOrderedGUIDs(batch_size)
+    if name == 'random':
+        return RandomGUIDs(batch_size)
+    raise ValueError(f"Unknown GUID generator: {name}")
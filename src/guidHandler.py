@@ -1,21 +1,33 @@
-import tornado.web
+import functools
+import re
+from .baseHandler import BaseHandler
+from .breaker import BackendUnavailable
 from .database import Database
-from .cache import Cache
+from .cache import Cache, MISSING
+from . import codec, versions
 import time
-import uuid
 import time
-import json
 
-class GUIDHandler(tornado.web.RequestHandler):
+class GUIDHandler(BaseHandler):
     """
     Handles HTTP requests related to GUIDs (Globally Unique Identifiers). 
     Works with a Database class for storing GUID data and a Cache class for caching GUID data.
+    Either backend may be unavailable (see CircuitBreaker): reads then bypass the cache and go to the
+    database, or are served from the cache alone, and requests that need the missing backend get a 503.
+    Every GUID carries a version (see versions): GET sends it as the ETag, with a Cache-Control
+    max-age of at most the application's `max_age` setting, and PATCH and DELETE honour If-Match.
     """
 
-    def initialize(self, db, cache):
-        """Initializes a new instance of the GUIDHandler."""
+    PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    CURSOR_PATTERN = re.compile(r'^(\d+)-([A-F0-9]{32})$')
+
+    def initialize(self, db, cache, flights, writes=None):
+        """Initializes a new instance of the GUIDHandler. `writes` is the WriteBehind queue, if enabled."""
         self.db = db
         self.cache = cache
+        self.flights = flights
+        self.writes = writes
     
     def validate_input(self, data):
         """
@@ -43,6 +55,23 @@ class GUIDHandler(tornado.web.RequestHandler):
 
         return errors
 
+    def build_metadata(self, data, guid=None):
+        """
+        Builds the document stored for a new GUID from validated input data, generating a GUID with the
+        application's GUID generator and a default expiry when they are not provided.
+        """
+        user = data.get('user')
+        # defaults to 30 days from now and store it as Unix time
+        expire = int(data.get('expire', int(time.time()) + 30*24*60*60))
+        guid = guid or self.application.settings['guid_generator']()
+
+        return {
+            'guid':guid,
+            'user': user,
+            'expire': expire,
+            'version': versions.new_version()
+        }
+
     def check_guid(self, guid):
         """
         Checks whether a GUID has been provided. If not, sends a 400 error response and returns False.
@@ -53,34 +82,158 @@ class GUIDHandler(tornado.web.RequestHandler):
             return False
         return True
 
+    def set_validators(self, metadata):
+        """
+        Sets the ETag of a GUID's metadata, dict or JSON bytes, and a Cache-Control max-age that never
+        outlives its expire. Returns True if the client's If-None-Match shows its copy is current.
+        GUIDs without a version keep Tornado's ETag, a hash of the body.
+        """
+        version, expire = versions.validators(metadata)
+        max_age = self.application.settings.get('max_age', 60)
+        if expire is not None:
+            max_age = min(max_age, expire - int(time.time()))
+        self.set_header('Cache-Control', f"max-age={max_age}" if max_age > 0 else 'no-cache')
+        if version is None:
+            return False
+        self.set_header('Etag', versions.etag(version))
+        return self.check_etag_header()
+
+    def expected_versions(self):
+        """Returns the versions the If-Match header accepts, or None when any version will do."""
+        header = self.request.headers.get('If-Match')
+        return versions.if_match(header) if header is not None else None
+
+    async def precondition_failed(self, guid):
+        """
+        Answers a PATCH or DELETE whose If-Match did not match: 412 if the GUID exists at another
+        version, 404 if it does not exist.
+        """
+        if await self.db.get_guid(guid) is not None:
+            self.set_status(412)
+            self.write({'error': 'GUID has been modified.'})
+        else:
+            self.set_status(404)
+            self.write({'error': 'GUID not found or has expired.'})
+
+    def require_cache(self):
+        """
+        Refuses a change to a GUID while the cache is unavailable: the database would be changed
+        under a cached copy that could not be updated, and reads would keep serving the old value.
+        """
+        if not self.cache.available():
+            raise BackendUnavailable('redis', 'circuit open')
+
     async def get(self, guid=None):
         """
         Handles HTTP GET requests for a GUID. If a GUID is provided, it attempts to retrieve its data.
         If the GUID does not exist in the database, sends a 404 error response.
+        A cache hit is answered with the cached JSON bytes as they are, without decoding them, or with
+        a 304 when If-None-Match names the GUID's version, read from those bytes.
+        With the cache unavailable the GUID is read from the database; with the database unavailable
+        only cached GUIDs are served. Reads are counted by HotKeys, when enabled, for the next warm-up.
+        Without a GUID, GET /guid?user=<user> lists that user's GUIDs instead.
         """
+        user = self.get_query_argument('user', None)
+        if guid is None and user is not None:
+            await self.list(user)
+            return
         if not self.check_guid(guid):
             return
+        hot_keys = self.application.settings.get('hot_keys')
+        if hot_keys is not None:
+            hot_keys.record(guid)
 
-        metadata = self.cache.get(guid)
+        # Concurrent misses and stale refreshes for the same GUID share one database lookup.
+        refresh = functools.partial(self.flights.do, guid, functools.partial(self.load, guid))
+        try:
+            metadata = await self.cache.get(guid, refresh=refresh, raw=True)
+        except BackendUnavailable:
+            metadata = None
         if metadata is None:
-            metadata = self.db.get_guid(guid)
+            metadata = await refresh()
+        elif metadata is MISSING:
+            metadata = None
 
-            if metadata is None:
-                self.set_status(404)
-                self.write({'error': 'GUID not found or has expired.'})
-                return
+        if metadata is None:
+            self.set_status(404)
+            self.write({'error': 'GUID not found or has expired.'})
+        elif self.set_validators(metadata):
+            self.set_status(304)
+        elif isinstance(metadata, bytes):
+            self.write_json(metadata)
+        else:
+            self.write(metadata)
+
+    async def list(self, user):
+        """
+        Writes one page of a user's unexpired GUIDs, ordered by expiry, as {"items": [...], "next": <cursor>}.
+        Pass 'next' back as ?after= to get the following page; it is null on the last one.
+        ?limit= sets the page size (default PAGE_SIZE, at most MAX_PAGE_SIZE). Items are written to
+        the client batch by batch as they are read from the database.
+        """
+        limit = self.get_query_argument('limit', str(self.PAGE_SIZE))
+        after = self.get_query_argument('after', None)
+        match = self.CURSOR_PATTERN.match(after) if after is not None else None
+        if not limit.isdigit() or not 1 <= int(limit) <= self.MAX_PAGE_SIZE:
+            self.set_status(400)
+            self.write({'error': f"Limit must be a number between 1 and {self.MAX_PAGE_SIZE}."})
+            return
+        if after is not None and match is None:
+            self.set_status(400)
+            self.write({'error': 'Invalid pagination cursor.'})
+            return
 
-            self.cache.set(guid, metadata)
+        limit = int(limit)
+        count = 0
+        last = None
+        more = False
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write(b'{"items": [')
+        # One document more than the page is read, only to tell whether a next page exists.
+        position = (int(match.group(1)), match.group(2)) if match else None
+        async for batch in self.db.iter_user_guids(user, position, limit + 1):
+            if count + len(batch) > limit:
+                batch = batch[:limit - count]
+                more = True
+            if batch:
+                self.write((b', ' if count else b'') + b', '.join(codec.dumps(document) for document in batch))
+                count += len(batch)
+                last = batch[-1]
+                await self.flush()
 
-        self.write(metadata)
+        cursor = f"{last['expire']}-{last['guid']}" if more else None
+        self.write(b'], "next": ' + codec.dumps(cursor) + b'}')
+
+    async def load(self, guid):
+        """
+        Fetches a GUID from the database and repopulates the cache with it,
+        or records it as missing. Returns None if the GUID does not exist or has expired.
+        In write-behind mode a GUID that is still queued is served from the queue.
+        If the cache is unavailable the GUID is returned without caching it; if the database is, this
+        raises BackendUnavailable rather than record the GUID as missing.
+        """
+        metadata = await self.db.get_guid(guid)
+        if metadata is None and self.writes is not None:
+            metadata = await self.writes.pending(guid)
+        try:
+            if metadata is not None:
+                await self.cache.fill(guid, metadata)
+            else:
+                await self.cache.set_missing(guid)
+        except BackendUnavailable:
+            pass
+        return metadata
 
 
     async def post(self, guid=None):
         """
         Handles HTTP POST requests to create a new GUID or update an existing one. 
         If the input data is valid, it creates or updates the GUID, else it sends a 400 error response.
+        In write-behind mode a generated GUID is only cached and queued for the database; a GUID given
+        in the URL is still inserted right away, since only the insert can tell that it is taken.
+        While the cache is unavailable, generated GUIDs are inserted right away too.
         """
-        data = json.loads(self.request.body)
+        data = codec.loads(self.request.body)
 
         errors = self.validate_input(data)
         if errors:
@@ -88,20 +241,25 @@ class GUIDHandler(tornado.web.RequestHandler):
             self.write({'errors': errors})
             return
 
-        user = data.get('user')
-        # defaults to 30 days from now and store it as Unix time
-        expire = int(data.get('expire', int(time.time()) + 30*24*60*60))
-        guid = guid or uuid.uuid4().hex.upper()
-
-        metadata = {
-            'guid':guid,
-            'user': user,
-            'expire': expire
-        }
+        metadata = self.build_metadata(data, guid)
+        if self.writes is not None and guid is None and self.cache.available():
+            try:
+                await self.writes.enqueue(metadata['guid'], metadata)
+                self.set_header('Etag', versions.etag(metadata['version']))
+                self.set_status(201)
+                self.write(metadata)
+                return
+            except BackendUnavailable:
+                pass  # a create queued anyway is flushed as a duplicate, which counts as done
+        guid = metadata['guid']
 
-        result = self.db.create_guid(guid, metadata)
+        result = await self.db.create_guid(guid, metadata)
         if result:
-            self.cache.set(guid, metadata)
+            try:
+                await self.cache.stored(guid, metadata)
+            except BackendUnavailable:
+                pass  # a new GUID has no cached copy to update
+            self.set_header('Etag', versions.etag(metadata['version']))
             self.set_status(201)
             self.write(metadata)
         else:
@@ -111,14 +269,27 @@ class GUIDHandler(tornado.web.RequestHandler):
     async def delete(self, guid=None):
         """
         Handles HTTP DELETE requests to delete a GUID. If a GUID is provided, it deletes it.
+        With If-Match, it is only deleted at one of the versions named, else the answer is a 412;
+        in write-behind mode a GUID that is still queued is then written to the database first.
         """
         if not self.check_guid(guid):
             return
-        
-        result = self.db.delete_guid(guid)
-        if result:
-            self.cache.delete(guid)
+        self.require_cache()
+
+        expected = self.expected_versions()
+        queued = False
+        if expected is None:
+            queued = self.writes is not None and await self.writes.discard(guid)
+        elif self.writes is not None and not await self.writes.persist(guid):
+            self.set_status(500)
+            self.write({'error': 'Failed to delete GUID.'})
+            return
+        result = await self.db.delete_guid(guid, expected)
+        if result or queued:
+            await self.cache.delete(guid)
             self.set_status(204)  # No content
+        elif expected is not None:
+            await self.precondition_failed(guid)
         else:
             self.set_status(404)
             self.write({'error': 'GUID not found.'})
@@ -127,11 +298,15 @@ class GUIDHandler(tornado.web.RequestHandler):
         """
         Handles HTTP PATCH requests to update an existing GUID. 
         If a GUID is provided and the input data is valid, it updates the GUID, else it sends a 400 error response.
+        The update and the read of the updated document are a single database call;
+        a GUID that does not exist or has expired gets a 404 error response.
+        With If-Match, it is only updated at one of the versions named, else the answer is a 412.
+        In write-behind mode a GUID that is still queued is written to the database first.
         """
         if not self.check_guid(guid):
             return
         
-        data = json.loads(self.request.body)
+        data = codec.loads(self.request.body)
         errors = self.validate_input(data)
         if errors:
             self.set_status(400)
@@ -140,11 +315,44 @@ class GUIDHandler(tornado.web.RequestHandler):
     
         if data.get('expire') is not None:
             data['expire'] = int(data.get('expire'))
-        result = self.db.update_guid(guid, data)
-        if result:
-            updated_data = self.db.get_guid(guid)
-            self.cache.set(guid, updated_data)
+        data['version'] = versions.new_version()
+        expected = self.expected_versions()
+        self.require_cache()
+        if self.writes is not None and not await self.writes.persist(guid):
+            self.set_status(500)
+            self.write({'error': 'Failed to update GUID.'})
+            return
+        updated_data = await self.db.update_guid(guid, data, expected)
+        if updated_data is None and expected is not None:
+            await self.precondition_failed(guid)
+        elif updated_data is None:
+            self.set_status(404)
+            self.write({'error': 'GUID not found or has expired.'})
+        elif updated_data:
+            await self.cache.stored(guid, updated_data, invalidate=True)
+            self.set_header('Etag', versions.etag(data['version']))
             self.write(updated_data)
         else:
             self.set_status(500)
-            self.write({'error': 'Failed to update GUID.'})
\ No newline at end of file
+            self.write({'error': 'Failed to update GUID.'})
+
+
+class CountHandler(GUIDHandler):
+    """Handles GET /guid/_count?user=<user>: counts a user's unexpired GUIDs."""
+
+    SUPPORTED_METHODS = ("GET",)
+
+    async def get(self):
+        """Writes {"user": <user>, "count": <count>}, using the {user, expire} index."""
+        user = self.get_query_argument('user', None)
+        if user is None:
+            self.set_status(400)
+            self.write({'error': 'User not provided.'})
+            return
+
+        count = await self.db.count_user_guids(user)
+        if count is None:
+            self.set_status(500)
+            self.write({'error': 'Failed to count GUIDs.'})
+            return
+        self.write({'user': user, 'count': count})
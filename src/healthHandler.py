@@ -0,0 +1,32 @@
+from .baseHandler import BaseHandler
+
+class LivenessHandler(BaseHandler):
+    """
+    GET /health/live: answers 200 as long as the worker's IOLoop serves requests, for the liveness probe.
+    It does not depend on MongoDB or Redis, so an outage of either does not get the pods restarted.
+    """
+
+    def priority(self):
+        """Probes are never shed or rate limited."""
+        return 'critical'
+
+    def get(self):
+        self.write({'status': 'ok'})
+
+
+class ReadinessHandler(LivenessHandler):
+    """
+    GET /health/ready: answers 200 once the cache warm-up is over in every worker, and 503 before that
+    and while the worker drains its requests on shutdown, for the readiness probe.
+    """
+
+    def get(self):
+        warmer = self.application.settings.get('warmer')
+        if self.application.settings['tracker'].draining:
+            self.set_status(503)
+            self.write({'status': 'draining'})
+        elif warmer is not None and not warmer.ready():
+            self.set_status(503)
+            self.write({'status': 'warming up'})
+        else:
+            self.write({'status': 'ready'})
@@ -1,5 +1,8 @@
-import tornado.web
+from .baseHandler import BaseHandler
+
+class MainHandler(BaseHandler):
+    def priority(self):
+        return 'critical'
 
-class MainHandler(tornado.web.RequestHandler):
     def get(self):
         self.write("Welcome to the GUID API. Available routes: /guid")
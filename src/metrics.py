@@ -0,0 +1,239 @@
+"""
+A small, dependency-free metrics registry exposed in the Prometheus text format.
+Metrics are kept per process, so with several workers each one reports its own values.
+Recording a sample is a dict lookup and a few additions on the IOLoop thread.
+"""
+from bisect import bisect_left
+from tornado.ioloop import IOLoop, PeriodicCallback
+import functools
+import time
+from . import profiling
+
+# Set to False to skip the request, backend and JSON timers (used to measure their overhead).
+enabled = True
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        """Initializes a new instance of the Counter class."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        """Adds `amount` to the value for the given label values."""
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        """Returns the current value for the given label values."""
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{_format_labels(self.labels, labels)} {value}'
+
+
+class Gauge(Counter):
+    """A value that can go up and down, per label combination."""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        """Sets the value for the given label values."""
+        self.values[labels] = value
+
+
+class Histogram:
+    """Counts observations into cumulative buckets per label combination, with their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        """Initializes a new instance of the Histogram class."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        """Records one observation for the given label values."""
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels):
+        """Returns the number of observations recorded for the given label values."""
+        series = self.values.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f'{self.name}_bucket{_format_labels(self.labels, labels, [le])} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {series[-1]}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}'
+
+
+class Registry:
+    """Holds the process's metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        """Initializes a new instance of the Registry class."""
+        self.metrics = []
+
+    def register(self, metric):
+        """Adds a metric to the registry and returns it."""
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        """Returns every registered metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'guid_api_requests_total', 'HTTP requests served.', ('handler', 'method', 'status')))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'guid_api_request_duration_seconds', 'Time from receiving a request to finishing its response.',
+    ('handler', 'method')))
+BACKEND_LATENCY = REGISTRY.register(Histogram(
+    'guid_api_backend_duration_seconds', 'Duration of Database and Cache operations, executor queueing included.',
+    ('backend', 'operation')))
+BACKEND_ERRORS = REGISTRY.register(Counter(
+    'guid_api_backend_errors_total', 'Database and Cache operations that failed.', ('backend', 'operation')))
+BACKEND_TIMEOUTS = REGISTRY.register(Counter(
+    'guid_api_backend_timeouts_total', 'Database and Cache calls that missed their deadline.', ('backend',)))
+BREAKER_STATE = REGISTRY.register(Gauge(
+    'guid_api_breaker_state', 'Circuit breaker state per backend: 0 closed, 1 half-open, 2 open.', ('backend',)))
+FAST_FAILS = REGISTRY.register(Counter(
+    'guid_api_breaker_fast_fails_total', 'Calls failed at once because the backend\'s circuit breaker was open.',
+    ('backend',)))
+JSON_ENCODE_LATENCY = REGISTRY.register(Histogram(
+    'guid_api_json_encode_duration_seconds', 'Time spent encoding JSON response bodies.', (),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'guid_api_cache_lookups_total', 'Cache.get calls by outcome (hit, miss or negative).', ('result',)))
+CACHE_ADMISSIONS = REGISTRY.register(Counter(
+    'guid_api_cache_admissions_total', 'GUIDs read after a cache miss that the admission threshold let into the cache or not.',
+    ('outcome',)))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    'guid_api_cache_hit_ratio', 'Share of Cache.get calls answered from the cache, tombstones included.'))
+IOLOOP_LAG = REGISTRY.register(Histogram(
+    'guid_api_ioloop_lag_seconds', 'Delay between scheduling a callback on the IOLoop and running it.', ()))
+GUIDS_REAPED = REGISTRY.register(Counter(
+    'guid_api_reaped_guids_total', 'Expired GUIDs deleted by the reaper.'))
+REAP_THROUGHPUT = REGISTRY.register(Gauge(
+    'guid_api_reap_throughput', 'GUIDs deleted per second during the last reaper pass.'))
+COLLECTION_SIZE = REGISTRY.register(Gauge(
+    'guid_api_collection_documents', 'Estimated number of documents in the GUID collection, as of the last reaper pass.'))
+REJECTED = REGISTRY.register(Counter(
+    'guid_api_rejected_requests_total', 'Requests refused by admission control, by reason (overload or rate_limit).',
+    ('reason', 'priority')))
+WARMUP_GUIDS = REGISTRY.register(Gauge(
+    'guid_api_warmup_guids', 'GUIDs loaded into the cache by the warm-up, and the ones it found already cached.',
+    ('outcome',)))
+WARMUP_DURATION = REGISTRY.register(Gauge(
+    'guid_api_warmup_duration_seconds', 'Time the warm-up took before the worker reported ready.'))
+WRITES_QUEUED = REGISTRY.register(Counter(
+    'guid_api_write_behind_queued_total', 'GUID creates queued for the database by this process in write-behind mode.'))
+WRITES_FLUSHED = REGISTRY.register(Counter(
+    'guid_api_write_behind_flushed_total', 'Queued GUID creates written to the database by this process.'))
+WRITE_BACKLOG = REGISTRY.register(Gauge(
+    'guid_api_write_behind_backlog', 'Queued GUID creates not written to the database yet, across all processes.'))
+WRITE_LAG = REGISTRY.register(Gauge(
+    'guid_api_write_behind_lag_seconds', 'Age of the oldest queued GUID create not written to the database yet.'))
+
+CHANGE_EVENTS = REGISTRY.register(Counter(
+    'guid_api_change_events_total', 'GUID changes read from the MongoDB change stream and applied to the cache, by operation.',
+    ('operation',)))
+CHANGE_LAG = REGISTRY.register(Gauge(
+    'guid_api_change_lag_seconds', 'Time between the last applied change in MongoDB and its cache invalidation.'))
+
+
+def timed(backend):
+    """
+    Decorates a Database or Cache coroutine method so that each call is recorded in
+    BACKEND_LATENCY under the backend name and the method name, and each exception it
+    raises in BACKEND_ERRORS. Calls made by a traced request are also recorded as its stages.
+    """
+    def decorator(fn):
+        operation = fn.__name__
+        stage = f"{backend}.{operation}"
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not enabled:
+                return await fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                BACKEND_ERRORS.inc(backend, operation)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                BACKEND_LATENCY.observe(elapsed, backend, operation)
+                profiling.record_stage(stage, started, elapsed)
+        return wrapper
+    return decorator
+
+
+def update_cache_ratio():
+    """Refreshes the hit ratio gauge from the lookup counters."""
+    hits = CACHE_LOOKUPS.get('hit') + CACHE_LOOKUPS.get('negative')
+    total = hits + CACHE_LOOKUPS.get('miss')
+    CACHE_HIT_RATIO.set(hits / total if total else 0)
+
+
+class LoopLagMonitor:
+    """
+    Measures IOLoop lag: every `interval` seconds it schedules a callback and records how long the
+    loop took to get to it, which is the time any ready request currently waits in the queue.
+    """
+
+    def __init__(self, interval=0.5):
+        """Initializes a new instance of the LoopLagMonitor class."""
+        self.interval = interval
+        self.callback = None
+
+    def start(self):
+        """Starts probing the current IOLoop."""
+        loop = IOLoop.current()
+
+        def probe():
+            scheduled = time.perf_counter()
+            loop.add_callback(lambda: IOLOOP_LAG.observe(time.perf_counter() - scheduled))
+
+        self.callback = PeriodicCallback(probe, self.interval * 1000)
+        self.callback.start()
+
+    def stop(self):
+        """Stops probing."""
+        if self.callback is not None:
+            self.callback.stop()
+            self.callback = None
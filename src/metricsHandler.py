@@ -0,0 +1,31 @@
+from .baseHandler import BaseHandler
+from . import metrics
+
+class MetricsHandler(BaseHandler):
+    """
+    Exposes the worker's metrics in the Prometheus text format at GET /metrics.
+    Each worker process keeps its own registry, so a scrape reports the worker that answered it.
+    """
+
+    def initialize(self, cache):
+        """Initializes the handler with the cache whose counters are reported."""
+        self.cache = cache
+
+    def priority(self):
+        """Scrapes are never shed or rate limited, so overload stays observable."""
+        return 'critical'
+
+    def get(self):
+        metrics.update_cache_ratio()
+        lines = [metrics.REGISTRY.expose()]
+        stats = self.cache.stats()
+        lines.append('# TYPE guid_api_cache_negative_hits_total counter')
+        lines.append(f"guid_api_cache_negative_hits_total {stats['negative_hits']}")
+        if stats['local'] is not None:
+            for key, value in stats['local'].items():
+                kind = 'gauge' if key in ('entries', 'bytes') else 'counter'
+                suffix = '' if kind == 'gauge' else '_total'
+                lines.append(f'# TYPE guid_api_local_cache_{key}{suffix} {kind}')
+                lines.append(f'guid_api_local_cache_{key}{suffix} {value}')
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write('\n'.join(lines) + '\n')
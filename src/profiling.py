@@ -0,0 +1,151 @@
+"""
+Profiling hooks for a live worker, both idle unless asked for.
+
+StackSampler samples the stacks of every thread from a background thread with sys._current_frames(),
+without sys.setprofile or sys.settrace, so the sampled code runs at full speed and nothing runs when
+no profile is in progress. Profiles are reported as collapsed stacks, one 'thread;outer;...;inner count'
+line per distinct stack, the input of flamegraph.pl, speedscope and most flame graph viewers.
+
+SlowRequestLog records how long each stage of a request took (admission, every timed MongoDB and Redis
+operation, JSON encoding) and keeps and logs the requests slower than its threshold. Stages are
+collected in a context variable that only requests traced by the log set, so record_stage() is a
+context variable lookup for the others.
+"""
+import asyncio
+import collections
+import contextvars
+import os
+import sys
+import threading
+import time
+from tornado.log import app_log
+
+_stages = contextvars.ContextVar('stages', default=None)
+
+
+def record_stage(name, started, elapsed):
+    """Records that the stage `name` of the current request started at `started` (perf_counter) and took `elapsed`."""
+    stages = _stages.get()
+    if stages is not None:
+        stages.append((name, started, elapsed))
+
+
+def trace_stages():
+    """Starts collecting the stages of the current request, in the current context, and returns their list."""
+    stages = []
+    _stages.set(stages)
+    return stages
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one runs in the worker."""
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples every thread's stack each `interval` seconds on a background thread, while started,
+    and counts the distinct stacks (see the module docstring).
+    """
+
+    def __init__(self, interval=0.01):
+        """Initializes a new instance of the StackSampler class."""
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Starts sampling."""
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops sampling and returns the collapsed stacks."""
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        return self.collapsed()
+
+    def _run(self):
+        own = threading.get_ident()
+        labels = {}  # code objects' labels, formatted once
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Returns the stacks sampled so far in the collapsed format, most frequent first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Runs one StackSampler at a time in the worker, for the admin endpoint."""
+
+    def __init__(self):
+        """Initializes a new instance of the Profiler class."""
+        self.sampler = None
+
+    async def profile(self, seconds, interval=0.01):
+        """Samples the worker for `seconds` and returns the collapsed stacks. Raises ProfilerBusy if one runs."""
+        if self.sampler is not None:
+            raise ProfilerBusy()
+        self.sampler = StackSampler(interval)
+        self.sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler, self.sampler = self.sampler, None
+            collapsed = sampler.stop()
+        return collapsed
+
+
+class SlowRequestLog:
+    """
+    Logs the requests slower than `threshold` seconds, with the timings of their stages, and keeps
+    the last `size` of them for the admin endpoint.
+    """
+
+    def __init__(self, threshold, size=100):
+        """Initializes a new instance of the SlowRequestLog class."""
+        self.threshold = threshold
+        self.entries = collections.deque(maxlen=size)
+
+    def record(self, method, uri, status, duration, started, stages):
+        """
+        Keeps and logs a request if it was slow. `started` is when its handler started (perf_counter),
+        which the stages' start times are given relative to.
+        """
+        if duration < self.threshold:
+            return
+        entry = {
+            'time': time.time(),
+            'method': method,
+            'uri': uri,
+            'status': status,
+            'duration_ms': round(duration * 1000, 3),
+            'stages': [{'name': name, 'start_ms': round((start - started) * 1000, 3),
+                        'duration_ms': round(elapsed * 1000, 3)} for name, start, elapsed in stages],
+        }
+        self.entries.append(entry)
+        app_log.warning("Slow request: %s %s %d %.1fms (%s)", method, uri, status, duration * 1000,
+                        ', '.join(f"{stage['name']} {stage['duration_ms']:.1f}ms at {stage['start_ms']:.1f}ms"
+                                  for stage in entry['stages']) or 'no stages')
@@ -0,0 +1,60 @@
+import asyncio
+import time
+from tornado.log import app_log
+from .background import BackgroundTask
+from .metrics import COLLECTION_SIZE, GUIDS_REAPED, REAP_THROUGHPUT
+
+class Reaper(BackgroundTask):
+    """
+    Periodically deletes expired GUIDs from the database in batches and evicts them from the cache.
+    MongoDB's TTL index removes them as well, but only about once a minute and without telling the
+    cache; the reaper also removes documents stored before 'expire_at' existed.
+    Deletes are paced to at most `rate` GUIDs per second so that a large backlog does not compete
+    with foreground requests for the database. Each pass logs and records in the metrics how many
+    GUIDs it deleted, how fast, and the collection size. stop() interrupts the pause between
+    batches or passes.
+    """
+
+    def __init__(self, db, cache, interval=60, batch_size=500, rate=1000):
+        """Initializes a new instance of the Reaper class."""
+        self.db = db
+        self.cache = cache
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rate = rate
+
+    async def run(self):
+        """Reaps every `interval` seconds until stopped."""
+        while True:
+            try:
+                await self.reap()
+            except Exception as e:
+                app_log.error("Reaper pass failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def reap(self):
+        """Deletes the GUIDs that have expired, batch by batch, and returns how many were deleted."""
+        started = time.perf_counter()
+        deleted = 0
+        while True:
+            batch_started = time.perf_counter()
+            expired = await self.db.delete_expired(self.batch_size)
+            if not expired:
+                break
+            await self.cache.delete_many(expired)
+            deleted += len(expired)
+            GUIDS_REAPED.inc(amount=len(expired))
+            if len(expired) < self.batch_size:
+                break
+            # Spread the batches out so the deletes average at most `rate` GUIDs per second.
+            await asyncio.sleep(max(0, len(expired) / self.rate - (time.perf_counter() - batch_started)))
+
+        elapsed = time.perf_counter() - started
+        size = await self.db.count_guids()
+        if size is not None:
+            COLLECTION_SIZE.set(size)
+        if deleted:
+            REAP_THROUGHPUT.set(deleted / elapsed)
+            app_log.info("Reaped %d expired GUIDs in %.1fs (%.0f/s), %s documents left",
+                         deleted, elapsed, deleted / elapsed, size)
+        return deleted
@@ -1,18 +1,50 @@
 import tornado.web
+from .baseHandler import RequestTracker
 from .mainHandler import MainHandler
-from .guidHandler import GUIDHandler
+from .metricsHandler import MetricsHandler
+from .healthHandler import LivenessHandler, ReadinessHandler
+from .guidHandler import GUIDHandler, CountHandler
+from .bulkHandler import BulkGUIDHandler, MultiGetHandler
+from .streamHandler import ExportHandler, ImportHandler
+from .adminHandler import ProfileHandler, SlowRequestsHandler
 from .database import Database
 from .cache import Cache
+from .singleflight import SingleFlight
+from .profiling import Profiler
+from .guidGenerator import RandomGUIDs
 
-def make_app(db=None, cache=None):
+def make_app(db=None, cache=None, flights=None, writes=None, admission=None, warmer=None, hot_keys=None, max_age=60,
+             compression=None, admin_token=None, slow_log=None, guid_generator=None):
     # If no mock instances were provided, create real ones
     if db is None:
         db = Database()
     if cache is None:
         cache = Cache()
+    if flights is None:
+        flights = SingleFlight()
+    if guid_generator is None:
+        guid_generator = RandomGUIDs()
 
-    return tornado.web.Application([
+    # `writes` is the WriteBehind queue; None (the default) keeps creates synchronous.
+    # `compression` is a Compression for the responses; None (the default) sends them uncompressed.
+    # The /admin endpoints and the NDJSON export and import are only routed with an `admin_token`;
+    # `slow_log` is a SlowRequestLog.
+    handler_args = dict(db=db, cache=cache, flights=flights, writes=writes)
+    admin_routes = [
+        (r"/admin/profile", ProfileHandler, dict(token=admin_token)),
+        (r"/admin/slow-requests", SlowRequestsHandler, dict(token=admin_token)),
+        (r"/guid/_export", ExportHandler, dict(handler_args, token=admin_token)),
+        (r"/guid/_import", ImportHandler, dict(handler_args, token=admin_token)),
+    ] if admin_token else []
+    return tornado.web.Application(admin_routes + [
         (r"/", MainHandler),
-        (r"/guid/([A-F0-9]{32})", GUIDHandler, dict(db=db, cache=cache)),
-        (r"/guid/?", GUIDHandler, dict(db=db, cache=cache)),
-    ])
\ No newline at end of file
+        (r"/metrics", MetricsHandler, dict(cache=cache)),
+        (r"/health/live", LivenessHandler),
+        (r"/health/ready", ReadinessHandler),
+        (r"/guid/_bulk", BulkGUIDHandler, handler_args),
+        (r"/guid/_mget", MultiGetHandler, handler_args),
+        (r"/guid/_count", CountHandler, handler_args),
+        (r"/guid/([A-F0-9]{32})", GUIDHandler, handler_args),
+        (r"/guid/?", GUIDHandler, handler_args),
+    ], tracker=RequestTracker(), admission=admission, warmer=warmer, hot_keys=hot_keys,
+       max_age=max_age, profiler=Profiler(), slow_log=slow_log, guid_generator=guid_generator, transforms=[compression] if compression is not None else None)
\ No newline at end of file
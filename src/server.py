@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import inspect
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.log import app_log
+
+def fork_workers(count, max_restarts=100):
+    """
+    Forks `count` worker processes that share the listening sockets already bound by the parent,
+    and returns the worker's index (0 to count - 1) in each child.
+    The parent never returns: it supervises the workers, restarting any that crash, forwards
+    SIGTERM and SIGINT to them, and exits once they have all exited after a shutdown.
+    Anything holding connections (Mongo, Redis clients) must be created after this call.
+    """
+    children = {}
+    stopping = []
+
+    def start_child(index):
+        pid = os.fork()
+        if pid == 0:
+            return index
+        children[pid] = index
+        return None
+
+    for index in range(count):
+        if start_child(index) is not None:
+            return index
+
+    def forward(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            os.kill(pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    app_log.info("Started %d worker processes", count)
+
+    restarts = 0
+    while children:
+        pid, status = os.wait()
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        if stopping or (os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0):
+            app_log.info("Worker %d (pid %d) exited", index, pid)
+            continue
+
+        app_log.warning("Worker %d (pid %d) died with status %d, restarting", index, pid, status)
+        restarts += 1
+        if restarts > max_restarts:
+            raise RuntimeError("Too many worker restarts, giving up")
+        if start_child(index) is not None:
+            # Restarted children do not inherit the supervisor's signal forwarding.
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            return index
+    sys.exit(0)
+
+
+class Worker:
+    """
+    Serves an application on pre-bound sockets in the current process and shuts down gracefully:
+    on SIGTERM or SIGINT it stops accepting connections, waits up to shutdown_timeout seconds for
+    the requests in flight to finish, runs the registered shutdown hooks and stops the IOLoop.
+    """
+
+    def __init__(self, app, sockets, shutdown_timeout=30, **server_settings):
+        """Initializes a new instance of the Worker class."""
+        self.app = app
+        self.sockets = sockets
+        self.shutdown_timeout = shutdown_timeout
+        self.server = HTTPServer(app, **server_settings)
+        self.hooks = []
+        self.stopping = False
+
+    def on_shutdown(self, hook):
+        """Registers a function or coroutine function to run once the requests in flight have drained."""
+        self.hooks.append(hook)
+
+    def start(self):
+        """Starts serving and runs the IOLoop until shutdown completes."""
+        self.server.add_sockets(self.sockets)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: IOLoop.current().add_callback_from_signal(self.shutdown))
+        IOLoop.current().start()
+
+    async def shutdown(self):
+        """Drains the requests in flight, runs the shutdown hooks and stops the IOLoop."""
+        if self.stopping:
+            return
+        self.stopping = True
+        self.server.stop()
+
+        tracker = self.app.settings['tracker']
+        tracker.draining = True
+        deadline = time.monotonic() + self.shutdown_timeout
+        while tracker.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if tracker.in_flight:
+            app_log.warning("Shutting down with %d requests still in flight", tracker.in_flight)
+
+        for hook in self.hooks:
+            try:
+                result = hook()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                app_log.error("Shutdown hook failed: %s", e)
+        IOLoop.current().stop()
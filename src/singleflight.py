@@ -0,0 +1,33 @@
+import asyncio
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single in-flight call.
+    Used on the GUID read path so a burst of cache misses for one GUID results in one
+    Mongo lookup whose result (including a None for a missing GUID) is shared by every caller.
+    """
+
+    def __init__(self):
+        """Initializes a new instance of the SingleFlight class."""
+        self.calls = {}
+        self.shared = 0  # callers that joined a call already in flight
+
+    async def do(self, key, fn):
+        """
+        Awaits fn() for the key, or joins the call already running for it.
+        fn is a zero-argument coroutine function; its result or exception is returned to all callers.
+        """
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self.calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        # Shield the shared call so that one cancelled caller does not cancel it for the others.
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        """Drops a finished call so the next miss for the key starts a fresh one."""
+        if self.calls.get(key) is future:
+            del self.calls[key]
@@ -0,0 +1,158 @@
+import time
+import tornado.web
+from tornado.log import app_log
+from .bulkHandler import BulkHandler
+from . import codec
+
+class StreamHandler(BulkHandler):
+    """
+    Base class for the NDJSON export and import. Dumping or loading the whole collection is an operator
+    action, so they are only routed when an admin token is configured, and like the /admin endpoints
+    they answer 401 unless the request sends it as 'Authorization: Bearer <token>'. Unlike those,
+    they are still shed first when the worker is overloaded.
+    """
+
+    def initialize(self, token, **kwargs):
+        """Initializes the handler with the admin token and the arguments of the GUID handlers."""
+        super().initialize(**kwargs)
+        self.token = token
+
+    async def prepare(self):
+        """Admits the request, then refuses it with a 401 unless it carries the admin token."""
+        await super().prepare()
+        if self.admitted:
+            self.admitted = self.authorize(self.token)
+
+
+class ExportHandler(StreamHandler):
+    """
+    Handles GET /guid/_export: streams the whole GUID collection as NDJSON, one document per line.
+    Documents are read from a Mongo cursor in batches and each batch is flushed before the next
+    one is read, so memory stays bounded by the batch size whatever the collection size.
+    """
+
+    SUPPORTED_METHODS = ("GET",)
+    BATCH_SIZE = 1000
+
+    async def get(self):
+        """Writes every GUID document as a line of JSON."""
+        started = time.perf_counter()
+        count = 0
+        self.set_header('Content-Type', 'application/x-ndjson')
+        async for batch in self.db.iter_guids(self.BATCH_SIZE):
+            self.write(b''.join(codec.dumps(document) + b'\n' for document in batch))
+            # Waits for the socket to drain, which also throttles the cursor to the client's pace.
+            await self.flush()
+            count += len(batch)
+
+        elapsed = time.perf_counter() - started
+        app_log.info("Exported %d GUIDs in %.1fs (%.0f lines/s)", count, elapsed, count / elapsed if elapsed else 0)
+
+
+@tornado.web.stream_request_body
+class ImportHandler(StreamHandler):
+    """
+    Handles POST /guid/_import: loads GUIDs from an NDJSON request body, one document per line.
+    The body is consumed chunk by chunk as it arrives. Each line is validated like POST /guid and
+    valid documents are written with insert_many in batches of BATCH_SIZE; while a batch is being
+    written no more of the body is read. Pass ?ordered=true to stop at the first failed insert.
+    """
+
+    SUPPORTED_METHODS = ("POST",)
+    BATCH_SIZE = 1000
+    MAX_BODY_SIZE = 10 * 1024 * 1024 * 1024
+    MAX_REPORTED_ERRORS = 100
+
+    async def prepare(self):
+        """Resets the import counters and lifts the default body size limit for authorized requests."""
+        self.ordered = self.get_query_argument('ordered', 'false').lower() == 'true'
+        self.started = time.perf_counter()
+        self.buffer = b''
+        self.batch = {}
+        self.line_number = 0
+        self.imported = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.errors = []
+        self.stopped = False
+        await super().prepare()
+        if not self.admitted:
+            self.stopped = True  # the request was rejected or unauthorized: ignore the body
+            return
+        self.request.connection.set_max_body_size(self.MAX_BODY_SIZE)
+
+    async def data_received(self, chunk):
+        """Splits the newly received bytes into complete lines and processes them."""
+        lines = (self.buffer + chunk).split(b'\n')
+        self.buffer = lines.pop()
+        for line in lines:
+            await self.process_line(line)
+
+    async def process_line(self, line):
+        """Validates one NDJSON line and queues it for insertion, writing the batch once it is full."""
+        self.line_number += 1
+        if not line.strip():
+            return
+        if self.stopped:
+            self.skipped += 1
+            return
+
+        try:
+            data = codec.loads(line)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            self.reject_line(self.line_number, {'invalid': 'Line is not a JSON object.'})
+            return
+
+        errors = self.validate_item(data, self.batch)
+        if errors:
+            self.reject_line(self.line_number, errors)
+            return
+
+        metadata = self.build_metadata(data, data.get('guid'))
+        self.batch[metadata['guid']] = (self.line_number, metadata)
+        if len(self.batch) >= self.BATCH_SIZE:
+            await self.write_batch()
+
+    async def write_batch(self):
+        """Inserts the queued documents and records the ones that could not be created."""
+        batch, self.batch = self.batch, {}
+        if not batch:
+            return
+        created = await self.db.create_guids({guid: metadata for guid, (_, metadata) in batch.items()},
+                                             ordered=self.ordered)
+        # A GUID looked up before it was imported may be recorded as missing.
+        await self.cache.clear_missing(created)
+        self.imported += len(created)
+        for guid, (line_number, _) in batch.items():
+            if guid in created:
+                continue
+            if self.ordered and self.stopped:
+                self.skipped += 1
+                continue
+            self.reject_line(line_number, {'guid': 'Failed to create GUID.'})
+            self.stopped = self.ordered
+
+    def reject_line(self, line_number, errors):
+        """Counts a rejected line and keeps the first few errors for the response."""
+        self.rejected += 1
+        if len(self.errors) < self.MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'errors': errors})
+
+    async def post(self):
+        """Processes the last line and batch, then reports what was imported."""
+        if self.buffer:
+            await self.process_line(self.buffer)
+            self.buffer = b''
+        await self.write_batch()
+
+        elapsed = time.perf_counter() - self.started
+        self.write({
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'seconds': round(elapsed, 3),
+            'lines_per_second': round(self.line_number / elapsed) if elapsed else None,
+        })
@@ -0,0 +1,45 @@
+"""
+Versions of the GUID documents, for HTTP validators. Every create and update stores a new random
+'version' in the document; GET sends it as a strong ETag and answers a matching If-None-Match with a
+304, and PATCH and DELETE only apply while the version is one an If-Match header names.
+The version and expire of a cached GUID are read from its JSON without decoding it.
+"""
+import re
+import secrets
+
+_VERSION = re.compile(rb'"version": ?"([0-9a-f]{16})"')
+_EXPIRE = re.compile(rb'"expire": ?(\d+)')
+
+
+def new_version():
+    """Returns a new version: 16 random hex digits."""
+    return secrets.token_hex(8)
+
+
+def etag(version):
+    """Returns the strong ETag of a version."""
+    return f'"{version}"'
+
+
+def validators(metadata):
+    """
+    Returns the (version, expire) of a GUID's metadata, given as a dict or as JSON bytes; either is
+    None when the metadata lacks it, e.g. a version for GUIDs written before versions existed.
+    """
+    if isinstance(metadata, dict):
+        return metadata.get('version'), metadata.get('expire')
+    # A quote inside a JSON string is escaped, so these only match the document's own fields.
+    version = _VERSION.search(metadata)
+    expire = _EXPIRE.search(metadata)
+    return version and version.group(1).decode(), expire and int(expire.group(1))
+
+
+def if_match(header):
+    """
+    Returns the versions an If-Match header accepts, or None for '*', which any current version
+    satisfies. Weak ETags never match, since If-Match compares ETags strongly.
+    """
+    if header.strip() == '*':
+        return None
+    tags = (tag.strip() for tag in header.split(','))
+    return [tag[1:-1] for tag in tags if len(tag) > 1 and tag[0] == tag[-1] == '"']
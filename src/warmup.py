@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import time
+from operator import itemgetter
+from tornado.log import app_log
+from .background import BackgroundTask
+from .metrics import WARMUP_DURATION, WARMUP_GUIDS
+
+class HotKeys(BackgroundTask):
+    """
+    Tracks the GUIDs a worker reads and every `interval` seconds records the `size` most read ones in
+    the 'guid:hot' Redis sorted set, scored by the time they were last hot. The set is shared by every
+    worker and pod and trimmed to `size` members, and Warmer loads its top GUIDs after a restart.
+    Reads are only counted in memory; the counts are dropped after each flush.
+    """
+
+    KEY = 'guid:hot'
+
+    def __init__(self, cache, size=10000, interval=30):
+        """Initializes a new instance of the HotKeys class."""
+        self.cache = cache
+        self.client = cache.client
+        self.size = size
+        self.interval = interval
+        self.counts = {}
+
+    def record(self, guid):
+        """Counts a read of a GUID. Once `size` times as many GUIDs are counted, new ones wait for the next flush."""
+        count = self.counts.get(guid)
+        if count is not None:
+            self.counts[guid] = count + 1
+        elif len(self.counts) < self.size * 10:
+            self.counts[guid] = 1
+
+    async def stop(self):
+        """Stops flushing, after recording the reads counted since the last flush for the next warm-up."""
+        if self.task is not None:
+            await super().stop()
+            await self.flush()
+
+    async def run(self):
+        """Flushes every `interval` seconds until stopped."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                app_log.error("Hot key flush failed: %s", e)
+
+    async def flush(self):
+        """Records the most read GUIDs since the last flush, in one round trip."""
+        counts, self.counts = self.counts, {}
+        hottest = heapq.nlargest(self.size, counts.items(), key=itemgetter(1))
+        if hottest:
+            await self.cache.run(self._record, [guid for guid, _ in hottest])
+
+    def _record(self, guids):
+        """Adds GUIDs to the sorted set and trims it. Runs on the executor."""
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(self.KEY, {guid: now for guid in guids})
+        pipe.zremrangebyrank(self.KEY, 0, -self.size - 1)
+        pipe.execute()
+
+    async def hottest(self, limit):
+        """Returns up to `limit` GUIDs recorded as hot, the most recent first."""
+        members = await self.cache.run(self.client.zrevrange, self.KEY, 0, limit - 1)
+        return [member.decode() if isinstance(member, bytes) else member for member in members]
+
+
+class Warmer(BackgroundTask):
+    """
+    Preloads the cache before a worker reports ready, so a deploy or a Redis failover does not send the
+    first minutes of reads to the database. It loads up to `limit` GUIDs: the hottest ones recorded by
+    HotKeys, or when none are recorded (e.g. Redis lost its data), the most recently created ones from
+    the database. They go in batches of `batch_size`: one MGET to skip those still cached, one find for
+    the others and one pipelined write to Redis and the local tier. With several workers, worker `index`
+    of `count` warms every count-th GUID, and `warmed`, a multiprocessing.Value created before the fork,
+    counts the workers done with their share: every worker reports ready only once all of them are, since
+    the readiness probe reaches whichever worker accepts its connection. A failed warm-up is logged and
+    counts as done.
+    """
+
+    def __init__(self, db, cache, hot_keys=None, limit=10000, batch_size=500, index=0, count=1, warmed=None):
+        """Initializes a new instance of the Warmer class."""
+        self.db = db
+        self.cache = cache
+        self.hot_keys = hot_keys
+        self.limit = limit
+        self.batch_size = batch_size
+        self.index = index
+        self.count = count
+        self.warmed = warmed
+        self.finished = limit == 0
+
+    def start(self):
+        """Starts warming up in the background on the current IOLoop, unless there is nothing to warm up."""
+        if not self.finished:
+            super().start()
+
+    def ready(self):
+        """Returns True once this worker's share is loaded and, given `warmed`, every other worker's too."""
+        if not self.finished:
+            return False
+        return self.limit == 0 or self.warmed is None or self.warmed.value >= self.count
+
+    async def run(self):
+        """Warms the cache up, then marks this worker's share as done. Returns the number of GUIDs loaded."""
+        started = time.perf_counter()
+        loaded = cached = 0
+        try:
+            guids = await self.candidates()
+            for start in range(0, len(guids), self.batch_size):
+                batch = guids[start:start + self.batch_size]
+                found = await self.cache.get_many(batch)
+                missing = [guid for guid in batch if guid not in found]
+                documents = await self.db.get_guids(missing) if missing else {}
+                if documents:
+                    await self.cache.set_many(documents)
+                cached += len(found)
+                loaded += len(documents or {})
+        except Exception as e:
+            app_log.error("Cache warm-up failed: %s", e)
+        finally:
+            elapsed = time.perf_counter() - started
+            WARMUP_GUIDS.set(loaded, 'loaded')
+            WARMUP_GUIDS.set(cached, 'cached')
+            WARMUP_DURATION.set(elapsed)
+            app_log.info("Cache warm-up loaded %d GUIDs (%d already cached) in %.1fs", loaded, cached, elapsed)
+            if self.warmed is not None and not self.finished:
+                with self.warmed.get_lock():
+                    self.warmed.value += 1
+            self.finished = True
+        return loaded
+
+    async def candidates(self):
+        """Returns this worker's share of the GUIDs to warm up."""
+        guids = await self.hot_keys.hottest(self.limit) if self.hot_keys is not None else []
+        if not guids:
+            guids = await self.db.recent_guids(self.limit) or []
+        return guids[self.index::self.count]
@@ -0,0 +1,253 @@
+import asyncio
+import time
+import redis
+from tornado.log import app_log
+from .background import BackgroundTask
+from .metrics import WRITE_BACKLOG, WRITE_LAG, WRITES_FLUSHED, WRITES_QUEUED, timed
+from . import codec
+
+class WriteBehind(BackgroundTask):
+    """
+    Write-behind mode for GUID creation: a create is stored in Redis and acknowledged at once, and
+    a background flusher writes it to the database later, in batches of up to `batch_size` GUIDs
+    collected for at most `interval` seconds, with one insert_many each.
+    A queued create is kept in two places until it is flushed: its document in the 'guid:pending'
+    hash, which PATCH, DELETE and cache misses consult, and its GUID in the 'guid:writes' stream,
+    which every worker's flusher reads through one consumer group. Entries are acknowledged and
+    deleted only once the database has the documents, so creates survive a crash or restart of
+    the API: entries left unacknowledged by a flusher that stopped are claimed by another one
+    after `claim_idle` seconds and written again, a duplicate key counting as done. stop() writes
+    out what is queued before the worker exits. The backlog and the age of its oldest entry are
+    exposed in the metrics. The flusher's Redis calls go through the Cache's breaker like the
+    requests' do: connection errors it meets open the breaker for requests too, and while it is
+    open the flusher fails fast and retries. Its blocking reads and its scan for entries to claim
+    are exempt from the deadline.
+    """
+
+    STREAM = 'guid:writes'
+    GROUP = 'flushers'
+    PENDING = 'guid:pending'
+    DELETED_PREFIX = 'deleted:'
+    DELETED_TTL = 300  # must outlast one flush, see discard()
+
+    def __init__(self, db, cache, batch_size=500, interval=0.05, claim_idle=30, retry_delay=1):
+        """Initializes a new instance of the WriteBehind class."""
+        self.db = db
+        self.cache = cache
+        self.client = cache.client
+        self.consumer = cache.node_id
+        self.batch_size = batch_size
+        self.interval = interval
+        self.claim_idle = claim_idle
+        self.retry_delay = retry_delay
+        self.backlog = True  # whether this consumer may have delivered entries left to flush
+        self.stopping = False
+
+    @timed('redis')
+    async def enqueue(self, guid, metadata):
+        """Caches a new GUID and queues it for the database, in one round trip."""
+        await self.cache.set(guid, metadata, extra=[('hset', self.PENDING, guid, codec.dumps(metadata)),
+                                                    ('xadd', self.STREAM, {'guid': guid})])
+        WRITES_QUEUED.inc()
+
+    @timed('redis')
+    async def pending(self, guid):
+        """Returns the metadata of a GUID that is queued but not in the database yet, or None."""
+        payload = await self.cache.run(self.client.hget, self.PENDING, guid)
+        return codec.loads(payload) if payload is not None else None
+
+    @timed('redis')
+    async def pending_many(self, guids):
+        """Returns the metadata of the given GUIDs that are queued but not in the database yet, as a dict keyed by GUID."""
+        payloads = await self.cache.run(self.client.hmget, self.PENDING, guids)
+        return {guid: codec.loads(payload) for guid, payload in zip(guids, payloads) if payload is not None}
+
+    async def persist(self, guid):
+        """
+        Writes a GUID to the database now if it is still queued, so that an update finds it.
+        Returns False if the write failed.
+        """
+        metadata = await self.pending(guid)
+        if metadata is None:
+            return True
+        return await self.db.store_guids({guid: metadata})
+
+    @timed('redis')
+    async def discard(self, guid):
+        """
+        Drops a queued GUID that is being deleted, so the flusher does not write it, and returns
+        True if it was queued. A flusher that read the GUID just before it is discarded still
+        inserts it; the 'deleted:' marker, set before the caller deletes the GUID from the
+        database, tells that flusher to delete it again.
+        """
+        queued = await self.cache.run(self.client.hdel, self.PENDING, guid)
+        if queued:
+            await self.cache.run(self.client.set, self.DELETED_PREFIX + guid, 1, ex=self.DELETED_TTL)
+        return bool(queued)
+
+    async def stop(self, timeout=10):
+        """
+        Stops flushing once everything queued so far is written, waiting at most `timeout` seconds.
+        Whatever is left stays in the stream for the other workers or the next start.
+        """
+        if self.task is None:
+            return
+        self.stopping = True
+        try:
+            await asyncio.wait_for(self.task, timeout)
+        except asyncio.TimeoutError:
+            app_log.warning("Write-behind flusher stopped with creates still queued")
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        self.stopping = False
+
+    async def run(self):
+        """
+        Flushes batches until stopped, claiming the entries of stopped flushers every `claim_idle` seconds.
+        The consumer group is created first, retried like a flush while Redis cannot be reached.
+        """
+        group = False
+        next_claim = next_report = 0
+        while True:
+            try:
+                if not group:
+                    await self.cache.run(self._create_group, deadline=0)
+                    group = True
+                if time.monotonic() >= next_claim:
+                    if await self.cache.run(self._claim, deadline=0):
+                        self.backlog = True
+                    next_claim = time.monotonic() + self.claim_idle
+                entries = await self.collect()
+                if entries:
+                    if not await self.flush(entries):
+                        self.backlog = True
+                        if self.stopping:
+                            return
+                        await asyncio.sleep(self.retry_delay)
+                if entries or time.monotonic() >= next_report:
+                    await self.report()
+                    next_report = time.monotonic() + 1
+                if not entries and self.stopping:
+                    return
+            except Exception as e:
+                app_log.error("Write-behind flush failed: %s", e)
+                self.backlog = True
+                if self.stopping:
+                    return
+                await asyncio.sleep(self.retry_delay)
+
+    async def collect(self):
+        """
+        Returns the next batch of (entry id, GUID) pairs to flush: the entries delivered to this
+        consumer earlier and not flushed, if any, or else new ones. It waits up to `interval` seconds
+        for a first entry, then until the batch is full or `interval` seconds have passed.
+        """
+        if self.backlog:
+            entries = await self.cache.run(self._read, '0', self.batch_size, None, deadline=0)
+            if entries:
+                return entries
+            self.backlog = False
+
+        entries = []
+        deadline = None
+        while len(entries) < self.batch_size:
+            if self.stopping:
+                block = None  # drain what is there without waiting for more
+            elif deadline is None:
+                block = int(self.interval * 1000) or 1
+            else:
+                block = int((deadline - time.monotonic()) * 1000)
+                if block <= 0:
+                    break
+            read = await self.cache.run(self._read, '>', self.batch_size - len(entries), block, deadline=0)
+            if not read:
+                break
+            entries.extend(read)
+            if deadline is None:
+                deadline = time.monotonic() + self.interval
+        return entries
+
+    async def flush(self, entries):
+        """
+        Writes a batch of queued GUIDs to the database with one insert_many, then acknowledges them.
+        GUIDs deleted in the meantime are skipped. Returns False if the insert failed; the entries
+        then stay pending and are read again.
+        """
+        guids = [guid for _, guid in entries if guid is not None]
+        payloads = await self.cache.run(self.client.hmget, self.PENDING, guids) if guids else []
+        documents = {guid: codec.loads(payload) for guid, payload in zip(guids, payloads) if payload is not None}
+        if documents and not await self.db.store_guids(documents):
+            return False
+
+        deleted = await self.cache.run(self._acknowledge, [entry_id for entry_id, _ in entries], list(documents))
+        if deleted:
+            await self.db.delete_guids(deleted)
+        WRITES_FLUSHED.inc(amount=len(documents))
+        return True
+
+    async def report(self):
+        """Updates the backlog and lag gauges from the stream."""
+        backlog, oldest = await self.cache.run(self._backlog)
+        WRITE_BACKLOG.set(backlog)
+        WRITE_LAG.set(max(0, time.time() - oldest) if oldest is not None else 0)
+
+    def _create_group(self):
+        """Creates the stream and its consumer group unless they exist. Runs on the executor."""
+        try:
+            self.client.xgroup_create(self.STREAM, self.GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def _read(self, position, count, block):
+        """
+        Reads entries for this consumer: new ones for position '>', else its own pending ones.
+        Returns (entry id, GUID) pairs; the GUID is None for an entry deleted from the stream.
+        """
+        response = self.client.xreadgroup(self.GROUP, self.consumer, {self.STREAM: position},
+                                          count=count, block=block)
+        return [(entry_id, fields[b'guid'].decode() if fields else None)
+                for _, entries in response or () for entry_id, fields in entries]
+
+    def _claim(self):
+        """Takes over the entries other consumers left unacknowledged for `claim_idle` seconds. Runs on the executor."""
+        idle = int(self.claim_idle * 1000)
+        claimed = 0
+        start = '-'
+        while True:
+            page = self.client.xpending_range(self.STREAM, self.GROUP, start, '+', self.batch_size)
+            stale = [entry['message_id'] for entry in page
+                     if entry['consumer'].decode() != self.consumer and entry['time_since_delivered'] >= idle]
+            if stale:
+                claimed += len(self.client.xclaim(self.STREAM, self.GROUP, self.consumer, idle, stale))
+            if len(page) < self.batch_size:
+                return claimed
+            ms, _, seq = page[-1]['message_id'].decode().partition('-')
+            start = f"{ms}-{int(seq) + 1}"
+
+    def _acknowledge(self, entry_ids, guids):
+        """
+        Removes flushed GUIDs from the pending hash and their entries from the stream, in one round
+        trip, and returns the GUIDs discarded while they were being written. Runs on the executor.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for guid in guids:
+            pipe.delete(self.DELETED_PREFIX + guid)
+        if guids:
+            pipe.hdel(self.PENDING, *guids)
+            if self.cache.negative_ttl:
+                pipe.delete(*[key for guid in guids for key in self.cache.tombstone_keys(guid)])
+        pipe.xack(self.STREAM, self.GROUP, *entry_ids)
+        pipe.xdel(self.STREAM, *entry_ids)
+        results = pipe.execute()
+        return [guid for guid, discarded in zip(guids, results) if discarded]
+
+    def _backlog(self):
+        """Returns the stream length and the time its oldest entry was added, or None. Runs on the executor."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xlen(self.STREAM)
+        pipe.xrange(self.STREAM, count=1)
+        length, first = pipe.execute()
+        oldest = int(first[0][0].decode().partition('-')[0]) / 1000 if first else None
+        return length, oldest
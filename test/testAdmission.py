@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+import redis
+from unittest.mock import patch
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.admission import Admission, RateLimiter
+from src.database import Database
+from src.cache import Cache
+from src import metrics
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestAdmission(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.redis = FakeRedis()
+        self.cache = Cache(client=self.redis)
+        self.limiter = RateLimiter(self.cache, rate=1, burst=5, lease=2)
+        self.admission = Admission(max_in_flight=10, low_share=0.5)
+        self.app = make_app(db=self.db, cache=self.cache, admission=self.admission, admin_token='test-token')
+        return self.app
+
+    def fetch_json(self, path, method='GET', body=None, **kwargs):
+        return self.http_client.fetch(self.get_url(path), method=method, raise_error=False,
+                                      body=json.dumps(body) if body is not None else None, **kwargs)
+
+    def test_priorities(self):
+        """Test case for the in-flight cap: low priority requests get only their share of it, critical ones are never shed."""
+        self.assertTrue(self.admission.admit(4, 'low'))
+        self.assertFalse(self.admission.admit(5, 'low'))
+        self.assertTrue(self.admission.admit(9, 'high'))
+        self.assertFalse(self.admission.admit(10, 'high'))
+        self.assertTrue(self.admission.admit(1000, 'critical'))
+        self.assertTrue(Admission().admit(1000, 'low'))
+
+    @gen_test
+    async def test_writes_are_shed_before_reads(self):
+        """
+        Test case for a write storm: with half of the slots taken, writes get a fast 503 with Retry-After
+        while reads and /metrics are still served, and the rejection is counted.
+        """
+        guid = "%032X" % 1
+        self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': int(time.time()) + 60}
+        rejected = metrics.REJECTED.get('overload', 'low')
+        self.app.settings['tracker'].in_flight = 5
+
+        response = await self.fetch_json('/guid', 'POST', {'user': 'test_user'})
+        self.assertEqual(response.code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(self.db.guids.documents.keys(), {guid})
+        response = await self.fetch_json(f'/guid/{guid}')
+        self.assertEqual(response.code, 200)
+        response = await self.fetch_json('/metrics')
+        self.assertEqual(response.code, 200)
+
+        self.assertEqual(metrics.REJECTED.get('overload', 'low') - rejected, 1)
+        self.assertEqual(self.app.settings['tracker'].in_flight, 5)
+
+    @gen_test
+    async def test_import_is_shed(self):
+        """Test case for a streamed import over the in-flight cap: it gets a 503 like the other writes, and nothing is imported."""
+        self.app.settings['tracker'].in_flight = 5
+        body = json.dumps({'guid': "%032X" % 1, 'user': 'test_user'}) + "\n"
+        response = await self.http_client.fetch(self.get_url('/guid/_import'), method='POST', body=body,
+                                                 headers={'Authorization': 'Bearer test-token'}, raise_error=False)
+        self.assertEqual(response.code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(self.db.guids.documents, {})
+        self.assertEqual(self.app.settings['tracker'].in_flight, 5)
+
+    @gen_test
+    async def test_rate_limit_per_client(self):
+        """
+        Test case for the token bucket: a client gets its burst and then 429s, another API key has its own
+        bucket, and the tokens are leased from Redis a few at a time instead of once per request.
+        """
+        self.admission.limiter = self.limiter
+        codes = []
+        for _ in range(8):
+            response = await self.fetch_json('/guid/' + "%032X" % 1, headers={'X-API-Key': 'alice'})
+            codes.append(response.code)
+        self.assertEqual(codes, [404] * 5 + [429] * 3)
+
+        response = await self.fetch_json('/guid/' + "%032X" % 1, headers={'X-API-Key': 'bob'})
+        self.assertEqual(response.code, 404)
+        self.assertEqual(self.limiter.round_trips, 5)  # alice: 2 + 2 + 1 tokens, then one refusal; bob: 1
+        response = await self.fetch_json('/metrics', headers={'X-API-Key': 'alice'})
+        self.assertEqual(response.code, 200)
+
+    @gen_test
+    async def test_rate_limiter_leases_are_shared_and_fail_open(self):
+        """
+        Test case for the lease: concurrent requests of one client share each lease request, and a
+        Redis failure lets requests through.
+        """
+        results = await asyncio.gather(*[self.limiter.allow('client') for _ in range(3)])
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(self.limiter.round_trips, 2)
+
+        with patch.object(self.limiter, 'script', side_effect=ConnectionError('down')):
+            self.assertTrue(await self.limiter.allow('other'))
+
+    @gen_test
+    async def test_rate_limiter_uses_the_cache_breaker(self):
+        """
+        Test case for a Redis outage: the lease requests go through the Cache's circuit breaker, and once it
+        is open requests are let through without waiting on Redis.
+        """
+        self.cache.breaker.failures = 1
+        with patch.object(self.limiter, 'script', side_effect=redis.ConnectionError('down')) as script:
+            self.assertTrue(await self.limiter.allow('first'))
+            self.assertFalse(self.cache.available())
+            self.assertTrue(await self.limiter.allow('second'))
+        self.assertEqual(script.call_count, 1)
+
@@ -0,0 +1,162 @@
+import threading
+import time
+import unittest
+from tornado.testing import AsyncTestCase, gen_test
+
+from src.database import Database
+from src.cache import Cache, LocalCache, MISSING
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestBackends(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis())
+        self.guid = "FA3A9A3A3A3A3A3A3A3A3A3A3A3A3A3A"
+        self.metadata = {'guid': self.guid, 'user': 'test_user', 'expire': int(time.time()) + 3600}
+
+    @gen_test
+    async def test_database_lifecycle(self):
+        """
+        Test case for the Database coroutines against the in-memory Mongo stand-in.
+        A created GUID can be fetched, updated and deleted, and is gone afterwards.
+        """
+        self.assertTrue(await self.db.create_guid(self.guid, self.metadata))
+        self.assertEqual(await self.db.get_guid(self.guid), self.metadata)
+
+        updated = await self.db.update_guid(self.guid, {'user': 'updated_user'})
+        self.assertEqual(updated, dict(self.metadata, user='updated_user'))
+        self.assertEqual((await self.db.get_guid(self.guid))['user'], 'updated_user')
+        self.assertIsNone(await self.db.update_guid("%032X" % 1, {'user': 'updated_user'}))
+
+        self.assertTrue(await self.db.delete_guid(self.guid))
+        self.assertIsNone(await self.db.get_guid(self.guid))
+
+    @gen_test
+    async def test_cache_round_trip(self):
+        """
+        Test case for the Cache coroutines against the in-memory Redis stand-in.
+        """
+        self.assertIsNone(await self.cache.get(self.guid))
+        await self.cache.set(self.guid, self.metadata)
+        self.assertEqual(await self.cache.get(self.guid), self.metadata)
+        await self.cache.delete(self.guid)
+        self.assertIsNone(await self.cache.get(self.guid))
+
+    @gen_test
+    async def test_negative_caching(self):
+        """
+        Test case for "known missing" tombstones: they are stored apart from real values,
+        answered with MISSING and counted, and cleared when the GUID is written.
+        """
+        cache = Cache(client=FakeRedis(), negative_ttl=30)
+        await cache.set_missing(self.guid)
+        self.assertIsNone(cache.client.get(self.guid))
+        self.assertIs(await cache.get(self.guid), MISSING)
+        self.assertIs(await cache.get(self.guid), MISSING)
+        self.assertEqual(cache.stats()['negative_hits'], 2)
+
+        await cache.set(self.guid, self.metadata)
+        self.assertEqual(await cache.get(self.guid), self.metadata)
+        self.assertEqual(cache.client.exists(Cache.MISSING_PREFIX + self.guid), 0)
+
+        # With negative caching disabled nothing is recorded.
+        await self.cache.set_missing(self.guid)
+        self.assertIsNone(await self.cache.get(self.guid))
+
+    @gen_test
+    async def test_write_policies(self):
+        """
+        Test case for the cache write policies applied after a database write: write-through
+        stores the new value, invalidate-only drops the cached value and the tombstone,
+        each in a single Redis round trip.
+        """
+        cache = Cache(client=FakeRedis(), negative_ttl=30)
+        await cache.set_missing(self.guid)
+        calls = cache.client.calls
+        await cache.stored(self.guid, self.metadata, invalidate=True)
+        self.assertEqual(cache.client.calls, calls + 1)
+        self.assertEqual(await cache.get(self.guid), self.metadata)
+
+        cache = Cache(client=FakeRedis(), negative_ttl=30, write_policy='invalidate')
+        await cache.set(self.guid, self.metadata)
+        await cache.set_missing(self.guid)
+        calls = cache.client.calls
+        await cache.stored(self.guid, dict(self.metadata, user='updated_user'), invalidate=True)
+        self.assertEqual(cache.client.calls, calls + 1)
+        self.assertIsNone(await cache.get(self.guid))
+
+        with self.assertRaises(ValueError):
+            Cache(client=FakeRedis(), write_policy='write-around')
+
+    @gen_test
+    async def test_driver_calls_leave_the_ioloop_thread(self):
+        """
+        Test case checking that blocking driver calls are executed on a worker thread,
+        so the IOLoop stays free while a backend call is in flight.
+        """
+        threads = []
+        self.db.guids.find_one = lambda query: threads.append(threading.current_thread()) or None
+        await self.db.get_guid(self.guid)
+        self.assertNotEqual(threads, [])
+        self.assertIsNot(threads[0], threading.current_thread())
+
+class TestLocalCache(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        self.guid = "FA3A9A3A3A3A3A3A3A3A3A3A3A3A3A3A"
+        self.metadata = {'guid': self.guid, 'user': 'test_user', 'expire': int(time.time()) + 3600}
+
+    def test_lru_eviction_and_counters(self):
+        """
+        Test case for the LocalCache bounds: the least recently used entry is evicted
+        once max_entries is exceeded, and the hit/miss/eviction counters follow.
+        """
+        local = LocalCache(max_entries=2)
+        for guid in ('A', 'B'):
+            local.set(guid, dict(self.metadata, guid=guid), 50)
+        local.get('A')
+        local.set('C', dict(self.metadata, guid='C'), 50)
+
+        self.assertIsNone(local.get('B'))
+        self.assertEqual(local.get('A')['guid'], 'A')
+        self.assertEqual(local.stats(), {'hits': 2, 'misses': 1, 'evictions': 1, 'entries': 2, 'bytes': 100})
+
+    def test_byte_budget_and_expire(self):
+        """
+        Test case checking that the byte budget is enforced and that an entry never
+        outlives the document's own expire timestamp.
+        """
+        local = LocalCache(max_bytes=100)
+        local.set('A', self.metadata, 60)
+        local.set('B', self.metadata, 60)
+        self.assertIsNone(local.get('A'))
+        self.assertEqual(local.stats()['bytes'], 60)
+
+        local.set('C', dict(self.metadata, expire=int(time.time())), 10)
+        self.assertIsNone(local.get('C'))
+
+    @gen_test
+    async def test_invalidation_reaches_other_replicas(self):
+        """
+        Test case for the pub/sub invalidation path: a patch or delete on one replica
+        evicts the local copy held by another replica sharing the same Redis.
+        """
+        first = Cache(client=self.redis, local=LocalCache())
+        second = Cache(client=self.redis, local=LocalCache())
+        first.start_listener()
+        second.start_listener()
+
+        await first.set(self.guid, self.metadata)
+        self.assertEqual(await second.get(self.guid), self.metadata)
+
+        updated = dict(self.metadata, user='updated_user')
+        await first.set(self.guid, updated, invalidate=True)
+        self.assertEqual(await second.get(self.guid), updated)
+        self.assertEqual(await first.get(self.guid), updated)
+
+        await first.delete(self.guid)
+        self.assertIsNone(await second.get(self.guid))
+        first.stop_listener()
+        second.stop_listener()
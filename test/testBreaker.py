@@ -0,0 +1,154 @@
+import json
+import time
+import redis
+from pymongo.errors import ConnectionFailure
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.breaker import BackendUnavailable, CircuitBreaker
+from src.database import Database
+from src.cache import Cache
+from src.writeBehind import WriteBehind
+from src import metrics
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestBreaker(AsyncHTTPTestCase):
+    def get_app(self):
+        self.mongo = FakeMongoClient()
+        self.redis = FakeRedis()
+        self.db = Database(client=self.mongo, breaker=CircuitBreaker(
+            'mongo', errors=(ConnectionFailure,), deadline=0.1, failures=2, reset_timeout=60))
+        self.cache = Cache(client=self.redis, negative_ttl=30, breaker=CircuitBreaker(
+            'redis', errors=(redis.ConnectionError, redis.TimeoutError), deadline=0.05, failures=2, reset_timeout=60))
+        self.writes = WriteBehind(self.db, self.cache)
+        return make_app(db=self.db, cache=self.cache, writes=self.writes)
+
+    def fetch_json(self, path, method='GET', body=None):
+        return self.http_client.fetch(self.get_url(path), method=method, raise_error=False,
+                                      body=json.dumps(body) if body is not None else None,
+                                      allow_nonstandard_methods=True)
+
+    def store(self, number):
+        guid = "%032X" % number
+        self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': int(time.time()) + 60}
+        return guid
+
+    @gen_test
+    async def test_breaker_opens_and_recovers(self):
+        """
+        Test case for the breaker: consecutive connection errors open it, calls then fail fast without
+        reaching the backend, and after the reset timeout a successful probe closes it.
+        """
+        breaker = CircuitBreaker('probe', errors=(ConnectionError,), failures=2, reset_timeout=0.05)
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise ConnectionError('down')
+
+        for _ in range(2):
+            with self.assertRaises(BackendUnavailable):
+                await breaker.call(None, fail)
+        fast_fails = metrics.FAST_FAILS.get('probe')
+        with self.assertRaises(BackendUnavailable):
+            await breaker.call(None, fail)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(metrics.FAST_FAILS.get('probe') - fast_fails, 1)
+        self.assertEqual(metrics.BREAKER_STATE.get('probe'), 2)
+        self.assertFalse(breaker.available())
+
+        time.sleep(0.05)
+        self.assertEqual(await breaker.call(None, lambda: 'up'), 'up')
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(metrics.BREAKER_STATE.get('probe'), 0)
+
+    @gen_test
+    async def test_redis_hang_reads_bypass_cache(self):
+        """
+        Test case for a hanging Redis: GETs miss their deadline on the cache and are served from MongoDB,
+        then the breaker opens and they skip Redis altogether; changes are refused with a 503.
+        """
+        guid = self.store(1)
+        self.redis.latency = 0.5
+        timeouts = metrics.BACKEND_TIMEOUTS.get('redis')
+        fast_fails = metrics.FAST_FAILS.get('redis')
+
+        for _ in range(3):
+            response = await self.fetch_json(f'/guid/{guid}')
+            self.assertEqual(response.code, 200)
+            self.assertEqual(json.loads(response.body)['guid'], guid)
+        self.assertEqual(metrics.BACKEND_TIMEOUTS.get('redis') - timeouts, 2)
+        self.assertGreater(metrics.FAST_FAILS.get('redis') - fast_fails, 0)
+        self.assertEqual(metrics.BREAKER_STATE.get('redis'), 2)
+
+        started = time.perf_counter()
+        response = await self.fetch_json(f'/guid/{guid}')
+        self.assertEqual(response.code, 200)
+        self.assertLess(time.perf_counter() - started, 0.05)
+
+        response = await self.fetch_json(f'/guid/{guid}', 'PATCH', {'user': 'other_user'})
+        self.assertEqual(response.code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(self.db.guids.documents[guid]['user'], 'test_user')
+
+    @gen_test
+    async def test_redis_down_creates_go_to_mongo(self):
+        """Test case for Redis refusing connections: write-behind creates are inserted into MongoDB right away."""
+        self.redis.down = True
+        response = await self.fetch_json('/guid', 'POST', {'user': 'test_user'})
+        self.assertEqual(response.code, 201)
+        guid = json.loads(response.body)['guid']
+        self.assertIn(guid, self.db.guids.documents)
+        self.assertEqual(self.redis.hashes, {})
+
+        response = await self.fetch_json(f'/guid/{guid}')
+        self.assertEqual(response.code, 200)
+
+    @gen_test
+    async def test_redis_down_batches_use_mongo(self):
+        """
+        Test case for the batch endpoints with Redis refusing connections: batch creates are inserted into
+        MongoDB and answered 201, batch reads are served from MongoDB, and batch deletes get a 503.
+        """
+        stored = self.store(1)
+        self.redis.down = True
+        response = await self.fetch_json('/guid/_bulk', 'POST', {'items': [{'user': 'a'}, {'user': 'b'}]})
+        self.assertEqual(response.code, 200)
+        created = json.loads(response.body)['items']
+        self.assertEqual([item['status'] for item in created], [201, 201])
+        self.assertEqual(len(self.db.guids.documents), 3)
+
+        response = await self.fetch_json('/guid/_mget', 'POST', {'guids': [stored, created[0]['guid']]})
+        self.assertEqual(response.code, 200)
+        self.assertEqual([item['status'] for item in json.loads(response.body)['items']], [200, 200])
+
+        response = await self.fetch_json('/guid/_bulk', 'DELETE', {'guids': [stored]})
+        self.assertEqual(response.code, 503)
+        self.assertIn(stored, self.db.guids.documents)
+
+    @gen_test
+    async def test_mongo_down_serves_cached_reads(self):
+        """
+        Test case for MongoDB being down: cached GUIDs are still served, other reads and writes get a
+        503, and an unreachable GUID is not recorded as missing.
+        """
+        cached, uncached = self.store(1), self.store(2)
+        response = await self.fetch_json(f'/guid/{cached}')
+        self.assertEqual(response.code, 200)
+        self.db.guids.down = True
+
+        response = await self.fetch_json(f'/guid/{cached}')
+        self.assertEqual(response.code, 200)
+        response = await self.fetch_json(f'/guid/{uncached}')
+        self.assertEqual(response.code, 503)
+        self.assertEqual(json.loads(response.body), {'error': 'Service Unavailable'})
+        self.assertIsNone(self.redis._get(Cache.MISSING_PREFIX + uncached))
+        response = await self.fetch_json(f'/guid/{uncached}', 'POST', {'user': 'test_user'})
+        self.assertEqual(response.code, 503)
+
+        self.db.guids.down = False
+        response = await self.fetch_json(f'/guid/{uncached}')
+        self.assertEqual(response.code, 503)  # the breaker stays open until its reset timeout
+        self.db.breaker.reset_timeout = 0
+        response = await self.fetch_json(f'/guid/{uncached}')
+        self.assertEqual(response.code, 200)
@@ -0,0 +1,102 @@
+import json
+import time
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestBulkHandler(AsyncHTTPTestCase):
+    GUIDS = ["%032X" % i for i in range(1, 4)]
+
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis())
+        self.expire = int(time.time()) + 3600
+        return make_app(db=self.db, cache=self.cache)
+
+    def fetch_json(self, path, method, body):
+        return self.http_client.fetch(self.get_url(path), method=method, body=json.dumps(body),
+                                      allow_nonstandard_methods=True, raise_error=False)
+
+    @gen_test
+    def test_bulk_create(self):
+        """
+        Test case for POST /guid/_bulk.
+        Valid items are created with a single insert_many and cached with a single pipeline,
+        while invalid, repeated and already existing GUIDs get their own status code.
+        """
+        self.db.guids.documents[self.GUIDS[2]] = {'_id': self.GUIDS[2], 'guid': self.GUIDS[2],
+                                                  'user': 'existing', 'expire': self.expire}
+        items = [
+            {'guid': self.GUIDS[0], 'user': 'test_user', 'expire': self.expire},
+            {'user': 'test_user'},
+            {'guid': self.GUIDS[0], 'user': 'test_user'},
+            {'user': 123},
+            {'guid': self.GUIDS[2], 'user': 'test_user'},
+        ]
+        response = yield self.fetch_json("/guid/_bulk", "POST", {'items': items})
+        self.assertEqual(response.code, 200)
+        results = json.loads(response.body)['items']
+
+        self.assertEqual([result['status'] for result in results], [201, 201, 400, 400, 500])
+        self.assertEqual(results[0]['guid'], self.GUIDS[0])
+        self.assertIn('guid', results[2]['errors'])
+        self.assertEqual(results[3]['errors']['user'], 'User must be a string.')
+        self.assertEqual(self.db.guids.calls, 1)
+        self.assertEqual(self.cache.client.calls, 1)
+        self.assertEqual((yield self.cache.get(results[1]['guid']))['user'], 'test_user')
+
+    @gen_test
+    def test_bulk_get(self):
+        """
+        Test case for POST /guid/_mget.
+        Cached GUIDs come from one MGET, the rest from one database query, and the
+        results keep the request order with a per-item status.
+        """
+        for guid in self.GUIDS[:2]:
+            self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': self.expire}
+        yield self.cache.set(self.GUIDS[0], {'guid': self.GUIDS[0], 'user': 'cached_user', 'expire': self.expire})
+        self.cache.client.calls = 0
+
+        response = yield self.fetch_json("/guid/_mget", "POST", {'guids': self.GUIDS + ['bad']})
+        results = json.loads(response.body)['items']
+
+        self.assertEqual([result['status'] for result in results], [200, 200, 404, 400])
+        self.assertEqual(results[0]['user'], 'cached_user')
+        self.assertEqual(results[1]['user'], 'test_user')
+        self.assertEqual(self.db.guids.calls, 1)
+        self.assertEqual(self.cache.client.calls, 2)  # MGET, then one pipeline to cache the misses
+
+    @gen_test
+    def test_bulk_delete(self):
+        """
+        Test case for DELETE /guid/_bulk: existing GUIDs are removed from the database and
+        the cache, unknown ones are reported as 404.
+        """
+        guid = self.GUIDS[0]
+        self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': self.expire}
+        yield self.cache.set(guid, {'guid': guid, 'user': 'test_user', 'expire': self.expire})
+
+        response = yield self.fetch_json("/guid/_bulk", "DELETE", {'guids': self.GUIDS[:2]})
+        results = json.loads(response.body)['items']
+
+        self.assertEqual([result['status'] for result in results], [204, 404])
+        self.assertEqual(self.db.guids.documents, {})
+        self.assertIsNone((yield self.cache.get(guid)))
+
+    @gen_test
+    def test_bulk_invalid_body(self):
+        """
+        Test case for batch requests with a missing or oversized list, and for methods
+        the batch endpoints do not support.
+        """
+        response = yield self.fetch_json("/guid/_bulk", "POST", {'items': []})
+        self.assertEqual(response.code, 400)
+
+        response = yield self.fetch_json("/guid/_mget", "POST", {'guids': ['A'] * 1001})
+        self.assertEqual(response.code, 400)
+
+        response = yield self.http_client.fetch(self.get_url("/guid/_bulk"), raise_error=False)
+        self.assertEqual(response.code, 405)
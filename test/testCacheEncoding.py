@@ -0,0 +1,75 @@
+import json
+import time
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src import cacheEncoding
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache, LocalCache, MISSING
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestCacheEncoding(AsyncHTTPTestCase):
+    GUID = "%032X" % 7
+
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.redis = FakeRedis()
+        self.cache = Cache(client=self.redis, encoding='compact', negative_ttl=30)
+        self.metadata = {'guid': self.GUID, 'user': 'test_user', 'expire': int(time.time()) + 3600}
+        return make_app(db=self.db, cache=self.cache)
+
+    @gen_test
+    async def test_compact_keys_and_values(self):
+        """
+        Test case for the compact encoding: the GUID is stored under its 16 bytes with a packed value,
+        reads decode it, including GETs, and metadata with other fields is stored as JSON.
+        """
+        await self.cache.set(self.GUID, self.metadata)
+        self.assertEqual(list(self.redis.store), [bytes.fromhex(self.GUID)])
+        payload = self.redis.get(bytes.fromhex(self.GUID))
+        self.assertEqual(len(payload), 1 + 4 + len('test_user'))
+        self.assertEqual(await self.cache.get(self.GUID), self.metadata)
+        self.assertEqual(await self.cache.get(self.GUID, raw=True), self.metadata)
+        self.assertEqual(await self.cache.get_many([self.GUID]), {self.GUID: self.metadata})
+
+        response = await self.http_client.fetch(self.get_url(f"/guid/{self.GUID}"))
+        self.assertEqual(json.loads(response.body), self.metadata)
+
+        extended = dict(self.metadata, note='kept')
+        await self.cache.set(self.GUID, extended)
+        self.assertTrue(cacheEncoding.is_json(self.redis.get(bytes.fromhex(self.GUID))))
+        self.assertEqual(await self.cache.get(self.GUID), extended)
+
+        await self.cache.set_missing("%032X" % 8)
+        self.assertEqual(await self.cache.get("%032X" % 8), MISSING)
+        self.assertIn(b'missing:' + bytes.fromhex("%032X" % 8), self.redis.store)
+
+    @gen_test
+    async def test_local_tier_keeps_json(self):
+        """Test case for the local tier in compact mode: it keeps JSON, so raw reads it serves are JSON."""
+        cache = Cache(client=FakeRedis(), local=LocalCache(), encoding='compact')
+        await cache.set(self.GUID, self.metadata)
+        self.assertEqual(json.loads(await cache.get(self.GUID, raw=True)), self.metadata)
+
+    @gen_test
+    async def test_dual_read_migration(self):
+        """
+        Test case for switching encodings: with dual_read, GUIDs cached as JSON are still hits, in one
+        round trip, and writing or deleting a GUID also removes its key in the other encoding.
+        """
+        legacy = Cache(client=self.redis)
+        migrating = Cache(client=self.redis, encoding='compact', dual_read=True)
+        other = "%032X" % 9
+        await legacy.set(self.GUID, self.metadata)
+        await legacy.set(other, dict(self.metadata, guid=other))
+
+        calls = self.redis.calls
+        self.assertEqual(await migrating.get(self.GUID), self.metadata)
+        self.assertEqual(self.redis.calls - calls, 1)
+        self.assertEqual(set(await migrating.get_many([self.GUID, other])), {self.GUID, other})
+
+        await migrating.set(self.GUID, dict(self.metadata, user='new_user'))
+        self.assertEqual(set(self.redis.store), {bytes.fromhex(self.GUID), other})
+        self.assertIsNone(await legacy.get(self.GUID))
+        await migrating.delete(other)
+        self.assertEqual(set(self.redis.store), {bytes.fromhex(self.GUID)})
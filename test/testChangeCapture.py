@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+from tornado.testing import AsyncTestCase, gen_test
+
+from src.database import Database
+from src.cache import Cache
+from src.changeCapture import ChangeCapture, RedisStreamSink
+from src import metrics
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestChangeCapture(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis(), negative_ttl=30)
+        self.expire = int(time.time()) + 3600
+
+    def document(self, i, user='test_user'):
+        guid = "%032X" % i
+        return {'_id': guid, 'guid': guid, 'user': user, 'expire': self.expire}
+
+    async def start(self, capture):
+        """Starts change capture and waits until its change stream is open."""
+        capture.start()
+        while self.db.guids.changes is None:
+            await asyncio.sleep(0.001)
+
+    async def wait_for(self, condition, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            await asyncio.sleep(0.005)
+
+    @gen_test
+    async def test_direct_writes_invalidate_cache(self):
+        """
+        Test case for invalidation: writes made to MongoDB behind the API's back evict the changed
+        GUIDs from the cache, their missing records included, and are published to the Redis stream.
+        """
+        for i in (1, 2):
+            document = self.document(i)
+            self.db.guids.documents[document['_id']] = document
+            await self.cache.set(document['_id'], {'guid': document['_id'], 'user': 'test_user', 'expire': self.expire})
+        await self.cache.set_missing("%032X" % 3)
+        self.assertTrue(self.cache.client.exists(*self.cache.tombstone_keys("%032X" % 3)))
+        untouched = "%032X" % 1
+        updates, inserts = metrics.CHANGE_EVENTS.get('update'), metrics.CHANGE_EVENTS.get('insert')
+
+        capture = ChangeCapture(self.db, self.cache, sink=RedisStreamSink(self.cache), max_await=0.01)
+        await self.start(capture)
+        self.db.guids.update_one({'_id': "%032X" % 2}, {'$set': {'user': 'fixed by hand'}})
+        self.db.guids.insert_one(self.document(3))
+        await self.wait_for(lambda: metrics.CHANGE_EVENTS.get('insert') == inserts + 1)
+        await capture.stop()
+
+        self.assertIsNone(await self.cache.get("%032X" % 2))
+        self.assertFalse(self.cache.client.exists(*self.cache.tombstone_keys("%032X" % 3)))
+        self.assertEqual((await self.cache.get(untouched))['user'], 'test_user')
+        self.assertEqual(metrics.CHANGE_EVENTS.get('update'), updates + 1)
+
+        entries = [fields for _, fields in self.cache.client.xrange(RedisStreamSink.STREAM)]
+        self.assertEqual([entry[b'op'] for entry in entries], [b'update', b'insert'])
+        self.assertEqual(json.loads(entries[0][b'document']),
+                         {'guid': "%032X" % 2, 'user': 'fixed by hand', 'expire': self.expire})
+        self.assertLess(metrics.CHANGE_LAG.get(), 2)
+
+    @gen_test
+    async def test_resumes_after_restart(self):
+        """
+        Test case for resume tokens: changes made while change capture is stopped are applied when it
+        starts again, from the token it saved in Redis, and changes it had applied are not replayed.
+        """
+        capture = ChangeCapture(self.db, self.cache, sink=RedisStreamSink(self.cache), max_await=0.01)
+        await self.start(capture)
+        self.db.guids.insert_one(self.document(1))
+        await self.wait_for(lambda: self.cache.client.get(ChangeCapture.TOKEN_KEY) is not None)
+        await capture.stop()
+        token = self.cache.client.get(ChangeCapture.TOKEN_KEY)
+
+        await self.cache.set("%032X" % 1, {'guid': "%032X" % 1, 'user': 'test_user', 'expire': self.expire})
+        self.db.guids.delete_one({'_id': "%032X" % 1})
+
+        capture = ChangeCapture(self.db, self.cache, sink=RedisStreamSink(self.cache), max_await=0.01)
+        capture.start()
+        await self.wait_for(lambda: self.cache.client.get(ChangeCapture.TOKEN_KEY) != token)
+        await capture.stop()
+        self.assertIsNone(await self.cache.get("%032X" % 1))
+        entries = [fields for _, fields in self.cache.client.xrange(RedisStreamSink.STREAM)]
+        self.assertEqual([entry[b'op'] for entry in entries], [b'insert', b'delete'])
+        self.assertEqual(entries[1][b'document'], b'')
@@ -0,0 +1,79 @@
+import json
+import time
+import unittest
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src import codec
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache, LocalCache
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestRawReads(AsyncHTTPTestCase):
+    GUID = "%032X" % 7
+
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis())
+        self.metadata = {'guid': self.GUID, 'user': 'test_user', 'expire': int(time.time()) + 3600}
+        return make_app(db=self.db, cache=self.cache)
+
+    @gen_test
+    def test_cache_hit_returns_the_stored_bytes(self):
+        """
+        Test case for the raw read path: a cache hit is answered with the JSON bytes stored in Redis,
+        byte for byte and with a JSON Content-Type, while a miss is encoded from the database document.
+        """
+        self.db.guids.documents[self.GUID] = dict(self.metadata, _id=self.GUID)
+        response = yield self.http_client.fetch(self.get_url(f"/guid/{self.GUID}"))
+        self.assertEqual(json.loads(response.body), self.metadata)
+
+        stored = b'{"guid": "%s", "user": "stored_user", "expire": %d}' % (self.GUID.encode(), self.metadata['expire'])
+        self.cache.client.set(self.GUID, stored, ex=60)
+        response = yield self.http_client.fetch(self.get_url(f"/guid/{self.GUID}"))
+        self.assertEqual(response.body, stored)
+        self.assertEqual(response.headers['Content-Type'], 'application/json; charset=UTF-8')
+
+    @gen_test
+    async def test_local_tier_keeps_the_payload(self):
+        """
+        Test case for raw reads through the local tier: the payload fetched from Redis is kept next to
+        the decoded value, so the next raw read is served from memory with the same bytes.
+        """
+        cache = Cache(client=FakeRedis(), local=LocalCache())
+        await cache.set(self.GUID, self.metadata)
+        payload = cache.client.get(self.GUID)
+        cache.local.delete(self.GUID)
+
+        self.assertEqual(await cache.get(self.GUID, raw=True), payload)
+        calls = cache.client.calls
+        self.assertEqual(await cache.get(self.GUID, raw=True), payload)
+        self.assertEqual(await cache.get(self.GUID), self.metadata)
+        self.assertEqual(cache.client.calls, calls)
+
+
+class TestCodec(unittest.TestCase):
+    def tearDown(self):
+        codec.use('json')
+
+    @unittest.skipUnless(codec.available('orjson'), 'orjson is not installed')
+    def test_switching_codecs(self):
+        """
+        Test case for the pluggable codec: both codecs return bytes from dumps and accept bytes or str
+        in loads, and the orjson one writes compact JSON.
+        """
+        value = {'guid': "%032X" % 7, 'user': 'test_user', 'expire': 1}
+        for name in codec.CODECS:
+            codec.use(name)
+            encoded = codec.dumps(value)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(codec.loads(encoded), value)
+            self.assertEqual(codec.loads(encoded.decode()), value)
+        self.assertNotIn(b': ', encoded)
+        with self.assertRaises(ValueError):
+            codec.loads(b'{not json')
+
+    def test_unknown_codec(self):
+        """Test case checking that selecting an unknown codec fails."""
+        with self.assertRaises(ValueError):
+            codec.use('simplejson')
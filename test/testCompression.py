@@ -0,0 +1,81 @@
+import gzip
+import json
+import time
+import unittest
+from unittest.mock import patch
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src import compression
+from src.app import make_app
+from src.compression import Compression
+from src.config import Config, ConfigError
+from src.database import Database
+from src.cache import Cache
+from src.streamHandler import ExportHandler
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestCompression(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        expire = int(time.time()) + 3600
+        for i in range(50):
+            guid = "%032X" % i
+            self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': expire}
+        return make_app(db=self.db, cache=Cache(client=FakeRedis()), compression=Compression(min_size=1024),
+                        admin_token='test-token')
+
+    async def fetch(self, path, accept_encoding):
+        # decompress_response=False shows the body as sent on the wire.
+        headers = {'Accept-Encoding': accept_encoding, 'Authorization': 'Bearer test-token'}
+        return await self.http_client.fetch(self.get_url(path), headers=headers, decompress_response=False)
+
+    @gen_test
+    async def test_gzip_above_min_size(self):
+        """
+        Test case for negotiated compression: a large response is gzipped for clients that accept it,
+        a response under min_size and clients that do not accept gzip get it as it is.
+        """
+        response = await self.fetch('/guid?user=test_user', 'br;q=0, gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        body = gzip.decompress(response.body)
+        self.assertEqual(len(json.loads(body)['items']), 50)
+        self.assertLess(len(response.body), len(body) / 4)
+
+        response = await self.fetch(f"/guid/{'%032X' % 1}", 'gzip')
+        self.assertNotIn('Content-Encoding', response.headers)
+        response = await self.fetch('/guid?user=test_user', 'identity, gzip;q=0')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(json.loads(response.body)['items']), 50)
+
+    @gen_test
+    async def test_streamed_response(self):
+        """Test case for a streamed response: the export is compressed chunk by chunk into one gzip stream."""
+        with patch.object(ExportHandler, 'BATCH_SIZE', 7):
+            response = await self.fetch('/guid/_export', 'gzip')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(response.body).decode().splitlines()), 50)
+
+    @unittest.skipUnless(compression.available('br'), 'needs the brotli package')
+    @gen_test
+    async def test_brotli_preferred(self):
+        """Test case for brotli: with both encodings enabled, clients that accept br get it."""
+        self._app.transforms = [Compression(('br', 'gzip'))]
+        response = await self.fetch('/guid?user=test_user', 'gzip, deflate, br')
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(len(json.loads(compression.brotli.decompress(response.body))['items']), 50)
+
+    def test_server_settings(self):
+        """
+        Test case for the server bootstrap settings: they reach HTTPServer's keyword arguments, and
+        an encoding that is unknown or needs a missing package is refused at startup.
+        """
+        config = Config(http_idle_connection_timeout=30, http_xheaders='true', compression='gzip')
+        settings = config.server_settings()
+        self.assertEqual(settings['idle_connection_timeout'], 30)
+        self.assertIsNone(settings['body_timeout'])
+        self.assertTrue(settings['xheaders'])
+        self.assertEqual(config.response_compression().encodings, ('gzip',))
+        self.assertIsNone(Config(compression='').response_compression())
+        with self.assertRaisesRegex(ConfigError, 'COMPRESSION'):
+            Config(compression='gzip,zstd')
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+from pymongo import ReadPreference
+
+from src.config import Config, ConfigError
+
+class TestConfig(unittest.TestCase):
+    def test_defaults_match_the_docker_compose_services(self):
+        """
+        Test case for the defaults: without any setting the API talks to the 'db' and 'redis'
+        services, and the executors are as large as the connection pools.
+        """
+        config = Config.load(environ={})
+        self.assertEqual(config.port, 8888)
+        self.assertEqual(config.mongo_uri, 'mongodb://db:27017')
+        self.assertEqual(config.redis_host, 'redis')
+        self.assertEqual(config.mongo_executor()._max_workers, config.mongo_max_pool_size)
+        self.assertEqual(config.redis_executor()._max_workers, config.redis_max_connections)
+
+    def test_environment_overrides_the_file(self):
+        """
+        Test case for the configuration sources: a JSON file given by CONFIG_FILE, with lower-case
+        keys, is read first and the environment variables override it.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'mongo_max_pool_size': 8, 'mongo_read_preference': 'secondaryPreferred',
+                       'redis_retry_on_timeout': True}, f)
+        self.addCleanup(os.unlink, f.name)
+
+        config = Config.load(environ={'CONFIG_FILE': f.name, 'MONGO_MAX_POOL_SIZE': '16', 'PATH': '/bin'})
+        self.assertEqual(config.mongo_max_pool_size, 16)
+        self.assertIs(config.read_preference(), ReadPreference.SECONDARY_PREFERRED)
+        self.assertTrue(config.redis_retry_on_timeout)
+
+    def test_invalid_settings_are_reported_together(self):
+        """
+        Test case for startup validation: every invalid setting is listed in a single ConfigError,
+        including combinations such as sentinel mode without sentinels.
+        """
+        with self.assertRaises(ConfigError) as raised:
+            Config.load(environ={'MONGO_MAX_POOL_SIZE': '0', 'REDIS_RETRY_ON_TIMEOUT': 'maybe',
+                                 'MONGO_READ_PREFERENCE': 'fastest'})
+        message = str(raised.exception)
+        for key in ('MONGO_MAX_POOL_SIZE', 'REDIS_RETRY_ON_TIMEOUT', 'MONGO_READ_PREFERENCE'):
+            self.assertIn(key, message)
+
+        with self.assertRaisesRegex(ConfigError, 'REDIS_SENTINELS'):
+            Config(redis_mode='sentinel')
+        with self.assertRaisesRegex(ConfigError, 'MONGO_URI'):
+            Config(mongo_uri='http://db:27017')
+        with self.assertRaisesRegex(ConfigError, 'unknown setting'):
+            Config(mongo_pool=10)
+        with self.assertRaisesRegex(ConfigError, 'WRITE_BEHIND:'):
+            Config(redis_mode='cluster', redis_cluster_nodes='node:7000', write_behind='true')
+        with self.assertRaisesRegex(ConfigError, 'CDC_KAFKA_SERVERS'):
+            Config(cdc_enabled='true', cdc_sink='kafka')
+        with self.assertRaisesRegex(ConfigError, 'REDIS_SOCKET_TIMEOUT'):
+            Config(redis_socket_timeout=0)
+        self.assertEqual(Config(mongo_socket_timeout=0, mongo_deadline=0).mongo_socket_timeout, 0)
+
+    def test_clients_use_the_configured_pools(self):
+        """
+        Test case for the client factories: pool sizes and timeouts reach pymongo and redis-py,
+        and sentinel mode resolves the master through the configured sentinels. No connection is made.
+        """
+        config = Config(mongo_max_pool_size=4, redis_max_connections=8, redis_socket_timeout=2.5)
+        mongo = config.mongo_client()
+        self.addCleanup(mongo.close)
+        self.assertEqual(mongo.max_pool_size, 4)
+        # One connection more than executor threads, for the invalidation listener.
+        pool = config.redis_client().connection_pool
+        self.assertEqual(pool.max_connections, 9)
+        self.assertEqual(pool.connection_kwargs['socket_timeout'], 2.5)
+
+        sentinel = Config(redis_mode='sentinel', redis_sentinels='s1:26379,s2:26379').redis_client()
+        self.assertEqual(sentinel.connection_pool.service_name, 'mymaster')
+        self.assertEqual([client.connection_pool.connection_kwargs['host']
+                          for client in sentinel.connection_pool.sentinel_manager.sentinels], ['s1', 's2'])
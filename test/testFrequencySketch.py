@@ -0,0 +1,70 @@
+import json
+import time
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from src.frequencySketch import FrequencySketch
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestFrequencySketch(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.redis = FakeRedis()
+        self.cache = Cache(client=self.redis, adaptive_ttl=True, min_ttl=60, max_ttl=300, admission=2)
+        return make_app(db=self.db, cache=self.cache)
+
+    def store(self, number, lifetime=3600):
+        guid = "%032X" % number
+        self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': int(time.time()) + lifetime}
+        return guid
+
+    def test_estimates_and_aging(self):
+        """
+        Test case for the sketch: estimates never undercount, stay exact for a few keys, saturate
+        instead of overflowing, and are halved after `sample` additions.
+        """
+        sketch = FrequencySketch(width=1024, sample=1000)
+        for key in range(100):
+            for _ in range(key % 5):
+                sketch.add(key)
+        self.assertEqual([sketch.estimate(key) for key in range(10)], [0, 1, 2, 3, 4, 0, 1, 2, 3, 4])
+        for _ in range(300):
+            sketch.add('hot')
+        self.assertEqual(sketch.estimate('hot'), FrequencySketch.MAX_COUNT)
+        for _ in range(1000 - sketch.additions):
+            sketch.add('other')
+        self.assertEqual(sketch.estimate('hot'), FrequencySketch.MAX_COUNT // 2)
+        self.assertEqual(sketch.estimate(4), 2)
+
+    @gen_test
+    async def test_adaptive_ttl(self):
+        """
+        Test case for adaptive TTLs: a GUID is cached for min_ttl per recent lookup, between min_ttl
+        and max_ttl, and never past its expire.
+        """
+        cold, warm, hot, expiring = self.store(1), self.store(2), self.store(3), self.store(4, lifetime=100)
+        for guid, lookups in ((warm, 3), (hot, 10), (expiring, 10)):
+            for _ in range(lookups):
+                await self.cache.get(guid)
+        for guid in (cold, warm, hot, expiring):
+            await self.cache.set(guid, self.db.guids.documents[guid])
+        self.assertEqual([self.redis.ttl(guid) for guid in (cold, warm, hot)], [59, 179, 299])
+        self.assertLessEqual(self.redis.ttl(expiring), 100)
+
+    @gen_test
+    async def test_admission(self):
+        """
+        Test case for the admission filter: a GUID read once is served from the database without being
+        cached, and is cached on its second read; creates are always cached.
+        """
+        guid = self.store(5)
+        for calls in (1, 2, 2):
+            response = await self.http_client.fetch(self.get_url(f'/guid/{guid}'))
+            self.assertEqual(response.code, 200)
+            self.assertEqual(self.db.guids.calls, calls)
+            self.assertEqual(guid in self.redis.store, calls == 2)
+
+        response = await self.http_client.fetch(self.get_url('/guid'), method='POST', body='{"user": "test_user"}')
+        self.assertIn(json.loads(response.body)['guid'], self.redis.store)
@@ -0,0 +1,88 @@
+import json
+import time
+import uuid
+from unittest.mock import patch
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src import guidGenerator
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from src.guidGenerator import GUIDGenerator, RandomGUIDs, TimeOrderedGUIDs
+from bench.standins import FakeMongoClient, FakeRedis
+
+class ListedGUIDs(GUIDGenerator):
+    """Hands out the given GUIDs, then random ones."""
+
+    def __init__(self, guids):
+        super().__init__(batch_size=1)
+        self.listed = list(guids)
+
+    def generate(self, count):
+        return [self.listed.pop(0)] if self.listed else RandomGUIDs().generate(count)
+
+
+class TestGuidGenerator(AsyncHTTPTestCase):
+    TAKEN = "%032X" % 1
+
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis())
+        self.db.guids.documents[self.TAKEN] = {'_id': self.TAKEN, 'guid': self.TAKEN, 'user': 'existing',
+                                               'expire': int(time.time()) + 3600}
+        return make_app(db=self.db, cache=self.cache, guid_generator=ListedGUIDs([self.TAKEN] * 3))
+
+    def test_formats(self):
+        """
+        Test case for the generators: both hand out distinct 32-character uppercase hexadecimal GUIDs
+        that are UUIDs of their version, and time-ordered ones sort in creation order across batches
+        and start with the current time in milliseconds.
+        """
+        for generator, version in [(RandomGUIDs(batch_size=100), 4), (TimeOrderedGUIDs(batch_size=100), 7)]:
+            guids = [generator() for _ in range(1000)]
+            self.assertEqual(len(set(guids)), 1000)
+            for guid in guids:
+                self.assertRegex(guid, r'^[A-F0-9]{32}$')
+                self.assertEqual(uuid.UUID(guid).version, version)
+
+        now = time.time_ns() // 1000000
+        generator = TimeOrderedGUIDs(batch_size=7)
+        guids = [generator() for _ in range(1000)]
+        self.assertEqual(guids, sorted(guids))
+        self.assertLessEqual(abs(int(guids[0][:12], 16) - now), 1000)
+
+    def test_time_ordered_survives_clock_changes(self):
+        """
+        Test case for a clock that steps back or a millisecond that runs out of room: time-ordered GUIDs
+        keep increasing, continuing from the last timestamp.
+        """
+        generator = TimeOrderedGUIDs(batch_size=10)
+        clock = [1700000000000 * 1000000]
+        with patch.object(guidGenerator.time, 'time_ns', lambda: clock[0]):
+            first = generator.generate(10)
+            clock[0] -= 5000 * 1000000
+            second = generator.generate(10)
+            generator.counter = 2 ** 74 - 1
+            third = generator.generate(10)
+        guids = first + second + third
+        self.assertEqual(guids, sorted(guids))
+        self.assertEqual(len(set(guids)), 30)
+        self.assertEqual(int(third[0][:12], 16), 1700000000001)
+
+    @gen_test
+    async def test_bulk_create_regenerates_taken_guids(self):
+        """
+        Test case for collision-safe bulk creation: generated GUIDs that are already taken, in the
+        database or in the request, are replaced by new ones, and the items are created and cached.
+        """
+        response = await self.http_client.fetch(self.get_url("/guid/_bulk"), method='POST',
+                                                body=json.dumps({'items': [{'user': 'a'}, {'user': 'b'}]}))
+        results = json.loads(response.body)['items']
+        self.assertEqual([result['status'] for result in results], [201, 201])
+        guids = [result['guid'] for result in results]
+        self.assertNotIn(self.TAKEN, guids)
+        self.assertEqual(len(set(guids)), 2)
+        self.assertEqual(self.db.guids.documents[self.TAKEN]['user'], 'existing')
+        for result in results:
+            self.assertEqual(self.db.guids.documents[result['guid']]['user'], result['user'])
+            self.assertEqual((await self.cache.get(result['guid']))['user'], result['user'])
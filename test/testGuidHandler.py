@@ -3,9 +3,10 @@ from unittest.mock import MagicMock, patch
 import tornado.testing
 from tornado.testing import gen_test
 import json
+import time
 from src.app import make_app
 from src.database import Database
-from src.cache import Cache
+from src.cache import Cache, MISSING
 
 class TestGUIDHandler(tornado.testing.AsyncHTTPTestCase):
     def get_app(self):
@@ -36,6 +37,18 @@ class TestGUIDHandler(tornado.testing.AsyncHTTPTestCase):
         self.assertEqual(response.code, 200)
         self.assertEqual(json.loads(response.body), metadata)
 
+    @gen_test
+    def test_get_known_missing(self):
+        """
+        Test case for HTTP GET request for a GUID the cache has recorded as missing.
+        It tests if a 404 status code is returned without querying the database.
+        """
+        guid = "FA3A9A3A3A3A3A3A3A3A3A3A3A3A3A3A"
+        self.mock_cache.get.return_value = MISSING
+        response = yield self.http_client.fetch(self.get_url(f"/guid/{guid}"), method="GET", raise_error=False)
+        self.assertEqual(response.code, 404)
+        self.mock_db.get_guid.assert_not_called()
+
     @gen_test
     def test_post(self):
         """
@@ -81,24 +94,26 @@ class TestGUIDHandler(tornado.testing.AsyncHTTPTestCase):
         """
         Test case for HTTP PATCH request to update a GUID.
         It tests two scenarios:
-        1. Updating a non-existing GUID should return a 500 status code.
-        2. Updating an existing GUID should return a 200 status code.
+        1. Updating a non-existing GUID should return a 404 status code.
+        2. Updating an existing GUID should return a 200 status code and the updated document,
+           without a second database read.
         """
         guid = "FA3A9A3A3A3A3A3A3A3A3A3A3A3A3A3A"
         metadata = {'guid': guid, 'user': 'test_user', 'expire': 1692444800}
 
         # Test updating a non-existing GUID
-        self.mock_db.update_guid.return_value = False
-        body = json.dumps({"user": "updated_user", "expire": "1692444800"})
+        self.mock_db.update_guid.return_value = None
+        body = json.dumps({"user": "updated_user", "expire": str(int(time.time()) + 3600)})
         response = yield self.http_client.fetch(self.get_url(f"/guid/{guid}"), method="PATCH", body=body, raise_error=False)
-        self.assertEqual(response.code, 500)
+        self.assertEqual(response.code, 404)
 
         # Test updating an existing GUID
-        self.mock_db.get_guid.return_value = metadata
-        self.mock_db.update_guid.return_value = True
-        body = json.dumps({"user": "updated_user", "expire": "1692444800"})
+        self.mock_db.update_guid.return_value = metadata
+        body = json.dumps({"user": "updated_user", "expire": str(int(time.time()) + 3600)})
         response = yield self.http_client.fetch(self.get_url(f"/guid/{guid}"), method="PATCH", body=body, raise_error=False)
         self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body), metadata)
+        self.mock_db.get_guid.assert_not_called()
     
     @gen_test
     def test_post_server_error(self):
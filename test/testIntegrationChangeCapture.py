@@ -0,0 +1,50 @@
+import asyncio
+import os
+import time
+import unittest
+import uuid
+from tornado.testing import AsyncTestCase, gen_test
+
+from src.database import Database
+from src.cache import Cache
+from src.changeCapture import ChangeCapture, RedisStreamSink
+
+@unittest.skipUnless(os.environ.get('CDC_INTEGRATION'), "set CDC_INTEGRATION=1 to run it against the docker-compose services")
+class TestChangeCaptureIntegration(AsyncTestCase):
+    """Needs the docker-compose services: MongoDB runs as a single-node replica set (rs0)."""
+
+    GUIDS = [uuid.uuid4().hex.upper() for _ in range(100)]
+
+    @gen_test(timeout=60)
+    async def test_invalidation_lag(self):
+        """
+        Test case for change capture against a real replica set: GUIDs updated directly in MongoDB
+        are evicted from Redis, and the time from each write until its eviction stays under a second.
+        """
+        db, cache = Database(), Cache()
+        expire = int(time.time()) + 3600
+        for guid in self.GUIDS:
+            await db.create_guid(guid, {'guid': guid, 'user': 'Test user', 'expire': expire})
+            await cache.set(guid, {'guid': guid, 'user': 'Test user', 'expire': expire})
+
+        capture = ChangeCapture(db, cache, sink=RedisStreamSink(cache, stream='guid:changes:test'))
+        capture.start()
+        await asyncio.sleep(1)  # lets the stream open, so the writes below happen after it
+        lags = []
+        try:
+            for guid in self.GUIDS:
+                db.guids.update_one({'_id': guid}, {'$set': {'user': 'Updated directly'}})
+                written = time.perf_counter()
+                while await cache.get(guid) is not None:
+                    self.assertLess(time.perf_counter() - written, 5, "the GUID was not evicted")
+                    await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - written)
+        finally:
+            await capture.stop()
+            for guid in self.GUIDS:
+                await db.delete_guid(guid)
+            cache.client.delete('guid:changes:test', ChangeCapture.TOKEN_KEY)
+
+        lags.sort()
+        self.assertLess(lags[len(lags) // 2], 1, f"invalidation lag: p50 {lags[len(lags) // 2] * 1000:.1f}ms, "
+                                                 f"p99 {lags[-2] * 1000:.1f}ms, max {lags[-1] * 1000:.1f}ms")
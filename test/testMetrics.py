@@ -0,0 +1,77 @@
+import time
+from unittest.mock import patch
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache, LocalCache
+from src import metrics
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestMetrics(AsyncHTTPTestCase):
+    GUID = "%032X" % 42
+
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis(), local=LocalCache(), negative_ttl=30)
+        return make_app(db=self.db, cache=self.cache)
+
+    @gen_test
+    def test_request_and_backend_metrics(self):
+        """
+        Test case for the request, backend and cache metrics.
+        A GET that misses the cache is counted per handler and status, its Mongo and Redis calls
+        are timed, and the lookups show up as a miss then a hit in GET /metrics.
+        """
+        self.db.guids.documents[self.GUID] = {'_id': self.GUID, 'guid': self.GUID, 'user': 'test_user',
+                                              'expire': int(time.time()) + 3600}
+        requests = metrics.REQUESTS.get('GUIDHandler', 'GET', 200)
+        mongo_reads = metrics.BACKEND_LATENCY.count('mongo', 'get_guid')
+        misses = metrics.CACHE_LOOKUPS.get('miss')
+        hits = metrics.CACHE_LOOKUPS.get('hit')
+
+        for _ in range(2):
+            response = yield self.http_client.fetch(self.get_url(f"/guid/{self.GUID}"))
+            self.assertEqual(response.code, 200)
+
+        self.assertEqual(metrics.REQUESTS.get('GUIDHandler', 'GET', 200), requests + 2)
+        self.assertEqual(metrics.BACKEND_LATENCY.count('mongo', 'get_guid'), mongo_reads + 1)
+        self.assertEqual(metrics.CACHE_LOOKUPS.get('miss'), misses + 1)
+        self.assertEqual(metrics.CACHE_LOOKUPS.get('hit'), hits + 1)
+
+        response = yield self.http_client.fetch(self.get_url("/metrics"))
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.body.decode()
+        self.assertIn('guid_api_requests_total{handler="GUIDHandler",method="GET",status="200"}', body)
+        self.assertIn('guid_api_backend_duration_seconds_bucket{backend="mongo",operation="get_guid",le="+Inf"}',
+                      body)
+        self.assertIn('guid_api_cache_hit_ratio ', body)
+        self.assertIn('guid_api_local_cache_entries 1', body)
+
+    @gen_test
+    def test_backend_errors_are_counted(self):
+        """
+        Test case for the backend error metric: a failing Mongo call is logged and counted,
+        and the handler still answers with its usual error response.
+        """
+        errors = metrics.BACKEND_ERRORS.get('mongo', 'get_guid')
+        with patch.object(self.db.guids, 'find_one', side_effect=Exception("connection refused")):
+            response = yield self.http_client.fetch(self.get_url(f"/guid/{self.GUID}"), raise_error=False)
+        self.assertEqual(response.code, 404)
+        self.assertEqual(metrics.BACKEND_ERRORS.get('mongo', 'get_guid'), errors + 1)
+
+    def test_histogram_exposition(self):
+        """
+        Test case for the Prometheus text format of a histogram: buckets are cumulative and
+        end with +Inf, followed by the sum and the count.
+        """
+        histogram = metrics.Histogram('test_seconds', 'Test.', ('stage',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, 'read')
+        self.assertEqual(list(histogram.samples()), [
+            'test_seconds_bucket{stage="read",le="0.1"} 1',
+            'test_seconds_bucket{stage="read",le="1.0"} 2',
+            'test_seconds_bucket{stage="read",le="+Inf"} 3',
+            'test_seconds_sum{stage="read"} 5.55',
+            'test_seconds_count{stage="read"} 3',
+        ])
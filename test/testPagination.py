@@ -0,0 +1,70 @@
+import json
+import time
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestPagination(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis())
+        now = int(time.time())
+        # 25 GUIDs for 'alice', several of them sharing an expire, plus an expired one and another user's.
+        self.expected = []
+        for i in range(25):
+            guid = "%032X" % (100 - i)
+            document = {'guid': guid, 'user': 'alice', 'expire': now + 3600 + i // 3}
+            self.db.guids.documents[guid] = dict(document, _id=guid)
+            self.expected.append(document)
+        self.expected.sort(key=lambda document: (document['expire'], document['guid']))
+        self.db.guids.documents["%032X" % 1] = {'_id': "%032X" % 1, 'guid': "%032X" % 1, 'user': 'alice',
+                                                'expire': now - 10}
+        self.db.guids.documents["%032X" % 2] = {'_id': "%032X" % 2, 'guid': "%032X" % 2, 'user': 'bob',
+                                                'expire': now + 3600}
+        self.io_loop.run_sync(self.db.ensure_indexes)
+        return make_app(db=self.db, cache=self.cache)
+
+    def get_json(self, path):
+        return self.http_client.fetch(self.get_url(path), raise_error=False)
+
+    @gen_test
+    def test_keyset_pages(self):
+        """
+        Test case for GET /guid?user=<user>: following the 'next' cursor walks every unexpired GUID of the
+        user exactly once, in (expire, guid) order, including across ties on expire, and the last page
+        has no cursor.
+        """
+        items = []
+        path = "/guid?user=alice&limit=10"
+        pages = 0
+        while path:
+            response = yield self.get_json(path)
+            self.assertEqual(response.code, 200)
+            page = json.loads(response.body)
+            items.extend(page['items'])
+            pages += 1
+            path = f"/guid?user=alice&limit=10&after={page['next']}" if page['next'] else None
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(items, self.expected)
+
+    @gen_test
+    def test_count_and_validation(self):
+        """
+        Test case for GET /guid/_count and the listing's argument checks: the count only includes the
+        user's unexpired GUIDs, and a bad limit or cursor gets a 400 error response.
+        """
+        response = yield self.get_json("/guid/_count?user=alice")
+        self.assertEqual(json.loads(response.body), {'user': 'alice', 'count': 25})
+        response = yield self.get_json("/guid/_count")
+        self.assertEqual(response.code, 400)
+
+        for path in ("/guid?user=alice&limit=0", "/guid?user=alice&limit=5000", "/guid?user=alice&after=oops"):
+            response = yield self.get_json(path)
+            self.assertEqual(response.code, 400, path)
+
+        response = yield self.get_json("/guid?user=carol")
+        self.assertEqual(json.loads(response.body), {'items': [], 'next': None})
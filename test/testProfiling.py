@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+import time
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from src.profiling import SlowRequestLog
+from bench.standins import FakeMongoClient, FakeRedis
+
+TOKEN = 'test-token'
+
+
+def busy_loop(stopped):
+    while not stopped.is_set():
+        sum(range(1000))
+
+
+class TestProfiling(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient(latency=0.05))
+        self.guid = "%032X" % 1
+        self.db.guids.documents[self.guid] = {'_id': self.guid, 'guid': self.guid, 'user': 'test_user',
+                                              'expire': int(time.time()) + 3600}
+        self.slow_log = SlowRequestLog(threshold=0.03)
+        return make_app(db=self.db, cache=Cache(client=FakeRedis()), admin_token=TOKEN, slow_log=self.slow_log)
+
+    async def admin(self, path, method='GET', token=TOKEN):
+        headers = {'Authorization': f"Bearer {token}"} if token else {}
+        return await self.http_client.fetch(self.get_url(path), method=method, headers=headers,
+                                            body=b'' if method == 'POST' else None, raise_error=False)
+
+    @gen_test
+    async def test_admin_endpoints_need_the_token(self):
+        """Test case for the admin authentication: requests without the token or with another one get a 401."""
+        response = await self.admin('/admin/slow-requests', token=None)
+        self.assertEqual(response.code, 401)
+        self.assertEqual(response.headers['WWW-Authenticate'], 'Bearer')
+        response = await self.admin('/admin/profile?seconds=1', method='POST', token='guess')
+        self.assertEqual(response.code, 401)
+        response = await self.admin('/admin/profile?seconds=600', method='POST')
+        self.assertEqual(response.code, 400)
+
+        self._app = make_app(db=self.db, cache=Cache(client=FakeRedis()))
+        self.http_server.request_callback = self._app
+        response = await self.admin('/admin/slow-requests')
+        self.assertEqual(response.code, 404)
+
+    @gen_test
+    async def test_profile_returns_collapsed_stacks(self):
+        """
+        Test case for the sampling profiler: a profile of a worker running a busy thread returns collapsed
+        stacks that show it, and a second profile started meanwhile is refused with a 409.
+        """
+        stopped = threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(stopped,), name='busy')
+        thread.start()
+        try:
+            running = asyncio.ensure_future(self.admin('/admin/profile?seconds=0.3&interval=0.002', 'POST'))
+            while self._app.settings['profiler'].sampler is None:
+                await asyncio.sleep(0.001)
+            second = await self.admin('/admin/profile?seconds=0.3', 'POST')
+            first = await running
+        finally:
+            stopped.set()
+            thread.join()
+        self.assertEqual(second.code, 409)
+        self.assertEqual(first.code, 200)
+        self.assertTrue(first.headers['Content-Type'].startswith('text/plain'))
+        stacks = {}
+        for line in first.body.decode().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            stacks[stack] = int(count)
+        busy = [stack for stack in stacks if stack.startswith('busy;') and 'busy_loop (testProfiling.py:' in stack]
+        self.assertTrue(busy)
+        self.assertTrue(any(stack.startswith('MainThread;') for stack in stacks))
+
+    @gen_test
+    async def test_slow_requests_are_logged_with_their_stages(self):
+        """
+        Test case for the slow request log: a GET that misses the cache and waits on MongoDB is recorded
+        with the timings of its stages, while the cache hit that follows is under the threshold.
+        """
+        with self.assertLogs('tornado.application', 'WARNING') as logs:
+            response = await self.http_client.fetch(self.get_url(f"/guid/{self.guid}"))
+        self.assertEqual(json.loads(response.body)['guid'], self.guid)
+        self.assertIn(f"Slow request: GET /guid/{self.guid} 200", logs.output[0])
+        await self.http_client.fetch(self.get_url(f"/guid/{self.guid}"))
+
+        response = await self.admin('/admin/slow-requests')
+        body = json.loads(response.body)
+        self.assertEqual(body['threshold_ms'], 30)
+        self.assertEqual(len(body['items']), 1)
+        entry = body['items'][0]
+        self.assertEqual(entry['uri'], f"/guid/{self.guid}")
+        stages = {stage['name']: stage for stage in entry['stages']}
+        for name in ('receive', 'admission', 'redis.get', 'mongo.get_guid'):
+            self.assertIn(name, stages)
+        self.assertGreaterEqual(stages['mongo.get_guid']['duration_ms'], 50)
+        self.assertGreaterEqual(stages['mongo.get_guid']['start_ms'], stages['redis.get']['start_ms'])
+        self.assertLessEqual(stages['mongo.get_guid']['duration_ms'], entry['duration_ms'])
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from tornado.testing import AsyncTestCase, gen_test
+
+from src.database import Database
+from src.cache import Cache
+from src.reaper import Reaper
+from src import metrics
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestReaper(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis())
+
+    def seed(self, count, expire, with_expire_at=True):
+        guids = []
+        for i in range(count):
+            guid = "%032X" % (len(self.db.guids.documents) + 1)
+            document = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': expire}
+            if with_expire_at:
+                document['expire_at'] = datetime.fromtimestamp(expire, timezone.utc)
+            self.db.guids.documents[guid] = document
+            guids.append(guid)
+        return guids
+
+    @gen_test
+    async def test_indexes_and_stored_documents(self):
+        """
+        Test case for index management and the stored 'expire_at' date: ensure_indexes creates a TTL
+        index on it, writes derive it from 'expire', and the API never returns it.
+        """
+        self.assertTrue(await self.db.ensure_indexes())
+        self.assertEqual(self.db.guids.indexes['expire_at_ttl']['expireAfterSeconds'], 0)
+        self.assertIn('expire', self.db.guids.indexes)
+
+        guid = "%032X" % 1
+        expire = int(time.time()) + 3600
+        metadata = {'guid': guid, 'user': 'test_user', 'expire': expire}
+        await self.db.create_guid(guid, metadata)
+        self.assertEqual(self.db.guids.documents[guid]['expire_at'], datetime.fromtimestamp(expire, timezone.utc))
+        self.assertEqual(await self.db.get_guid(guid), metadata)
+
+        updated = await self.db.update_guid(guid, {'expire': expire + 60})
+        self.assertEqual(updated, dict(metadata, expire=expire + 60))
+        self.assertEqual(self.db.guids.documents[guid]['expire_at'].timestamp(), expire + 60)
+
+    @gen_test
+    async def test_reap_deletes_expired_guids_in_batches(self):
+        """
+        Test case for a reaper pass: expired GUIDs, including ones without 'expire_at', are deleted
+        from the database and the cache batch by batch, live ones are kept, and the pass is counted.
+        """
+        now = int(time.time())
+        expired = self.seed(5, now - 10) + self.seed(2, now - 10, with_expire_at=False)
+        live = self.seed(3, now + 3600)
+        for guid in expired:
+            self.cache.client.set(guid, b'{}', ex=60)
+        reaped = metrics.GUIDS_REAPED.get()
+
+        reaper = Reaper(self.db, self.cache, batch_size=3, rate=1000)
+        self.assertEqual(await reaper.reap(), 7)
+
+        self.assertEqual(sorted(self.db.guids.documents), live)
+        self.assertEqual(self.cache.client.mget(expired), [None] * 7)
+        self.assertEqual(metrics.GUIDS_REAPED.get(), reaped + 7)
+        self.assertEqual(metrics.COLLECTION_SIZE.get(), 3)
+        self.assertEqual(await reaper.reap(), 0)
+
+    @gen_test
+    async def test_reap_is_rate_limited(self):
+        """
+        Test case for the reaper's pacing: full batches are spread out so that deletes average
+        at most `rate` GUIDs per second.
+        """
+        self.seed(30, int(time.time()) - 10)
+        reaper = Reaper(self.db, self.cache, batch_size=10, rate=100)
+        started = time.perf_counter()
+        self.assertEqual(await reaper.reap(), 30)
+        # Three full batches of 10 at 100/s: two pauses of 0.1s, plus one after the last full batch.
+        self.assertGreaterEqual(time.perf_counter() - started, 0.25)
+
+    @gen_test
+    async def test_start_and_stop(self):
+        """Test case checking that the background task reaps right away and stops promptly."""
+        self.seed(2, int(time.time()) - 10)
+        reaper = Reaper(self.db, self.cache, interval=3600)
+        reaper.start()
+        while self.db.guids.documents:
+            await asyncio.sleep(0.01)
+        await reaper.stop()
+        self.assertIsNone(reaper.task)
@@ -0,0 +1,66 @@
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from unittest.mock import patch
+import tornado.gen
+from tornado.testing import AsyncTestCase, gen_test, bind_unused_port
+from tornado.httpclient import AsyncHTTPClient
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from src.server import Worker
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestWorker(AsyncTestCase):
+    @gen_test
+    async def test_shutdown_drains_requests_in_flight(self):
+        """
+        Test case for a graceful shutdown: a request that is in flight when the worker is asked to
+        stop still completes, and the shutdown hooks only run once it has.
+        """
+        app = make_app(db=Database(client=FakeMongoClient(latency=0.2)), cache=Cache(client=FakeRedis()))
+        sock, port = bind_unused_port()
+        worker = Worker(app, [sock], shutdown_timeout=5)
+        worker.server.add_sockets(worker.sockets)
+        hooks = []
+        worker.on_shutdown(lambda: hooks.append(app.settings['tracker'].in_flight))
+
+        request = AsyncHTTPClient().fetch(f"http://127.0.0.1:{port}/guid/{'A' * 32}", raise_error=False)
+        while app.settings['tracker'].in_flight == 0:
+            await tornado.gen.sleep(0.01)
+        with patch.object(self.io_loop, 'stop') as stop:
+            await worker.shutdown()
+        response = await request
+
+        self.assertEqual(response.code, 404)
+        self.assertEqual(hooks, [0])
+        stop.assert_called_once()
+
+
+class TestForkedWorkers(AsyncTestCase):
+    def test_workers_serve_and_exit_on_sigterm(self):
+        """
+        Test case for the pre-fork launcher: two workers share the port, and SIGTERM sent to the
+        supervisor shuts all of them down cleanly.
+        """
+        sock, port = bind_unused_port()
+        sock.close()
+        server = subprocess.Popen([sys.executable, '-m', 'bench.serve', '--port', str(port), '--workers', '2'],
+                                  stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/") as response:
+                        self.assertEqual(response.status, 200)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            self.assertEqual(server.wait(timeout=10), 0)
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from tornado.testing import AsyncTestCase, AsyncHTTPTestCase, gen_test
+from tornado.httpclient import AsyncHTTPClient
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from src.singleflight import SingleFlight
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestSingleFlight(AsyncTestCase):
+    @gen_test
+    async def test_concurrent_calls_share_one_result(self):
+        """
+        Test case for SingleFlight: concurrent callers for the same key run fn once and all
+        receive its result, including a shared None.
+        """
+        flights = SingleFlight()
+        calls = []
+
+        async def lookup():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return None
+
+        results = await asyncio.gather(*[flights.do('key', lookup) for _ in range(10)])
+        self.assertEqual(results, [None] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.shared, 9)
+        self.assertEqual(flights.calls, {})
+
+    @gen_test
+    async def test_exception_is_shared(self):
+        """
+        Test case checking that an exception raised by the in-flight call reaches every caller
+        and that the key can be retried afterwards.
+        """
+        flights = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('backend down')
+
+        results = await asyncio.gather(*[flights.do('key', failing) for _ in range(3)], return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+        async def working():
+            return 'ok'
+        self.assertEqual(await flights.do('key', working), 'ok')
+
+
+class TestStampede(AsyncHTTPTestCase):
+    GUID = "FA3A9A3A3A3A3A3A3A3A3A3A3A3A3A3A"
+
+    def get_app(self):
+        self.mongo = FakeMongoClient(latency=0.02)
+        self.redis = FakeRedis()
+        self.db = Database(client=self.mongo)
+        self.cache = Cache(client=self.redis, stale_ttl=30)
+        self.metadata = {'guid': self.GUID, 'user': 'test_user', 'expire': int(time.time()) + 7200}
+        self.db.guids.documents[self.GUID] = dict(self.metadata, _id=self.GUID)
+        return make_app(db=self.db, cache=self.cache)
+
+    @gen_test
+    async def test_concurrent_misses_hit_mongo_once(self):
+        """
+        Test case for a cache stampede: concurrent GETs for an uncached GUID, and for an
+        unknown GUID, each result in a single Mongo query.
+        """
+        http_client = AsyncHTTPClient()
+        missing = "0" * 32
+        responses = await asyncio.gather(
+            *[http_client.fetch(self.get_url(f"/guid/{guid}"), raise_error=False)
+              for guid in [self.GUID] * 10 + [missing] * 10])
+
+        self.assertEqual([response.code for response in responses], [200] * 10 + [404] * 10)
+        self.assertEqual(self.db.guids.calls, 2)
+
+    @gen_test
+    async def test_stale_value_is_served_while_refreshing(self):
+        """
+        Test case for stale-while-revalidate: a value inside the stale window is served
+        immediately while one background lookup repopulates the cache.
+        """
+        self.redis.set(self.GUID, '{"guid": "%s", "user": "stale_user", "expire": %d}'
+                       % (self.GUID, self.metadata['expire']), ex=10)
+        http_client = AsyncHTTPClient()
+        responses = await asyncio.gather(
+            *[http_client.fetch(self.get_url(f"/guid/{self.GUID}")) for _ in range(10)])
+        self.assertTrue(all(b'stale_user' in response.body for response in responses))
+
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.db.guids.calls, 1)
+        self.assertEqual(await self.cache.get(self.GUID), self.metadata)
+        self.assertGreater(self.redis.ttl(self.GUID), 3600)
@@ -0,0 +1,120 @@
+import json
+import time
+from unittest.mock import patch
+from tornado.httputil import HTTPServerRequest
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from tornado.web import ErrorHandler
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from src.streamHandler import ExportHandler, ImportHandler
+from bench.standins import FakeMongoClient, FakeRedis
+
+TOKEN = 'test-token'
+AUTHORIZATION = {'Authorization': f"Bearer {TOKEN}"}
+
+class TestStreamHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.expire = int(time.time()) + 3600
+        return make_app(db=self.db, cache=Cache(client=FakeRedis(), negative_ttl=30), admin_token=TOKEN)
+
+    def line(self, guid, **fields):
+        return json.dumps(dict({'guid': guid, 'user': 'test_user', 'expire': self.expire}, **fields))
+
+    @gen_test
+    def test_export(self):
+        """
+        Test case for GET /guid/_export: every document is streamed as one NDJSON line,
+        across several cursor batches.
+        """
+        for i in range(5):
+            guid = "%032X" % i
+            self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': self.expire}
+        with patch.object(ExportHandler, 'BATCH_SIZE', 2):
+            response = yield self.http_client.fetch(self.get_url("/guid/_export"), headers=AUTHORIZATION)
+
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.body.decode().splitlines()]
+        self.assertEqual(sorted(line['guid'] for line in lines), ["%032X" % i for i in range(5)])
+        self.assertNotIn('_id', lines[0])
+
+    @gen_test
+    def test_import(self):
+        """
+        Test case for POST /guid/_import: valid lines are inserted, while malformed, invalid
+        and duplicate lines are rejected and reported with their line number.
+        """
+        body = "\n".join([
+            self.line("%032X" % 1),
+            "not json",
+            self.line("%032X" % 2, user=123),
+            "",
+            self.line("%032X" % 3),
+            self.line("%032X" % 1),
+            self.line("%032X" % 4),
+        ])
+        response = yield self.http_client.fetch(self.get_url("/guid/_import"), method="POST", body=body,
+                                                headers=AUTHORIZATION)
+        report = json.loads(response.body)
+
+        self.assertEqual(report['imported'], 3)
+        self.assertEqual(report['rejected'], 3)
+        self.assertEqual([error['line'] for error in report['errors']], [2, 3, 6])
+        self.assertEqual(sorted(self.db.guids.documents), ["%032X" % i for i in (1, 3, 4)])
+
+    @gen_test
+    def test_import_ordered(self):
+        """
+        Test case for POST /guid/_import?ordered=true: the import stops at the first document
+        that fails to insert and the remaining lines are skipped.
+        """
+        existing = "%032X" % 2
+        self.db.guids.documents[existing] = {'_id': existing, 'guid': existing, 'user': 'test_user',
+                                             'expire': self.expire}
+        body = "\n".join(self.line("%032X" % i) for i in range(1, 6)) + "\n"
+        with patch.object(ImportHandler, 'BATCH_SIZE', 2):
+            response = yield self.http_client.fetch(self.get_url("/guid/_import?ordered=true"),
+                                                    method="POST", body=body, headers=AUTHORIZATION)
+        report = json.loads(response.body)
+
+        self.assertEqual((report['imported'], report['rejected'], report['skipped']), (1, 1, 3))
+        self.assertEqual(report['errors'], [{'line': 2, 'errors': {'guid': 'Failed to create GUID.'}}])
+
+    @gen_test
+    def test_import_clears_missing_records(self):
+        """
+        Test case for POST /guid/_import after a lookup of a GUID it creates: the 404 recorded for
+        the GUID does not outlive the import.
+        """
+        guid = "%032X" % 1
+        response = yield self.http_client.fetch(self.get_url(f"/guid/{guid}"), raise_error=False)
+        self.assertEqual(response.code, 404)
+
+        response = yield self.http_client.fetch(self.get_url("/guid/_import"), method="POST", body=self.line(guid),
+                                                headers=AUTHORIZATION)
+        self.assertEqual(json.loads(response.body)['imported'], 1)
+        response = yield self.http_client.fetch(self.get_url(f"/guid/{guid}"))
+        self.assertEqual(json.loads(response.body)['guid'], guid)
+
+    @gen_test
+    def test_admin_token_required(self):
+        """
+        Test case for the export and import without the admin token: both get a 401 and nothing is
+        imported, and without a configured token they are not routed at all.
+        """
+        for headers in ({}, {'Authorization': 'Bearer wrong'}):
+            response = yield self.http_client.fetch(self.get_url("/guid/_export"), headers=headers, raise_error=False)
+            self.assertEqual(response.code, 401)
+            self.assertEqual(response.headers['WWW-Authenticate'], 'Bearer')
+            response = yield self.http_client.fetch(self.get_url("/guid/_import"), method="POST",
+                                                    body=self.line("%032X" % 1), headers=headers, raise_error=False)
+            self.assertEqual(response.code, 401)
+        self.assertEqual(self.db.guids.documents, {})
+
+        app = make_app(db=self.db, cache=Cache(client=FakeRedis()))
+        for path in ("/guid/_export", "/guid/_import"):
+            delegate = app.find_handler(HTTPServerRequest(method="GET", uri=path))
+            self.assertIs(delegate.handler_class, ErrorHandler)
+            self.assertEqual(delegate.handler_kwargs, {'status_code': 404})
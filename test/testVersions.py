@@ -0,0 +1,95 @@
+import json
+import time
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src import cacheEncoding, versions
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestVersions(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.redis = FakeRedis()
+        self.cache = Cache(client=self.redis)
+        return make_app(db=self.db, cache=self.cache, max_age=60)
+
+    async def create(self, expire=None):
+        body = {'user': 'test_user'}
+        if expire is not None:
+            body['expire'] = expire
+        response = await self.http_client.fetch(self.get_url('/guid'), method='POST', body=json.dumps(body))
+        metadata = json.loads(response.body)
+        self.assertEqual(response.headers['Etag'], f'"{metadata["version"]}"')
+        return metadata
+
+    @gen_test
+    async def test_conditional_get(self):
+        """
+        Test case for GET validators: the ETag is the GUID's version, a matching If-None-Match gets a
+        304 without a body from the cached copy, and an update changes the ETag.
+        """
+        metadata = await self.create()
+        url = self.get_url(f"/guid/{metadata['guid']}")
+        response = await self.http_client.fetch(url)
+        etag = response.headers['Etag']
+        self.assertEqual(etag, f'"{metadata["version"]}"')
+        self.assertEqual(response.headers['Cache-Control'], 'max-age=60')
+
+        calls = self.db.guids.calls
+        response = await self.http_client.fetch(url, headers={'If-None-Match': etag}, raise_error=False)
+        self.assertEqual(response.code, 304)
+        self.assertEqual(response.body, b'')
+        self.assertEqual(response.headers['Etag'], etag)
+        self.assertEqual(self.db.guids.calls, calls)
+
+        await self.http_client.fetch(url, method='PATCH', body='{"user": "new_user"}')
+        response = await self.http_client.fetch(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.code, 200)
+        self.assertNotEqual(response.headers['Etag'], etag)
+        self.assertEqual(json.loads(response.body)['user'], 'new_user')
+
+    @gen_test
+    async def test_if_match(self):
+        """
+        Test case for optimistic concurrency: PATCH and DELETE with a stale If-Match get a 412 and
+        change nothing, with the current version they succeed, and an unknown GUID is still a 404.
+        """
+        metadata = await self.create()
+        url = self.get_url(f"/guid/{metadata['guid']}")
+        stale = f'"{metadata["version"]}"'
+        response = await self.http_client.fetch(url, method='PATCH', body='{"user": "first"}',
+                                                headers={'If-Match': stale})
+        current = response.headers['Etag']
+
+        response = await self.http_client.fetch(url, method='PATCH', body='{"user": "second"}',
+                                                headers={'If-Match': stale}, raise_error=False)
+        self.assertEqual(response.code, 412)
+        response = await self.http_client.fetch(url, method='DELETE', headers={'If-Match': stale}, raise_error=False)
+        self.assertEqual(response.code, 412)
+        response = await self.http_client.fetch(url)
+        self.assertEqual(json.loads(response.body)['user'], 'first')
+
+        response = await self.http_client.fetch(url, method='DELETE', headers={'If-Match': f'W/{current}, {current}'},
+                                                raise_error=False)
+        self.assertEqual(response.code, 204)
+        response = await self.http_client.fetch(url, method='DELETE', headers={'If-Match': current}, raise_error=False)
+        self.assertEqual(response.code, 404)
+
+    @gen_test
+    async def test_max_age_and_compact_versions(self):
+        """
+        Test case for Cache-Control and the compact encoding: max-age never outlives the GUID's expire,
+        and the version is packed in compact values and read back, and from JSON, without decoding.
+        """
+        metadata = await self.create(expire=int(time.time()) + 30)
+        response = await self.http_client.fetch(self.get_url(f"/guid/{metadata['guid']}"))
+        self.assertLessEqual(int(response.headers['Cache-Control'].split('=')[1]), 30)
+
+        encoding = cacheEncoding.encoding('compact')
+        payload = encoding.dumps(metadata['guid'], metadata)
+        self.assertEqual(payload[:1], cacheEncoding.COMPACT_VERSIONED)
+        self.assertEqual(len(payload), 1 + 4 + 8 + len('test_user'))
+        self.assertEqual(cacheEncoding.loads(metadata['guid'], payload), metadata)
+        self.assertEqual(versions.validators(json.dumps(metadata).encode()), (metadata['version'], metadata['expire']))
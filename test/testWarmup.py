@@ -0,0 +1,86 @@
+import json
+import multiprocessing
+import time
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.database import Database
+from src.cache import Cache, LocalCache
+from src.warmup import HotKeys, Warmer
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestWarmup(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.redis = FakeRedis()
+        self.cache = Cache(client=self.redis)
+        self.hot_keys = HotKeys(self.cache, size=2)
+        self.warmer = Warmer(self.db, self.cache, self.hot_keys, limit=10, batch_size=2)
+        self.app = make_app(db=self.db, cache=self.cache, warmer=self.warmer, hot_keys=self.hot_keys)
+        return self.app
+
+    def store(self, number, lifetime=60):
+        guid = "%032X" % number
+        self.db.guids.documents[guid] = {'_id': guid, 'guid': guid, 'user': 'test_user', 'expire': int(time.time()) + lifetime}
+        return guid
+
+    @gen_test
+    async def test_readiness_follows_warmup(self):
+        """
+        Test case for the probes: the worker is live at once, ready only after the warm-up, and no
+        longer ready once it drains for a shutdown.
+        """
+        response = await self.http_client.fetch(self.get_url('/health/live'))
+        self.assertEqual(json.loads(response.body), {'status': 'ok'})
+        response = await self.http_client.fetch(self.get_url('/health/ready'), raise_error=False)
+        self.assertEqual(response.code, 503)
+
+        await self.warmer.run()
+        response = await self.http_client.fetch(self.get_url('/health/ready'))
+        self.assertEqual(json.loads(response.body), {'status': 'ready'})
+        self.app.settings['tracker'].draining = True
+        response = await self.http_client.fetch(self.get_url('/health/ready'), raise_error=False)
+        self.assertEqual(response.code, 503)
+
+    @gen_test
+    async def test_warmup_loads_hot_keys(self):
+        """
+        Test case for the hot key list: the most read GUIDs are recorded in Redis, and after a restart
+        with an empty cache the warm-up loads them, in batches, into Redis and the local tier.
+        """
+        hot, warm, cold = self.store(1), self.store(2), self.store(3)
+        for guid in (hot, hot, hot, warm, warm, cold):
+            response = await self.http_client.fetch(self.get_url(f'/guid/{guid}'))
+            self.assertEqual(response.code, 200)
+        await self.hot_keys.flush()
+        self.assertEqual(set(await self.hot_keys.hottest(10)), {hot, warm})
+
+        self.redis.store.clear()
+        cache = Cache(client=self.redis, local=LocalCache())
+        warmer = Warmer(self.db, cache, HotKeys(cache), limit=10, batch_size=1)
+        calls = self.db.guids.calls
+        self.assertEqual(await warmer.run(), 2)
+        self.assertEqual(self.db.guids.calls - calls, 2)
+        self.assertEqual(set(self.redis.store), {hot, warm})
+        self.assertEqual(cache.local.stats()['entries'], 2)
+        self.assertTrue(warmer.ready())
+
+        self.assertEqual(await warmer.run(), 0)  # still cached, nothing to load
+
+    @gen_test
+    async def test_warmup_falls_back_to_recent_guids(self):
+        """
+        Test case for a warm-up without hot keys: the most recently created unexpired GUIDs are loaded,
+        each worker taking its share of them.
+        """
+        guids = [self.store(number, lifetime=60 * number) for number in range(1, 6)]
+        expired = self.store(6, lifetime=-60)
+        warmed = multiprocessing.Value('i', 0)
+        first = Warmer(self.db, self.cache, limit=4, index=0, count=2, warmed=warmed)
+        second = Warmer(self.db, self.cache, limit=4, index=1, count=2, warmed=warmed)
+        loaded = await first.run()
+        self.assertFalse(first.ready())  # the pod is not warm until every worker is
+        self.assertEqual(loaded + await second.run(), 4)
+        self.assertTrue(first.ready() and second.ready())
+        self.assertEqual(set(self.redis.store), set(guids[1:]))
+        self.assertNotIn(expired, self.redis.store)
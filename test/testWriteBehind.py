@@ -0,0 +1,207 @@
+import asyncio
+import json
+import time
+import redis
+from unittest.mock import patch
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from src.app import make_app
+from src.database import Database
+from src.breaker import BackendUnavailable
+from src.cache import Cache
+from src.writeBehind import WriteBehind
+from src import metrics, versions
+from bench.standins import FakeMongoClient, FakeRedis
+
+class TestWriteBehind(AsyncHTTPTestCase):
+    def get_app(self):
+        self.db = Database(client=FakeMongoClient())
+        self.cache = Cache(client=FakeRedis(), negative_ttl=30)
+        self.writes = WriteBehind(self.db, self.cache, batch_size=10, interval=0.01, claim_idle=1)
+        self.io_loop.run_sync(lambda: self.cache.run(self.writes._create_group))
+        return make_app(db=self.db, cache=self.cache, writes=self.writes)
+
+    def fetch_json(self, path, method='GET', body=None):
+        return self.http_client.fetch(self.get_url(path), method=method, raise_error=False,
+                                      body=json.dumps(body) if body is not None else None,
+                                      allow_nonstandard_methods=True)
+
+    async def create(self, count):
+        guids = []
+        for _ in range(count):
+            response = await self.fetch_json('/guid', 'POST', {'user': 'test_user'})
+            self.assertEqual(response.code, 201)
+            metadata = json.loads(response.body)
+            self.assertEqual(response.headers['Etag'], versions.etag(metadata['version']))
+            guids.append(metadata['guid'])
+        return guids
+
+    @gen_test
+    async def test_creates_are_queued_and_flushed_in_batches(self):
+        """
+        Test case for a write-behind POST: the GUID is answered from the cache right away, reaches the
+        database only when the flusher runs, in batches of at most batch_size, and leaves nothing queued.
+        """
+        flushed = metrics.WRITES_FLUSHED.get()
+        guids = await self.create(15)
+        self.assertEqual(self.db.guids.documents, {})
+        response = await self.fetch_json(f'/guid/{guids[0]}')
+        self.assertEqual(json.loads(response.body)['guid'], guids[0])
+
+        first = await self.writes.collect()
+        self.assertEqual(len(first), 10)
+        self.assertTrue(await self.writes.flush(first))
+        self.assertTrue(await self.writes.flush(await self.writes.collect()))
+
+        self.assertEqual(sorted(self.db.guids.documents), sorted(guids))
+        self.assertEqual(self.db.guids.documents[guids[0]]['user'], 'test_user')
+        self.assertIn('expire_at', self.db.guids.documents[guids[0]])
+        self.assertEqual(self.cache.client.xlen(WriteBehind.STREAM), 0)
+        self.assertEqual(self.cache.client.hlen(WriteBehind.PENDING), 0)
+        self.assertEqual(metrics.WRITES_FLUSHED.get() - flushed, 15)
+        await self.writes.report()
+        self.assertEqual(metrics.WRITE_BACKLOG.get(), 0)
+
+    @gen_test
+    async def test_unacknowledged_entries_are_claimed_and_replayed(self):
+        """
+        Test case for a flusher that stops between reading a batch and acknowledging it: after claim_idle
+        another consumer claims the entries and writes them, and an insert that already happened counts as done.
+        """
+        guids = await self.create(3)
+        crashed = await self.writes.collect()
+        self.assertEqual(len(crashed), 3)
+        await self.db.store_guids({guids[0]: {'guid': guids[0], 'user': 'test_user', 'expire': int(time.time()) + 60}})
+
+        restarted = WriteBehind(self.db, Cache(client=self.cache.client), batch_size=10, interval=0.01, claim_idle=0.05)
+        self.assertEqual(await restarted.cache.run(restarted._claim), 0)
+        time.sleep(0.06)
+        self.assertEqual(await restarted.cache.run(restarted._claim), 3)
+        self.assertTrue(await restarted.flush(await restarted.collect()))
+
+        self.assertEqual(sorted(self.db.guids.documents), sorted(guids))
+        self.assertEqual(self.cache.client.xlen(WriteBehind.STREAM), 0)
+
+    @gen_test
+    async def test_failed_flush_is_retried(self):
+        """Test case for a database outage: a batch that cannot be inserted stays pending and is read again."""
+        guids = await self.create(2)
+        entries = await self.writes.collect()
+        with patch.object(self.db.guids, 'insert_many', side_effect=ConnectionError('down')):
+            self.assertFalse(await self.writes.flush(entries))
+
+        self.writes.backlog = True
+        self.assertEqual(await self.writes.collect(), entries)
+        self.assertTrue(await self.writes.flush(entries))
+        self.assertEqual(sorted(self.db.guids.documents), sorted(guids))
+
+    @gen_test
+    async def test_patch_and_delete_of_queued_guids(self):
+        """
+        Test case for PATCH and DELETE before a flush: PATCH writes the queued GUID first and updates it,
+        DELETE keeps the flusher from writing it, including when the flusher read it just before.
+        """
+        patched, deleted, racing = await self.create(3)
+        expire = int(time.time()) + 600
+        response = await self.fetch_json(f'/guid/{patched}', 'PATCH', {'user': 'new_user', 'expire': expire})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body)['user'], 'new_user')
+
+        response = await self.fetch_json(f'/guid/{deleted}', 'DELETE')
+        self.assertEqual(response.code, 204)
+        entries = await self.writes.collect()
+        payloads = self.cache.client.hmget(WriteBehind.PENDING, [racing])
+        response = await self.fetch_json(f'/guid/{racing}', 'DELETE')
+        self.assertEqual(response.code, 204)
+        self.cache.client.hset(WriteBehind.PENDING, racing, payloads[0])  # as read by the flusher before the DELETE
+        self.assertTrue(await self.writes.flush(entries))
+
+        self.assertEqual(list(self.db.guids.documents), [patched])
+        self.assertEqual(self.db.guids.documents[patched]['user'], 'new_user')
+        response = await self.fetch_json(f'/guid/{deleted}')
+        self.assertEqual(response.code, 404)
+
+    @gen_test
+    async def test_cache_miss_is_served_from_the_queue(self):
+        """Test case for a queued GUID evicted from the cache: the GET falls back to the queue and re-caches it."""
+        guid, = await self.create(1)
+        self.cache.client.delete(guid)
+        response = await self.fetch_json(f'/guid/{guid}')
+        self.assertEqual(response.code, 200)
+        self.assertIsNotNone(self.cache.client.get(guid))
+
+    @gen_test
+    async def test_stop_flushes_the_queue(self):
+        """Test case for shutdown: stop() returns once everything queued so far is in the database."""
+        self.writes.start()
+        guids = await self.create(25)
+        await self.writes.stop()
+        self.assertEqual(sorted(self.db.guids.documents), sorted(guids))
+        self.assertEqual(self.cache.client.xlen(WriteBehind.STREAM), 0)
+
+    @gen_test
+    async def test_flusher_starts_while_redis_is_down(self):
+        """
+        Test case for a worker started while Redis is unreachable: the flusher retries creating its consumer
+        group instead of stopping, and flushes the creates queued once Redis is back.
+        """
+        self.writes.retry_delay = 0.01
+        with patch.object(self.cache.client, 'xgroup_create', side_effect=[redis.ConnectionError('down'), None]):
+            self.writes.start()
+            guid, = await self.create(1)
+            for _ in range(100):
+                if guid in self.db.guids.documents:
+                    break
+                await asyncio.sleep(0.01)
+        self.assertFalse(self.writes.task.done())
+        await self.writes.stop()
+        self.assertIn(guid, self.db.guids.documents)
+
+    @gen_test
+    async def test_guid_in_url_is_inserted_synchronously(self):
+        """Test case for POST /guid/<guid> in write-behind mode: a caller-chosen GUID is inserted right away."""
+        guid = "%032X" % 7
+        response = await self.fetch_json(f'/guid/{guid}', 'POST', {'user': 'test_user'})
+        self.assertEqual(response.code, 201)
+        self.assertIn(guid, self.db.guids.documents)
+        self.assertEqual(self.cache.client.xlen(WriteBehind.STREAM), 0)
+
+    @gen_test
+    async def test_bulk_delete_and_mget_of_queued_guids(self):
+        """
+        Test case for the batch endpoints before a flush: POST /guid/_mget finds queued GUIDs evicted
+        from the cache, and DELETE /guid/_bulk answers 204 for them and keeps the flusher from writing them.
+        """
+        kept, deleted = await self.create(2)
+        self.cache.client.delete(kept, deleted)
+        response = await self.fetch_json('/guid/_mget', 'POST', {'guids': [kept, deleted]})
+        self.assertEqual([item['status'] for item in json.loads(response.body)['items']], [200, 200])
+
+        response = await self.fetch_json('/guid/_bulk', 'DELETE', {'guids': [deleted]})
+        self.assertEqual(json.loads(response.body)['items'], [{'status': 204, 'guid': deleted}])
+        self.assertTrue(await self.writes.flush(await self.writes.collect()))
+
+        self.assertEqual(list(self.db.guids.documents), [kept])
+        response = await self.fetch_json(f'/guid/{deleted}')
+        self.assertEqual(response.code, 404)
+
+    @gen_test
+    async def test_flusher_shares_the_cache_breaker(self):
+        """
+        Test case for the flusher's Redis calls, which go through the Cache's circuit breaker: its connection
+        errors open the breaker for requests too, it then fails fast, and it resumes once Redis is back.
+        """
+        guid, = await self.create(1)
+        self.cache.breaker.failures = 2
+        self.cache.breaker.reset_timeout = 0.05
+        with patch.object(self.cache.client, 'xreadgroup', side_effect=redis.ConnectionError('down')) as read:
+            for _ in range(3):
+                with self.assertRaises(BackendUnavailable):
+                    await self.writes.collect()
+            self.assertEqual(read.call_count, 2)
+        self.assertFalse(self.cache.available())
+
+        await asyncio.sleep(0.06)
+        self.assertTrue(await self.writes.flush(await self.writes.collect()))
+        self.assertTrue(self.cache.available())
+        self.assertIn(guid, self.db.guids.documents)